@@ -3,6 +3,8 @@ app.py - Flaskアプリのエントリーポイント
 
 起動方法:
   python app.py
+  gunicorn app:app            # 本番（Procfile）
+  python bench_startup.py     # 起動時間の計測
 """
 import logging
 import logging.handlers
@@ -12,30 +14,6 @@ from config import Config
 from extensions import db
 
 
-def _migrate(db):
-    """既存テーブルへのカラム追加マイグレーション（MySQL/SQLite/PostgreSQL互換）"""
-    migrations = [
-        ("participants", "name_kana",     "VARCHAR(100) DEFAULT ''"),
-        ("final_responses", "bank_name",      "VARCHAR(100) DEFAULT ''"),
-        ("final_responses", "branch_name",    "VARCHAR(100) DEFAULT ''"),
-        ("final_responses", "account_number", "VARCHAR(50) DEFAULT ''"),
-        ("provisional_responses", "share_consent", "BOOLEAN DEFAULT 0"),
-        ("final_responses",       "share_consent", "BOOLEAN DEFAULT 0"),
-    ]
-    with db.engine.connect() as conn:
-        for table, column, col_def in migrations:
-            try:
-                # カラムの存在をチェックしてから追加（DB非依存）
-                from sqlalchemy import inspect
-                inspector = inspect(db.engine)
-                existing_cols = [c["name"] for c in inspector.get_columns(table)]
-                if column not in existing_cols:
-                    conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {col_def}"))
-                    conn.commit()
-            except Exception:
-                conn.rollback()
-
-
 def create_app():
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(Config)
@@ -66,10 +44,9 @@ def create_app():
     db.init_app(app)
 
     with app.app_context():
-        from models import Participant, ProvisionalResponse, FinalResponse, Payment, BankImport, MailLog, AppSetting, VerificationToken
-        db.create_all()
-        # カラム追加マイグレーション（既存DBへの追加カラム）
-        _migrate(db)
+        # スキーマが最新か確認（最新なら schema_version を1行読むだけ。古ければマイグレーションを適用）
+        from migrations import ensure_schema
+        ensure_schema(db, auto_upgrade=app.config.get("AUTO_MIGRATE", True))
 
     # -----------------------------------------------
     # config_obj: メールサービスから参照できるよう
@@ -91,6 +68,10 @@ def create_app():
     app.register_blueprint(forms_bp)
     app.register_blueprint(admin_bp)
 
+    # flask コマンド（flask --app app sync-latest-responses など）
+    from cli import register_cli
+    register_cli(app)
+
     # -----------------------------------------------
     # Jinja2 フィルタ: UTC → JST 変換
     # -----------------------------------------------
@@ -183,15 +164,8 @@ def create_app():
 
     @app.route("/status")
     def status():
-        from flask import render_template, request, session
-        from models import Participant
-
-        def _class_label(cls):
-            if cls and cls.isdigit():
-                return f"{cls}組"
-            return cls or "不明"
-
-        TEACHER_ROLES = {"教師", "学年主任", "副担任"}
+        from flask import request, session, make_response
+        from services.status_service import render_status_page
 
         show_details = request.args.get("detail", "").lower() in {"1", "true", "yes", "on"}
         # 名前入りの詳細表示はログイン必須（集計のみの表示は公開）
@@ -199,55 +173,21 @@ def create_app():
             from urllib.parse import quote
             return redirect(url_for("status_login") + "?next=" + quote(request.full_path, safe=""))
 
-        participants = Participant.query.all()
-        prov_stats  = {"attending": 0, "not_attending": 0, "undecided": 0, "no_response": 0}
-        final_stats = {"attending": 0, "not_attending": 0, "no_response": 0}
-        student_map = {}
-        teachers    = []
-
-        for p in participants:
-            prov  = p.latest_provisional
-            final = p.latest_final
-            ps = prov.status  if prov  else "no_response"
-            fs = (final.status if final.status != "cancelled" else "not_attending") if final else "no_response"
-            prov_consent  = bool(prov.share_consent)  if prov  else False
-            final_consent = bool(final.share_consent) if final else False
-
-            prov_stats[ps]  = prov_stats.get(ps, 0)  + 1
-            final_stats[fs] = final_stats.get(fs, 0) + 1
-
-            is_teacher = p.role in TEACHER_ROLES
-            info = {"name": p.name + (" 先生" if is_teacher else ""), "prov": ps, "final": fs,
-                    "class_name": p.class_name or "", "number": p.student_number or "",
-                    "prov_consent": prov_consent, "final_consent": final_consent,
-                    "prov_at": prov.submitted_at.isoformat() if prov else None,
-                    "final_at": final.submitted_at.isoformat() if final else None}
-            if is_teacher:
-                teachers.append(info)
-            else:
-                cls = p.class_name or ""
-                student_map.setdefault(cls, []).append(info)
-
-        sorted_classes = [
-            {"key": cls, "label": _class_label(cls), "people": people}
-            for cls, people in sorted(student_map.items(), key=lambda x: (not x[0], x[0]))
-        ]
-
-        return render_template("status.html",
-            prov_stats=prov_stats,
-            final_stats=final_stats,
-            sorted_classes=sorted_classes,
-            teachers=teachers,
-            total=len(participants),
-            show_details=show_details,
-        )
+        # 集計・クラス別一覧はデータ変更時のみ作り直し、再訪問には 304 を返す
+        html, etag, last_modified = render_status_page(show_details)
+        response = make_response(html)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        if show_details:
+            response.cache_control.private = True
+        return response.make_conditional(request)
 
     @app.route("/attendance/scan", methods=["GET", "POST"])
     def attendance_scan():
-        from datetime import datetime
         from flask import flash, render_template, request
-        from models import AttendanceRecord, Participant
-        from services.mail_service import send_attendance_confirmation
+        from models import Participant
+        from services.attendance_service import check_in
 
         if request.method == "POST":
             participant_id = request.form.get("participant_id", "").strip()
@@ -255,28 +195,16 @@ def create_app():
                 flash("参加者を選択してください。", "warning")
                 return render_template("attendance_scan.html")
 
-            participant = Participant.query.get(participant_id)
+            participant = db.session.get(Participant, int(participant_id)) if participant_id.isdigit() else None
             if not participant:
                 flash("参加者が見つかりませんでした。", "danger")
                 return render_template("attendance_scan.html")
 
-            # 重複チェックを行わず、登録を追加する（当日制限はなし）
-            record = AttendanceRecord(participant_id=participant.id, source="qr")
-            db.session.add(record)
-            record.checked_in_at = datetime.utcnow()
-            record.status = "checked_in"
-            record.source = "qr"
-            db.session.commit()
-
-            try:
-                mail_log = send_attendance_confirmation(participant)
-                record.email_sent = mail_log.status in {"sent", "simulated"}
-                record.email_sent_at = datetime.utcnow()
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-
-            return render_template("attendance_done.html", participant=participant)
+            # 出席記録の登録だけ行い、確認メールは送信キューのワーカーが送る
+            # （短時間の再スキャンは既存の記録を返す。当日制限はなし）
+            record, created = check_in(participant, source="qr")
+            return render_template("attendance_done.html", participant=participant,
+                                   record=record, created=created)
 
         return render_template("attendance_scan.html")
 
@@ -296,10 +224,10 @@ def create_app():
     return app
 
 
+# アプリはプロセスごとにこの1回だけ作る（wsgi.py・init_db.py・gunicorn app:app もこれを使う）
 app = create_app()
 
 if __name__ == "__main__":
-    app = create_app()
     print("=" * 50)
     print("同窓会管理アプリを起動します")
     print("管理画面:      http://localhost:5000/admin/")
@@ -0,0 +1,126 @@
+"""
+bench_checkin.py - 会場QR出席登録（/attendance/scan）の負荷試験スクリプト
+
+起動中のアプリに対して、受付に参加者が到着する様子を再現して POST を送る。
+到着間隔はポアソン到着（既定: 10分間に300人）で、一部の人は数秒後にもう一度スキャンする
+（二度押し・読み直し。新しい出席記録が作られないことを確認する）。
+
+使い方:
+  python bench_checkin.py --url http://localhost:5001                # 10分間に300人（実時間）
+  python bench_checkin.py --url http://localhost:5001 --speed 60     # 60倍速（10秒）で実行
+  python bench_checkin.py --arrivals 500 --minutes 15 --repeat 0.2   # 人数・時間・再スキャン率を変える
+
+参加者IDは /form/api/names（クラス 31〜39 と教職員）から取得する。
+実際の出席記録が作られるので、本番DBには実行しないこと。
+
+出力:
+  - 応答時間（中央値・95%・99%・最大）と HTTP ステータスの内訳
+  - 新規登録・受付済み（再スキャン）の件数と、期待値（到着した人数）との比較
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CLASSES = [str(n) for n in range(31, 40)] + ["teacher"]
+REPEAT_DELAY_SECONDS = (1, 10)   # 再スキャンまでの秒数（実時間換算の範囲）
+
+
+def fetch_participant_ids(base_url: str) -> list:
+    ids = set()
+    for class_name in CLASSES:
+        url = f"{base_url}/form/api/names?{urllib.parse.urlencode({'class': class_name})}"
+        with urllib.request.urlopen(url, timeout=30) as res:
+            ids.update(member["id"] for member in json.load(res))
+    return sorted(ids)
+
+
+def scan(base_url: str, participant_id: int) -> tuple:
+    """1回分のスキャン。Returns: (ステータス, 秒数, "created" / "already" / None)"""
+    data = urllib.parse.urlencode({"participant_id": participant_id}).encode()
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f"{base_url}/attendance/scan", data=data, timeout=60) as res:
+            status, body = res.status, res.read().decode("utf-8", "replace")
+    except urllib.error.HTTPError as e:
+        status, body = e.code, ""
+    except Exception:
+        status, body = 0, ""
+    elapsed = time.perf_counter() - started
+    outcome = "created" if "の登録を受け付けました" in body else "already" if "受付済みです" in body else None
+    return status, elapsed, outcome
+
+
+def build_schedule(participant_ids: list, arrivals: int, minutes: float, repeat: float, rnd) -> list:
+    """[(実行時刻（秒・実時間換算）, 参加者ID)] を時刻順に返す"""
+    people = rnd.sample(participant_ids, min(arrivals, len(participant_ids)))
+    rate = len(people) / (minutes * 60)
+    schedule, at = [], 0.0
+    for pid in people:
+        at += rnd.expovariate(rate)
+        schedule.append((at, pid))
+        if rnd.random() < repeat:
+            schedule.append((at + rnd.uniform(*REPEAT_DELAY_SECONDS), pid))
+    return sorted(schedule)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会場QR出席登録の負荷試験")
+    parser.add_argument("--url", default="http://localhost:5001", help="アプリのURL（既定: http://localhost:5001）")
+    parser.add_argument("--arrivals", type=int, default=300, help="到着する人数（既定: 300）")
+    parser.add_argument("--minutes", type=float, default=10, help="到着が続く時間（分・既定: 10）")
+    parser.add_argument("--repeat", type=float, default=0.1, help="数秒後に再スキャンする人の割合（既定: 0.1）")
+    parser.add_argument("--speed", type=float, default=1, help="時間の早送り倍率（既定: 1 = 実時間）")
+    parser.add_argument("--concurrency", type=int, default=50, help="同時に送るリクエストの上限（既定: 50）")
+    parser.add_argument("--seed", type=int, default=1, help="乱数のシード（既定: 1）")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    participant_ids = fetch_participant_ids(base_url)
+    if not participant_ids:
+        raise SystemExit("参加者が見つかりません（/form/api/names が空です）")
+    schedule = build_schedule(participant_ids, args.arrivals, args.minutes, args.repeat, random.Random(args.seed))
+    people = len({pid for _, pid in schedule})
+    print(f"{people} 人 / {len(schedule)} スキャン を {args.minutes} 分間（{args.speed} 倍速）で送信します")
+
+    results, lock = [], threading.Lock()
+
+    def run(pid):
+        result = scan(base_url, pid)
+        with lock:
+            results.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for at, pid in schedule:
+            wait = at / args.speed - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(run, pid)
+    total = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for _, elapsed, _ in results)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    statuses, outcomes = {}, {}
+    for status, _, outcome in results:
+        statuses[status] = statuses.get(status, 0) + 1
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    print(f"所要時間: {total:.1f} 秒")
+    print(f"応答時間: 中央値 {statistics.median(latencies):.1f} ms / 95% {percentile(0.95):.1f} ms / "
+          f"99% {percentile(0.99):.1f} ms / 最大 {latencies[-1]:.1f} ms")
+    print("HTTP ステータス:", ", ".join(f"{k}: {v}" for k, v in sorted(statuses.items())))
+    print(f"新規登録: {outcomes.get('created', 0)}（期待値 {people}） / "
+          f"受付済み: {outcomes.get('already', 0)} / 判定不能: {outcomes.get(None, 0)}")
+
+
+if __name__ == "__main__":
+    main()
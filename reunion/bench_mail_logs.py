@@ -0,0 +1,155 @@
+"""
+bench_mail_logs.py - mail_logs の送信状況クエリのベンチマーク（索引あり / なし）
+
+一時ディレクトリの SQLite に合成した参加者と mail_logs（既定 10万行）を作り、
+送信状況を調べるクエリの実行計画（EXPLAIN QUERY PLAN）と所要時間を、
+mail_logs の索引（MailLog.__table_args__）がある場合と削除した場合で比べる。
+  - 今日の送信件数       get_today_sent_count（1日の送信上限の判定）
+  - 送信済みか（1人）     参加者が mail_type を送信済みか（個別送信・自動送信の判定）
+  - 送信済みの組（100人） mail_queue_service._sent_pairs（送信キューの1バッチ分）
+アプリの DB（instance/reunion.db）には触らない。
+
+使い方:
+  python bench_mail_logs.py                      # 参加者 3000 人、mail_logs 10万行
+  python bench_mail_logs.py --rows 300000        # 行数を変える
+  python bench_mail_logs.py --participants 5000  # 参加者数を変える
+
+出力:
+  - クエリごとの実行計画（索引あり: SEARCH ... USING INDEX、索引なし: SCAN）
+  - クエリごとの所要時間（索引あり / 索引なし、中央値）
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# アプリを読み込む前に、一時ディレクトリの SQLite を使うようにする
+_DB_DIR = tempfile.mkdtemp(prefix="reunion-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_DB_DIR) / 'bench.db'}"
+os.environ["MAIL_MODE"] = "console"
+
+MAIL_TYPES = ["final_url", "reminder", "final_reminder", "attendance_checkin"]
+STATUSES = ["sent"] * 8 + ["failed", "simulated"]
+
+
+def seed(participants: int, rows: int, rnd) -> None:
+    """合成した参加者と mail_logs（直近60日に分散。今日の分も含む）を入れる"""
+    from extensions import db
+    from models import MailLog, Participant
+
+    db.session.execute(Participant.__table__.insert(), [
+        {"name": f"参加者{i}", "email": f"u{i}@example.com", "class_name": "31",
+         "student_number": str(i + 1), "role": "生徒"}
+        for i in range(participants)
+    ])
+    now = datetime.utcnow()
+    db.session.execute(MailLog.__table__.insert(), [
+        {"participant_id": rnd.randint(1, participants), "mail_type": rnd.choice(MAIL_TYPES),
+         "sent_at": now - timedelta(seconds=rnd.randint(0, 60 * 86400)), "status": rnd.choice(STATUSES),
+         "error_message": ""}
+        for _ in range(rows)
+    ])
+    db.session.commit()
+
+
+def make_queries(participants: int, rnd) -> dict:
+    """{名前: 引数なしで1回実行する関数}"""
+    from extensions import db
+    from models import MailLog
+    from services.mail_queue_service import SENT_STATUSES, _sent_pairs
+    from services.mail_service import get_today_sent_count
+
+    def sent_check():
+        return db.session.query(
+            MailLog.query.filter(MailLog.participant_id == rnd.randint(1, participants),
+                                 MailLog.mail_type == "final_url",
+                                 MailLog.status.in_(SENT_STATUSES)).exists()
+        ).scalar()
+
+    return {
+        "今日の送信件数": get_today_sent_count,
+        "送信済みか（1人）": sent_check,
+        "送信済みの組（100人）": lambda: _sent_pairs(rnd.sample(range(1, participants + 1), 100)),
+    }
+
+
+def query_plan(run) -> list:
+    """run が発行した SELECT の EXPLAIN QUERY PLAN（detail 列）"""
+    from sqlalchemy import event
+
+    from extensions import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    statement, parameters = statements[-1]
+    cursor = db.session.connection().connection.cursor()
+    return [row[-1] for row in cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+
+def time_query(run, repeat: int) -> float:
+    """1回あたりの所要時間（ミリ秒、中央値）"""
+    run()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def measure(queries: dict, repeat: int) -> dict:
+    return {name: (query_plan(run), time_query(run, repeat)) for name, run in queries.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mail_logs の送信状況クエリのベンチマーク（索引あり / なし）")
+    parser.add_argument("--rows", type=int, default=100_000, help="mail_logs の行数（既定: 100000）")
+    parser.add_argument("--participants", type=int, default=3000, help="参加者数（既定: 3000）")
+    parser.add_argument("--repeat", type=int, default=20, help="クエリごとの計測回数（既定: 20）")
+    args = parser.parse_args()
+
+    from app import app
+    from extensions import db
+    from models import MailLog
+
+    rnd = random.Random(0)
+    try:
+        with app.app_context():
+            print(f"mail_logs {args.rows:,} 行 / 参加者 {args.participants:,} 人を作成中...")
+            seed(args.participants, args.rows, rnd)
+            queries = make_queries(args.participants, rnd)
+
+            indexed = measure(queries, args.repeat)
+            for index in MailLog.__table__.indexes:
+                index.drop(db.engine)
+            db.session.execute(db.text("ANALYZE"))
+            db.session.commit()
+            scanned = measure(queries, args.repeat)
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+    for name in queries:
+        (plan_indexed, ms_indexed), (plan_scanned, ms_scanned) = indexed[name], scanned[name]
+        print(f"\n{name}: 索引あり {ms_indexed:7.2f} ms / 索引なし {ms_scanned:7.2f} ms")
+        print("  索引あり:", " / ".join(plan_indexed))
+        print("  索引なし:", " / ".join(plan_scanned))
+
+
+if __name__ == "__main__":
+    main()
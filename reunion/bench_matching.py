@@ -0,0 +1,129 @@
+"""
+bench_matching.py - 銀行CSV自動照合（run_auto_matching）の名簿サイズ別ベンチマーク
+
+合成した名簿と振込名義に対して、照合索引（matching_service._MatchingIndex）と
+索引導入前の総当たり（全参加者 × 全候補名を _similarity_score で比較）を実行し、
+名簿サイズごとの所要時間と、両者の照合結果が一致するかを表示する。
+DB は使わない（参加者はメモリ上の合成データ）。
+
+使い方:
+  python bench_matching.py                             # 名簿 100 / 300 / 1000 人、振込 300 件
+  python bench_matching.py --sizes 300 1000 3000       # 名簿サイズを変える
+  python bench_matching.py --rows 500 --threshold 0.5  # 振込件数・しきい値を変える
+  python bench_matching.py --skip-naive                # 総当たりを省略（大きな名簿向け）
+
+出力:
+  - 名簿サイズごとの 索引構築・照合・総当たり の所要時間
+  - 総当たりと照合結果（参加者・スコア）が食い違った件数（0 であること）
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from services.matching_service import _MatchingIndex, _candidate_names, _similarity_score
+
+KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+CLASSES = [str(n) for n in range(31, 40)]
+BANK_PREFIXES = ["", "", "振込 ", "ネット振込 ", "ATM振込"]
+
+
+def make_participants(size: int, rnd) -> list:
+    """合成した参加者（_candidate_names が参照する属性だけを持つ）"""
+    participants = []
+    for i in range(size):
+        kana = "".join(rnd.choice(KANA) for _ in range(rnd.randint(4, 8)))
+        final = None
+        if rnd.random() < 0.6:
+            transfer = "".join(rnd.choice(KANA) for _ in range(rnd.randint(4, 8))) if rnd.random() < 0.2 else kana
+            final = SimpleNamespace(transfer_name=transfer)
+        participants.append(SimpleNamespace(
+            id=i + 1,
+            name=f"名前{i}",
+            name_kana=kana,
+            display_name=f"名前{i}",
+            display_name_kana=kana,
+            class_name=CLASSES[i % len(CLASSES)],
+            student_number=str(i // len(CLASSES) + 1),
+            latest_final=final,
+        ))
+    return participants
+
+
+def make_bank_names(participants: list, rows: int, rnd) -> list:
+    """振込名義（完全一致・プレフィックス付き・途中で切れたもの・文字の入れ替え・無関係な名義）"""
+    names = []
+    for _ in range(rows):
+        base = rnd.choice(_candidate_names(rnd.choice(participants)))
+        kind = rnd.random()
+        if kind < 0.4:
+            name = base
+        elif kind < 0.6:
+            name = base[:max(2, len(base) - rnd.randint(1, 3))]
+        elif kind < 0.75:
+            chars = list(base)
+            rnd.shuffle(chars)
+            name = "".join(chars)
+        else:
+            name = "".join(rnd.choice(KANA) for _ in range(rnd.randint(3, 10)))
+        names.append(rnd.choice(BANK_PREFIXES) + name)
+    return names
+
+
+def naive_best_match(participants: list, raw_name: str) -> tuple:
+    """索引導入前の run_auto_matching と同じ総当たり"""
+    best_score, best_participant = 0.0, None
+    for participant in participants:
+        for name in _candidate_names(participant):
+            score = _similarity_score(raw_name, name)
+            if score > best_score:
+                best_score, best_participant = score, participant
+    return best_participant, best_score
+
+
+def run_size(size: int, rows: int, threshold: float, skip_naive: bool, seed: int) -> dict:
+    rnd = random.Random(seed)
+    participants = make_participants(size, rnd)
+    bank_names = make_bank_names(participants, rows, rnd)
+
+    started = time.perf_counter()
+    index = _MatchingIndex(participants)
+    built = time.perf_counter()
+    indexed = [index.best_match(name, threshold) for name in bank_names]
+    matched = time.perf_counter()
+    result = {"build": built - started, "match": matched - built, "naive": None, "diff": None}
+
+    if not skip_naive:
+        started = time.perf_counter()
+        naive = []
+        for name in bank_names:
+            participant, score = naive_best_match(participants, name)
+            naive.append((participant, score) if participant and score >= threshold else (None, 0.0))
+        result["naive"] = time.perf_counter() - started
+        result["diff"] = sum(
+            1 for (p1, s1), (p2, s2) in zip(indexed, naive)
+            if (p1.id if p1 else None) != (p2.id if p2 else None) or abs(s1 - s2) > 1e-12
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="銀行CSV自動照合の名簿サイズ別ベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000], help="名簿の人数（既定: 100 300 1000）")
+    parser.add_argument("--rows", type=int, default=300, help="振込名義の件数（既定: 300）")
+    parser.add_argument("--threshold", type=float, default=0.8, help="照合のしきい値（既定: 0.8）")
+    parser.add_argument("--skip-naive", action="store_true", help="総当たりとの比較を省略する")
+    parser.add_argument("--seed", type=int, default=1, help="乱数のシード（既定: 1）")
+    args = parser.parse_args()
+
+    print(f"振込 {args.rows} 件 / しきい値 {args.threshold}")
+    print(f"{'名簿':>6}  {'索引構築':>9}  {'照合':>9}  {'総当たり':>9}  {'食い違い':>6}")
+    for size in args.sizes:
+        r = run_size(size, args.rows, args.threshold, args.skip_naive, args.seed)
+        naive = f"{r['naive'] * 1000:7.1f}ms" if r["naive"] is not None else "      -  "
+        diff = str(r["diff"]) if r["diff"] is not None else "-"
+        print(f"{size:>6}  {r['build'] * 1000:7.1f}ms  {r['match'] * 1000:7.1f}ms  {naive}  {diff:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+bench_startup.py - ワーカー起動時間の計測スクリプト
+
+新しい Python プロセスで `python -X importtime -c "import wsgi"` を繰り返し実行し、
+アプリの読み込み（create_app を含む）にかかる時間を表示する。
+gunicorn / PythonAnywhere のワーカーが起動するたびに払うコストと同じもの。
+
+使い方:
+  python bench_startup.py                 # 5回計測して中央値を表示
+  python bench_startup.py --runs 10       # 計測回数を変える
+  python bench_startup.py --module app    # import するモジュールを変える
+  python bench_startup.py --top 20        # 自身の読み込み時間が長いモジュールを20件表示
+
+出力:
+  - プロセス全体の所要時間・対象モジュールの import 時間（中央値）
+  - 自身の読み込み時間（self）が長いモジュール
+  - 起動時には読み込まないはずのモジュール（LAZY_MODULES）が読み込まれていないか
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# 起動時には読み込まず、使うルートの中で import するモジュール
+LAZY_MODULES = [
+    "services.mail_service",
+    "smtplib",
+    "email.mime.multipart",
+]
+
+
+def run_once(module: str) -> tuple:
+    """1プロセス分を計測する。Returns: (全体の秒数, {モジュール: (self μs, cumulative μs)})"""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.exit(f"import {module} に失敗しました:\n{proc.stderr[-2000:]}")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        # import time:       self [us] |  cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return elapsed, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ワーカー起動時間（import + create_app）の計測")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（既定: 5）")
+    parser.add_argument("--module", default="wsgi", help="import するモジュール（既定: wsgi）")
+    parser.add_argument("--top", type=int, default=10, help="表示するモジュール数（既定: 10）")
+    args = parser.parse_args()
+
+    # 1回目は .pyc の作成などで遅くなるので捨てる
+    run_once(args.module)
+
+    totals, imports, self_times = [], [], {}
+    for _ in range(args.runs):
+        elapsed, timings = run_once(args.module)
+        totals.append(elapsed * 1000)
+        imports.append(timings.get(args.module, (0, 0))[1] / 1000)
+        for name, (self_us, _) in timings.items():
+            self_times.setdefault(name, []).append(self_us / 1000)
+
+    print(f"計測回数: {args.runs}  ({sys.executable})")
+    print(f"プロセス全体:       中央値 {statistics.median(totals):7.1f} ms  (最小 {min(totals):.1f} ms)")
+    print(f"import {args.module}:  中央値 {statistics.median(imports):7.1f} ms  (最小 {min(imports):.1f} ms)")
+
+    print(f"\n自身の読み込み時間が長いモジュール（上位 {args.top} 件・中央値）:")
+    ranked = sorted(self_times.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, values in ranked[:args.top]:
+        print(f"  {statistics.median(values):7.1f} ms  {name}")
+
+    loaded = [name for name in LAZY_MODULES if name in self_times]
+    print("\n起動時に読み込まれた遅延読み込み対象:", ", ".join(loaded) if loaded else "なし")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+bench_templates.py - メールテンプレート描画（mail_service._render_template）のマイクロベンチマーク
+
+リマインドメール（件名・本文）を参加者ごとに名前・URLを変えて描画し、
+コンパイル済みテンプレートでの描画と、導入前の描画（変数ごとの str.replace +
+毎回コンパイルする re.sub）の所要時間を比べる。
+あわせて MAIL_DEFAULTS の全テンプレートで両者の出力が一致するかを確認する。
+DB・アプリは使わない（同窓会情報は合成した値）。
+
+使い方:
+  python bench_templates.py                  # 10,000 人分（件名 + 本文）
+  python bench_templates.py --count 50000    # 人数を変える
+  python bench_templates.py --template mail_final_url_body   # 描画する本文テンプレートを変える
+
+出力:
+  - 1万通あたりの所要時間（コンパイル済み / 導入前）と1通あたりの時間
+  - MAIL_DEFAULTS × 期限あり・なしで出力が食い違ったテンプレート（なし であること）
+"""
+import argparse
+import re
+import time
+
+from services.mail_service import MAIL_DEFAULTS, _PLACEHOLDER_RE, _render_template
+
+REUNION = {
+    "reunion_name": "第30回同窓会",
+    "reunion_date": "2026年8月15日（土）",
+    "reunion_time": "18:00〜20:30",
+    "reunion_venue": "ホテルグランドパレス 2F 桜の間",
+    "reunion_fee": "8,000",
+    "dress_code": "平服でお越しください",
+    "belongings": "特になし",
+    "organizer_name": "山田",
+    "transfer_bank": "みずほ銀行",
+    "transfer_branch": "本店",
+    "transfer_branch_number": "100",
+    "transfer_account_type": "普通",
+    "transfer_account_number": "1234567",
+    "transfer_account_name": "ドウソウカイ",
+    "transfer_deadline": "7月31日",
+}
+DEADLINES = {
+    "set": {"final_deadline_short": "7月20日", "final_reminder_deadline_short": "8月10日",
+            "deadline": "7月20日", "deadline_line": "回答期限: 7月20日 23:59"},
+    "empty": {"final_deadline_short": "", "final_reminder_deadline_short": "",
+              "deadline": "", "deadline_line": ""},
+}
+
+
+def legacy_render(template: str, **kwargs) -> str:
+    """テンプレートコンパイル導入前の _render_template"""
+    for key, val in kwargs.items():
+        template = template.replace("{" + key + "}", str(val))
+    template = re.sub(r'【\s*23:59締切】', '', template)
+    template = re.sub(r'【\s*23:59 JST までに】', '', template)
+    template = re.sub(r'※回答期限（\s*23:59）まで[^\n]*\n', '', template)
+    template = re.sub(r'※ご回答期限（\s*23:59）まで[^\n]*\n', '', template)
+    template = re.sub(r'※やむを得ず[^\n]*23:59まで[^\n]*ご連絡ください。\n',
+                      lambda m: m.group() if '/' in m.group() else '', template)
+    template = re.sub(r' +\n', '\n', template)
+    template = template.rstrip() + '\n' if template.strip() else template
+    return template
+
+
+def personal_vars(i: int) -> dict:
+    return dict(REUNION, **DEADLINES["set"],
+                name=f"参加者{i} 太郎",
+                final_url=f"https://example.com/form/final/tok{i:08d}",
+                provisional_url="https://example.com/form/provisional",
+                status="参加", status_url=f"https://example.com/status/{i}",
+                verify_url=f"https://example.com/verify/{i}", cancel_reason="体調不良のため")
+
+
+def check_defaults() -> list:
+    """MAIL_DEFAULTS の全テンプレートで両者の出力が食い違ったもの [(キー, 期限)]"""
+    mismatched = []
+    for key, template in MAIL_DEFAULTS.items():
+        for label, deadlines in DEADLINES.items():
+            values = dict(personal_vars(1), **deadlines)
+            # テンプレートにない変数も渡す（実際の送信処理と同じ）。一部の変数は未指定のまま残す
+            values.pop("transfer_deadline")
+            if _render_template(template, **values) != legacy_render(template, **values):
+                mismatched.append((key, label))
+    return mismatched
+
+
+def time_renders(render, subject: str, body: str, count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        values = personal_vars(i)
+        render(subject, **values)
+        render(body, **values)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="メールテンプレート描画のマイクロベンチマーク")
+    parser.add_argument("--count", type=int, default=10_000, help="描画する人数（既定: 10000）")
+    parser.add_argument("--template", default="mail_reminder_body", help="本文テンプレートのキー（既定: mail_reminder_body）")
+    args = parser.parse_args()
+
+    subject_key = args.template.replace("_body", "_subject")
+    subject = MAIL_DEFAULTS.get(subject_key, "")
+    body = MAIL_DEFAULTS[args.template]
+    names = sorted(set(_PLACEHOLDER_RE.findall(subject + body)))
+    print(f"テンプレート: {subject_key} / {args.template}（変数 {len(names)} 種）  {args.count:,} 人分")
+
+    # 1回目はキャッシュ・正規表現のコンパイルを含むので捨てる
+    time_renders(_render_template, subject, body, 10)
+    time_renders(legacy_render, subject, body, 10)
+    compiled = time_renders(_render_template, subject, body, args.count)
+    legacy = time_renders(legacy_render, subject, body, args.count)
+    print(f"コンパイル済み: {compiled:6.2f} 秒（1通 {compiled / args.count * 1e6:6.1f} μs）")
+    print(f"導入前:         {legacy:6.2f} 秒（1通 {legacy / args.count * 1e6:6.1f} μs）")
+
+    mismatched = check_defaults()
+    print(f"\nMAIL_DEFAULTS {len(MAIL_DEFAULTS)} 件 × 期限あり・なし の出力の食い違い:",
+          ", ".join(f"{key}（期限{'あり' if label == 'set' else 'なし'}）" for key, label in mismatched) or "なし")
+
+
+if __name__ == "__main__":
+    main()
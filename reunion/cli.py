@@ -0,0 +1,71 @@
+"""
+cli.py - 管理用 flask コマンド
+
+使い方:
+  flask --app app db-upgrade                     # 未適用のスキーマ変更を適用
+  flask --app app db-version                     # 適用済み / 最新のスキーマバージョン
+  flask --app app sync-latest-responses          # 最新回答IDを再計算して修正
+  flask --app app sync-latest-responses --check  # 食い違いの確認のみ（あれば終了コード1）
+  flask --app app mail-worker                    # 一括メール送信キューを常駐で処理
+  flask --app app mail-worker --once             # 送信可能なジョブを処理して終了
+"""
+import click
+from extensions import db
+
+
+def register_cli(app):
+    """flask コマンドを登録する"""
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade():
+        """未適用のスキーマ変更（migrations.MIGRATIONS）を適用する"""
+        from migrations import upgrade, get_schema_version
+
+        applied = upgrade(db)
+        for version, description in applied:
+            click.echo(f"  {version}: {description}")
+        click.echo(f"スキーマバージョン: {get_schema_version(db)}（適用 {len(applied)} 件）")
+
+    @app.cli.command("db-version")
+    def db_version():
+        """適用済み・最新のスキーマバージョンを表示する（古ければ終了コード1）"""
+        from migrations import get_schema_version, LATEST_VERSION
+
+        current = get_schema_version(db)
+        click.echo(f"適用済み: {current if current is not None else 'なし'} / 最新: {LATEST_VERSION}")
+        if current != LATEST_VERSION:
+            raise SystemExit(1)
+
+    @app.cli.command("sync-latest-responses")
+    @click.option("--check", is_flag=True, help="更新せず、食い違いの有無だけを確認する")
+    def sync_latest_responses(check):
+        """participants.latest_provisional_id / latest_final_id を回答履歴と突き合わせる"""
+        from models import refresh_latest_response_ids
+
+        with db.engine.connect() as conn:
+            changed = refresh_latest_response_ids(conn, dry_run=check)
+            conn.commit()
+
+        for pid, (prov_id, final_id) in sorted(changed.items())[:20]:
+            click.echo(f"  participant={pid}: latest_provisional_id={prov_id} latest_final_id={final_id}")
+        if len(changed) > 20:
+            click.echo(f"  ...ほか {len(changed) - 20} 件")
+
+        if check:
+            click.echo(f"食い違い: {len(changed)} 件")
+            if changed:
+                raise SystemExit(1)
+        else:
+            click.echo(f"更新しました: {len(changed)} 件")
+
+    @app.cli.command("mail-worker")
+    @click.option("--once", is_flag=True, help="送信可能なジョブを処理したら終了する")
+    @click.option("--interval", default=5, show_default=True, help="キューを確認する間隔（秒）")
+    def mail_worker(once, interval):
+        """一括メール送信キュー（mail_jobs）を処理する"""
+        from services.mail_queue_service import run_worker, queue_counts
+
+        run_worker(poll_interval=interval, once=once)
+        if once:
+            counts = queue_counts()
+            click.echo("送信キュー: " + " / ".join(f"{k}={v}" for k, v in sorted(counts.items())))
@@ -42,6 +42,8 @@ class Config:
     if "mysql" in _db_url:
         SQLALCHEMY_ENGINE_OPTIONS_EXTRA = {"connect_args": {"charset": "utf8mb4"}}
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 起動時に未適用のスキーマ変更を自動で適用する（0 にすると flask --app app db-upgrade で手動適用）
+    AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") != "0"
     SQLALCHEMY_ENGINE_OPTIONS = {
         "pool_pre_ping": True,      # 使用前に接続が生きているか確認
         "pool_recycle": 280,        # 280秒で接続を再作成（Renderの5分タイムアウト対策）
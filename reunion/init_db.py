@@ -8,11 +8,9 @@ init_db.py - データベース初期化スクリプト
   - instance/reunion.db を作成
   - 全テーブルを作成（既存テーブルはスキップ）
 """
-from app import create_app
+from app import app
 from extensions import db
 
-app = create_app()
-
 with app.app_context():
     db.create_all()
     print("データベースを初期化しました: instance/reunion.db")
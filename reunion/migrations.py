@@ -0,0 +1,240 @@
+"""
+migrations.py - スキーマのバージョン管理
+
+schema_version テーブルに適用済みのバージョンを1行だけ持ち、
+起動時はその1行を読んで最新なら何もしない（テーブル・カラムの走査をしない）。
+
+  - 新規DB: create_all で最新のスキーマを作り、最新バージョンを記録する
+  - 既存DB: 未適用のステップだけを順に適用する
+    （バージョン管理導入前に起動時マイグレーションで追加済みのカラム・インデックスは
+      存在チェックして飛ばすので、どの状態のDBからでも適用できる）
+
+新しいカラム・インデックスを追加するときは MIGRATIONS の末尾にステップを足す。
+新しいテーブルはモデルを追加すれば create_all で作られる（各ステップの前に実行される）。
+
+使い方:
+  flask --app app db-upgrade   # 未適用のステップを適用
+  flask --app app db-version   # 適用済み / 最新のバージョンを表示
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------------------------
+# ステップで使う操作（存在すれば何もしない）
+# -----------------------------------------------
+def _execute_ddl(conn, sql: str, what: str) -> bool:
+    """DDLを1文ずつ commit する（MySQL は DDL で暗黙に commit されるため）。失敗したら False"""
+    try:
+        conn.execute(text(sql))
+        conn.commit()
+        return True
+    except Exception as e:
+        # 複数プロセスが同時に適用した場合や、既存データに重複がある場合など
+        conn.rollback()
+        logger.warning(f"{what} を適用できませんでした: {e}")
+        return False
+
+
+def _add_columns(conn, columns) -> set:
+    """columns: [(テーブル, カラム, 定義)]。追加したカラムの (テーブル, カラム) を返す"""
+    inspector = inspect(conn)
+    existing = {}
+    added = set()
+    for table, column, col_def in columns:
+        if table not in existing:
+            existing[table] = {c["name"] for c in inspector.get_columns(table)}
+        if column in existing[table]:
+            continue
+        if _execute_ddl(conn, f"ALTER TABLE {table} ADD COLUMN {column} {col_def}", f"カラム {table}.{column}"):
+            existing[table].add(column)
+            added.add((table, column))
+    return added
+
+
+def _create_indexes(conn, indexes) -> None:
+    """indexes: [(テーブル, インデックス名, カラム, UNIQUE)]"""
+    inspector = inspect(conn)
+    existing = {}
+    for table, name, columns, unique in indexes:
+        if table not in existing:
+            existing[table] = {i["name"] for i in inspector.get_indexes(table)}
+        if name not in existing[table]:
+            _execute_ddl(
+                conn,
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})",
+                f"インデックス {name}",
+            )
+
+
+# -----------------------------------------------
+# マイグレーションステップ（バージョン順）
+# -----------------------------------------------
+def _v1_response_columns(conn):
+    _add_columns(conn, [
+        ("participants", "name_kana",     "VARCHAR(100) DEFAULT ''"),
+        ("final_responses", "bank_name",      "VARCHAR(100) DEFAULT ''"),
+        ("final_responses", "branch_name",    "VARCHAR(100) DEFAULT ''"),
+        ("final_responses", "account_number", "VARCHAR(50) DEFAULT ''"),
+        ("provisional_responses", "share_consent", "BOOLEAN DEFAULT 0"),
+        ("final_responses",       "share_consent", "BOOLEAN DEFAULT 0"),
+    ])
+
+
+def _v2_bank_import_dedup(conn):
+    _create_indexes(conn, [
+        ("bank_imports", "uq_bank_imports_dedup", ["filename", "raw_name", "raw_date", "raw_amount"], True),
+    ])
+
+
+def _v3_latest_response_ids(conn):
+    _create_indexes(conn, [
+        ("provisional_responses", "ix_provisional_responses_participant_submitted", ["participant_id", "submitted_at"], False),
+        ("final_responses", "ix_final_responses_participant_submitted", ["participant_id", "submitted_at"], False),
+    ])
+    added = _add_columns(conn, [
+        ("participants", "latest_provisional_id", "INTEGER"),
+        ("participants", "latest_final_id",       "INTEGER"),
+    ])
+    # 最新回答IDカラムを追加した場合は既存の回答から埋める
+    if added:
+        from models import refresh_latest_response_ids
+        refresh_latest_response_ids(conn)
+        conn.commit()
+
+
+def _v4_mail_log_indexes(conn):
+    _create_indexes(conn, [
+        ("mail_logs", "ix_mail_logs_participant_type_status", ["participant_id", "mail_type", "status"], False),
+        ("mail_logs", "ix_mail_logs_sent_at_status", ["sent_at", "status"], False),
+    ])
+
+
+def _v5_participant_search_columns(conn):
+    added = _add_columns(conn, [
+        ("participants", "name_normalized", "VARCHAR(100) DEFAULT ''"),
+        ("participants", "is_placeholder",  "BOOLEAN DEFAULT 0"),
+    ])
+    # 追加した場合は既存の名簿から埋める（正規化は Python 側で行うので1行ずつ値を作る）
+    if added:
+        from sqlalchemy import bindparam, select, update
+        from models import Participant, participant_search_columns
+        pt = Participant.__table__
+        rows = [
+            {"pid": pid, **participant_search_columns({"name": name, "email": email})}
+            for pid, name, email in conn.execute(select(pt.c.id, pt.c.name, pt.c.email))
+        ]
+        if rows:
+            conn.execute(
+                update(pt).where(pt.c.id == bindparam("pid")).values(
+                    name_normalized=bindparam("name_normalized"),
+                    is_placeholder=bindparam("is_placeholder"),
+                ),
+                rows,
+            )
+        conn.commit()
+    _create_indexes(conn, [
+        ("participants", "ix_participants_placeholder_name", ["is_placeholder", "name_normalized"], False),
+    ])
+
+
+def _v6_attendance_idempotency(conn):
+    _add_columns(conn, [
+        ("attendance_records", "idempotency_key", "VARCHAR(100)"),
+    ])
+    _create_indexes(conn, [
+        ("attendance_records", "uq_attendance_records_idempotency_key", ["idempotency_key"], True),
+        ("attendance_records", "ix_attendance_records_participant_checked_in", ["participant_id", "checked_in_at"], False),
+    ])
+
+
+# (バージョン, 説明, 適用関数)
+MIGRATIONS = [
+    (1, "回答・名簿の追加カラム", _v1_response_columns),
+    (2, "銀行取込の重複防止インデックス", _v2_bank_import_dedup),
+    (3, "参加者の最新回答ID", _v3_latest_response_ids),
+    (4, "mail_logs の送信状況インデックス", _v4_mail_log_indexes),
+    (5, "参加者の名寄せ用カラム", _v5_participant_search_columns),
+    (6, "出席登録の重複防止キー", _v6_attendance_idempotency),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# -----------------------------------------------
+# バージョン管理
+# -----------------------------------------------
+def get_schema_version(db):
+    """適用済みのバージョン。schema_version テーブルがなければ None"""
+    try:
+        with db.engine.connect() as conn:
+            return conn.execute(text("SELECT version FROM schema_version WHERE id = 1")).scalar()
+    except Exception:
+        return None
+
+
+def _set_version(conn, version: int) -> None:
+    updated = conn.execute(
+        text("UPDATE schema_version SET version = :v, applied_at = :at WHERE id = 1"),
+        {"v": version, "at": datetime.utcnow()},
+    ).rowcount
+    if not updated:
+        try:
+            conn.execute(
+                text("INSERT INTO schema_version (id, version, applied_at) VALUES (1, :v, :at)"),
+                {"v": version, "at": datetime.utcnow()},
+            )
+        except IntegrityError:
+            # 別のプロセスが先に記録した
+            conn.rollback()
+            _set_version(conn, version)
+
+
+def upgrade(db) -> list:
+    """
+    未適用のステップを適用する（app_context 内で呼ぶこと）。
+    Returns: 適用したステップの [(バージョン, 説明)]
+    """
+    import models  # noqa: F401  create_all の対象にモデルを登録する
+
+    with db.engine.connect() as conn:
+        is_new_db = not inspect(conn).has_table("participants")
+    db.create_all()
+
+    current = get_schema_version(db) or 0
+    if is_new_db:
+        # create_all で最新のスキーマになっているので、バージョンだけ記録する
+        with db.engine.connect() as conn:
+            _set_version(conn, LATEST_VERSION)
+            conn.commit()
+        logger.info(f"スキーマを作成しました (version {LATEST_VERSION})")
+        return []
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with db.engine.connect() as conn:
+            step(conn)
+            _set_version(conn, version)
+            conn.commit()
+        logger.info(f"マイグレーション適用: {version} {description}")
+        applied.append((version, description))
+    return applied
+
+
+def ensure_schema(db, auto_upgrade: bool = True) -> None:
+    """起動時の確認。schema_version が最新なら1クエリで終わり、古ければ upgrade する"""
+    current = get_schema_version(db)
+    if current == LATEST_VERSION:
+        return
+    if not auto_upgrade:
+        logger.warning(
+            f"スキーマが最新ではありません (version {current} / 最新 {LATEST_VERSION})。"
+            "flask --app app db-upgrade を実行してください"
+        )
+        return
+    upgrade(db)
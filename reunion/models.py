@@ -8,9 +8,16 @@ models.py - データベースモデル定義（SQLAlchemy ORM）
   payments           : 入金管理
   bank_imports       : 銀行CSV取込データ
   mail_logs          : メール送信ログ
+  mail_jobs          : 一括メール送信キュー
 """
 from datetime import datetime
+from sqlalchemy import event, inspect, select, update, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from extensions import db
+from utils import normalize_name
+
+PLACEHOLDER_DOMAIN = "@placeholder.local"  # メールアドレス未登録の名簿レコードに付けるダミードメイン
 
 
 class Participant(db.Model):
@@ -33,6 +40,18 @@ class Participant(db.Model):
     teacher_memo = db.Column(db.Text, default="")             # 幹事用メモ
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 最新回答IDの非正規化カラム（回答の追加・削除時に _sync_latest_response_ids が更新する）
+    # 回答削除時に一時的に参照切れになるため外部キー制約は付けない
+    latest_provisional_id = db.Column(db.Integer, nullable=True)
+    latest_final_id = db.Column(db.Integer, nullable=True)
+    # 名寄せ用の非正規化カラム（name / email の変更時に participant_search_columns で設定する）
+    name_normalized = db.Column(db.String(100), default="")   # スペースを除いた氏名
+    is_placeholder = db.Column(db.Boolean, default=False)      # メールアドレスがプレースホルダー（本人未連絡）
+
+    __table_args__ = (
+        # 仮出欠フォームの名寄せ（プレースホルダーの名簿レコードを氏名で探す）用
+        db.Index("ix_participants_placeholder_name", "is_placeholder", "name_normalized"),
+    )
 
     # リレーション
     provisional_responses = db.relationship(
@@ -47,6 +66,9 @@ class Participant(db.Model):
     mail_logs = db.relationship(
         "MailLog", backref="participant", lazy=True, cascade="all, delete-orphan"
     )
+    mail_jobs = db.relationship(
+        "MailJob", backref="participant", lazy=True, cascade="all, delete-orphan"
+    )
     attendance_records = db.relationship(
         "AttendanceRecord", backref="participant", lazy=True, cascade="all, delete-orphan"
     )
@@ -64,24 +86,77 @@ class Participant(db.Model):
     @property
     def latest_provisional(self):
         """最新の仮出欠回答を返す"""
-        if self.provisional_responses:
-            return sorted(self.provisional_responses, key=lambda r: r.submitted_at, reverse=True)[0]
-        return None
+        return self._latest_response("provisional_responses", ProvisionalResponse, "latest_provisional_id")
 
     @property
     def latest_final(self):
         """最新の本出欠回答を返す"""
-        if self.final_responses:
-            return sorted(self.final_responses, key=lambda r: r.submitted_at, reverse=True)[0]
+        return self._latest_response("final_responses", FinalResponse, "latest_final_id")
+
+    def _latest_response(self, collection, model, latest_id_attr):
+        """
+        最新回答を返す。
+        回答履歴が読み込み済みならそこから選び、未読み込みなら非正規化カラムの1件だけを取得する。
+        この参加者の未フラッシュの回答（追加・変更・削除）がセッションにあれば latest_*_id は古いので、
+        回答履歴を読み込んで選ぶ（読み込みのクエリの autoflush で反映される）。
+        テンプレートや before_flush の中から呼ばれることがあるので、ここで flush はしない。
+        """
+        state = inspect(self)
+        session = state.session
+        if collection in state.unloaded and session is not None and not self._has_unflushed(session, model):
+            latest_id = getattr(self, latest_id_attr)
+            return session.get(model, latest_id) if latest_id is not None else None
+        responses = getattr(self, collection)
+        if responses:
+            # 未フラッシュの回答は submitted_at が未設定なので最新として扱う
+            return sorted(responses, key=lambda r: r.submitted_at or datetime.max, reverse=True)[0]
         return None
 
+    def _has_unflushed(self, session, model) -> bool:
+        """この参加者の model の回答で、フラッシュしていない追加・変更・削除があれば True"""
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if not isinstance(obj, model):
+                continue
+            if inspect(obj).attrs.participant.loaded_value is self:
+                return True
+            if self.id is not None and obj.participant_id == self.id:
+                return True
+        return False
+
     def __repr__(self):
         return f"<Participant {self.id}: {self.name} ({self.email})>"
 
 
+def participant_search_columns(values: dict) -> dict:
+    """
+    name / email の値から名寄せ用カラム（name_normalized / is_placeholder）の値を作る。
+    values に含まれる項目の分だけ返す（一括 UPDATE で変更のあった項目だけ渡せるように）。
+    """
+    columns = {}
+    if "name" in values:
+        columns["name_normalized"] = normalize_name(values["name"])
+    if "email" in values:
+        columns["is_placeholder"] = (values["email"] or "").endswith(PLACEHOLDER_DOMAIN)
+    return columns
+
+
+@event.listens_for(Participant, "before_insert")
+@event.listens_for(Participant, "before_update")
+def _set_participant_search_columns(mapper, connection, target):
+    """ORM経由の追加・更新で名寄せ用カラムを設定する（一括 INSERT / UPDATE では呼ばれない）"""
+    for key, value in participant_search_columns({"name": target.name, "email": target.email}).items():
+        setattr(target, key, value)
+
+
 class AttendanceRecord(db.Model):
     """会場QR出席登録履歴"""
     __tablename__ = "attendance_records"
+    __table_args__ = (
+        # 同じ参加者の短時間の再スキャンで記録を重複させない（attendance_service.check_in）
+        db.Index("uq_attendance_records_idempotency_key", "idempotency_key", unique=True),
+        # 参加者ごとの直近の出席登録の確認用
+        db.Index("ix_attendance_records_participant_checked_in", "participant_id", "checked_in_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     participant_id = db.Column(db.Integer, db.ForeignKey("participants.id"), nullable=False)
@@ -91,6 +166,7 @@ class AttendanceRecord(db.Model):
     email_sent_at = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(20), default="checked_in")
     notes = db.Column(db.Text, default="")
+    idempotency_key = db.Column(db.String(100), nullable=True)  # 参加者×登録経路×時間枠（管理画面からの登録は空）
 
     def __repr__(self):
         return f"<AttendanceRecord {self.id}: participant={self.participant_id}>"
@@ -103,6 +179,10 @@ class ProvisionalResponse(db.Model):
     最新のものが有効な回答として扱われる。
     """
     __tablename__ = "provisional_responses"
+    __table_args__ = (
+        # 参加者ごとの最新回答の再計算用（refresh_latest_response_ids）
+        db.Index("ix_provisional_responses_participant_submitted", "participant_id", "submitted_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     participant_id = db.Column(db.Integer, db.ForeignKey("participants.id"), nullable=False)
@@ -132,6 +212,10 @@ class FinalResponse(db.Model):
     トークン付きURLから回答。同一人物の複数回答も履歴として保持。
     """
     __tablename__ = "final_responses"
+    __table_args__ = (
+        # 参加者ごとの最新回答の再計算用（refresh_latest_response_ids）
+        db.Index("ix_final_responses_participant_submitted", "participant_id", "submitted_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     participant_id = db.Column(db.Integer, db.ForeignKey("participants.id"), nullable=False)
@@ -212,6 +296,10 @@ class BankImport(db.Model):
     照合は matching_service.py で実施。
     """
     __tablename__ = "bank_imports"
+    __table_args__ = (
+        # 重複取込防止（save_bank_imports の重複判定キー）
+        db.Index("uq_bank_imports_dedup", "filename", "raw_name", "raw_date", "raw_amount", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(200), default="")           # 元のファイル名
@@ -276,10 +364,47 @@ class MailLog(db.Model):
     status = db.Column(db.String(20), default="sent")
     error_message = db.Column(db.Text, default="")             # 失敗時のエラーメッセージ
 
+    __table_args__ = (
+        # 「参加者が mail_type を送信済みか」の判定用（送信キュー・自動送信・ダッシュボード）
+        db.Index("ix_mail_logs_participant_type_status", "participant_id", "mail_type", "status"),
+        # 今日の送信件数（get_today_sent_count）用
+        db.Index("ix_mail_logs_sent_at_status", "sent_at", "status"),
+    )
+
     def __repr__(self):
         return f"<MailLog {self.id}: participant={self.participant_id} type={self.mail_type} status={self.status}>"
 
 
+class MailJob(db.Model):
+    """
+    一括メール送信キューテーブル
+    一括送信ボタンで1人1通ずつ登録し、mail_queue_service のワーカーが順に送信する。
+    参加者×メール種別で1行（同じ送信を二重に積まない）。
+    """
+    __tablename__ = "mail_jobs"
+    __table_args__ = (
+        db.Index("uq_mail_jobs_participant_type", "participant_id", "mail_type", unique=True),
+        db.Index("ix_mail_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    participant_id = db.Column(db.Integer, db.ForeignKey("participants.id"), nullable=False)
+    # mail_type: final_url / reminder / final_reminder / attendance_checkin
+    mail_type = db.Column(db.String(50), nullable=False)
+    # status: pending=送信待ち / running=送信中 / sent=送信済み / failed=再試行上限で失敗 / cancelled=送信不要
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)       # 送信を試みた回数
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)       # この日時以降に送信（再試行の待ち時間）
+    locked_by = db.Column(db.String(100), nullable=True)              # 送信中のワーカーID
+    locked_until = db.Column(db.DateTime, nullable=True)              # リース期限（過ぎたら他のワーカーが引き継ぐ）
+    last_error = db.Column(db.Text, default="")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MailJob {self.id}: participant={self.participant_id} type={self.mail_type} status={self.status}>"
+
+
 class VerificationToken(db.Model):
     """
     メール認証トークンテーブル
@@ -303,3 +428,99 @@ class VerificationToken(db.Model):
 
     def __repr__(self):
         return f"<VerificationToken {self.id}: participant={self.participant_id} email={self.new_email}>"
+
+
+# -----------------------------------------------
+# 最新回答IDの非正規化カラム（participants.latest_*_id）の維持
+# -----------------------------------------------
+_LATEST_RESPONSE_COLUMNS = (
+    (ProvisionalResponse, "latest_provisional_id"),
+    (FinalResponse, "latest_final_id"),
+)
+
+
+def refresh_latest_response_ids(conn, participant_ids=None, dry_run=False) -> dict:
+    """
+    participants.latest_provisional_id / latest_final_id を回答テーブルから再計算する。
+
+    最新 = submitted_at が最大のもの。同時刻が複数ある場合は id が最小のもの
+    （Participant.latest_provisional / latest_final と同じ結果）。
+
+    Args:
+        conn: SQLAlchemy Connection
+        participant_ids: 対象の参加者ID（None なら全員）
+        dry_run: True なら更新せず差分だけ返す（整合性チェック用）
+    Returns:
+        値が食い違っていた参加者の {participant_id: (latest_provisional_id, latest_final_id)}（正しい値）
+    """
+    if participant_ids is not None:
+        participant_ids = list(participant_ids)
+        if not participant_ids:
+            return {}
+
+    expected = {}
+    for model, _ in _LATEST_RESPONSE_COLUMNS:
+        q = select(model.participant_id, model.id).order_by(
+            model.participant_id, model.submitted_at.desc(), model.id
+        )
+        if participant_ids is not None:
+            q = q.where(model.participant_id.in_(participant_ids))
+        latest = {}
+        for pid, rid in conn.execute(q):
+            latest.setdefault(pid, rid)
+        expected[model] = latest
+
+    pt = Participant.__table__
+    q = select(pt.c.id, pt.c.latest_provisional_id, pt.c.latest_final_id)
+    if participant_ids is not None:
+        q = q.where(pt.c.id.in_(participant_ids))
+    changed = {}
+    for pid, prov_id, final_id in conn.execute(q):
+        new = (expected[ProvisionalResponse].get(pid), expected[FinalResponse].get(pid))
+        if (prov_id, final_id) != new:
+            changed[pid] = new
+
+    if changed and not dry_run:
+        conn.execute(
+            update(pt).where(pt.c.id == bindparam("pid")).values(
+                latest_provisional_id=bindparam("prov_id"),
+                latest_final_id=bindparam("final_id"),
+            ),
+            [{"pid": pid, "prov_id": prov_id, "final_id": final_id}
+             for pid, (prov_id, final_id) in changed.items()],
+        )
+    return changed
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_latest_response_ids(session, flush_context):
+    """回答の追加・変更・削除をフラッシュしたら、該当参加者の latest_*_id を更新する"""
+    participant_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (ProvisionalResponse, FinalResponse)):
+            participant_ids.add(obj.participant_id)
+            # participant_id を付け替えた場合は元の参加者も再計算
+            participant_ids.update(inspect(obj).attrs.participant_id.history.deleted or ())
+    participant_ids.discard(None)
+    if not participant_ids:
+        return
+
+    changed = refresh_latest_response_ids(session.connection(), participant_ids)
+    # セッション内の Participant にも反映（UPDATE はORMを経由しないため）
+    for pid, (prov_id, final_id) in changed.items():
+        p = session.identity_map.get(session.identity_key(Participant, pid))
+        if p is not None:
+            set_committed_value(p, "latest_provisional_id", prov_id)
+            set_committed_value(p, "latest_final_id", final_id)
+
+
+class SchemaVersion(db.Model):
+    """
+    スキーマのバージョン（1行のみ）
+    起動時はこの1行で最新かどうかを判定する（migrations.py）。
+    """
+    __tablename__ = "schema_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -3,12 +3,13 @@ routes/admin.py - 管理画面のルーティング
 
 URL:
   GET  /admin/                          管理画面トップ（ダッシュボード）
-  GET  /admin/participants              参加者一覧
+  GET  /admin/participants              参加者一覧（?per_page=&after=<id>|before=<id> でページ送り）
   GET  /admin/participant/<id>          参加者詳細
   POST /admin/participant/<id>/memo     メモ更新
   POST /admin/send-final-url/<id>       個別送信
   POST /admin/send-final-url-bulk       一括送信
   GET  /admin/payments                  入金管理一覧
+  GET  /admin/payments/export           入金一覧CSVエクスポート（?format=xlsx でExcel）
   POST /admin/payment/<id>/update       入金ステータス更新
   GET  /admin/csv-import                CSV取込画面
   POST /admin/csv-import                CSV取込実行
@@ -16,25 +17,30 @@ URL:
   POST /admin/confirm-match             手動照合確定
   POST /admin/unmatch/<id>              照合解除
   GET  /admin/roster                    名簿管理画面
-  POST /admin/roster/import             名簿CSV取込
+  POST /admin/roster/import             名簿CSV取込（差分の確認画面）
+  POST /admin/roster/import/apply       名簿CSVの差分を反映
   POST /admin/roster/add                参加者1名手動追加
   POST /admin/roster/delete/<id>        参加者削除
-  GET  /admin/roster/export             名簿CSVエクスポート
+  GET  /admin/roster/export             名簿CSVエクスポート（?format=xlsx でExcel）
+  GET  /admin/qr-attendance             会場QR出席管理（受付ボード）
+  GET  /admin/api/qr-attendance/updates 受付ボードの差分（?since=<出席記録ID>）
 """
 import csv
 import io
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask import (Blueprint, render_template, request, redirect,
-                   url_for, flash, current_app, jsonify, Response)
+                   url_for, flash, current_app, jsonify, Response,
+                   send_file, stream_with_context)
 from extensions import db
-from models import Participant, ProvisionalResponse, FinalResponse, Payment, BankImport, MailLog, AppSetting, AttendanceRecord
+from models import Participant, ProvisionalResponse, FinalResponse, Payment, BankImport, MailLog, AttendanceRecord
 from services.token_service import ensure_token, generate_final_url
-from services.mail_service import (send_final_url, send_reminder, send_final_reminder,
-                                    MAIL_DEFAULTS, get_daily_send_limit,
-                                    get_today_sent_count, get_remaining_today)
-from services.csv_service import parse_bank_csv, save_bank_imports
+from services.csv_service import iter_bank_csv, save_bank_imports
 from services.matching_service import run_auto_matching, confirm_match, unmatch
+from services.stats_service import get_dashboard_counts, sent_mail_types_by_participant
+from services.settings_service import get_setting, get_settings, save_settings
+from services.mail_queue_service import (enqueue_mail_jobs, start_background_worker,
+                                          next_wakeup, get_guide_pdf_path)
 from utils import normalize_transfer_name
 
 logger = logging.getLogger(__name__)
@@ -57,92 +63,28 @@ def require_admin_auth():
 @admin_bp.route("/")
 def index():
     """管理画面トップ：各種集計を表示"""
-    total = Participant.query.count()
-    provisional_attending = 0
-    provisional_not_attending = 0
-    provisional_undecided = 0
-    final_attending = 0
-    final_not_attending = 0
-    final_cancelled = 0
-    final_no_response = 0
-    no_response = 0
-    paid_count = 0
-    unpaid_count = 0
-    final_url_sent = 0
-    final_url_unsent = 0
+    from services.mail_service import get_daily_send_limit, get_today_sent_count
 
-    participants = Participant.query.all()
-    for p in participants:
-        prov = p.latest_provisional
-        final = p.latest_final
-        if prov:
-            if prov.status == "attending":
-                provisional_attending += 1
-            elif prov.status == "not_attending":
-                provisional_not_attending += 1
-            elif prov.status == "undecided":
-                provisional_undecided += 1
-        else:
-            no_response += 1
-
-        if final:
-            if final.status == "attending":
-                final_attending += 1
-            elif final.status == "cancelled":
-                final_cancelled += 1
-            else:
-                final_not_attending += 1
-        else:
-            final_no_response += 1
-
-        has_final_url_mail = any(
-            ml.mail_type == "final_url" and ml.status in ("sent", "simulated")
-            for ml in p.mail_logs
-        )
-        if has_final_url_mail:
-            final_url_sent += 1
-        else:
-            final_url_unsent += 1
-
-        if p.payment:
-            final_status = final.status if final else None
-            if p.payment.payment_status == "paid":
-                paid_count += 1
-            elif final_status not in ("not_attending", "cancelled"):
-                unpaid_count += 1
+    # 参加者ごとの最新回答・支払・送信状況は SQL 側で集計する（参加者数によらず一定のクエリ数）
+    stats = get_dashboard_counts()
 
-    no_email_count = Participant.query.filter(
-        Participant.email.like("%@placeholder.local")
-    ).count()
+    # ワーカーの再起動などで止まった送信キューがあれば再開する
+    if next_wakeup() is not None:
+        start_background_worker(current_app._get_current_object())
 
     daily_limit = get_daily_send_limit()
     today_sent = get_today_sent_count()
     remaining_today = max(0, daily_limit - today_sent)
-    send_stage = (final_url_sent // daily_limit) + 1 if daily_limit > 0 else 1
-
-    stats = {
-        "total": total,
-        "provisional_attending": provisional_attending,
-        "provisional_not_attending": provisional_not_attending,
-        "provisional_undecided": provisional_undecided,
-        "final_attending": final_attending,
-        "final_not_attending": final_not_attending,
-        "final_cancelled": final_cancelled,
-        "final_no_response": final_no_response,
-        "no_provisional_response": no_response,
-        "paid": paid_count,
-        "unpaid": unpaid_count,
-        "no_email": no_email_count,
-        "final_url_sent": final_url_sent,
-        "final_url_unsent": final_url_unsent,
+    send_stage = (stats["final_url_sent"] // daily_limit) + 1 if daily_limit > 0 else 1
+
+    stats.update({
         "daily_limit": daily_limit,
         "today_sent": today_sent,
         "remaining_today": remaining_today,
         "send_stage": send_stage,
-    }
+    })
     def _form_locked(key):
-        s = AppSetting.query.filter_by(key=key).first()
-        return s.value == "1" if s else False
+        return get_setting(key) == "1"
 
     locks = {
         "provisional": _form_locked("provisional_form_locked"),
@@ -151,11 +93,30 @@ def index():
     return render_template("admin/index.html", stats=stats, locks=locks)
 
 
+QR_ATTENDANCE_CLASSES = [str(n) for n in range(31, 40)]
+QR_ATTENDANCE_POLL_SECONDS = 5   # 受付ボードが差分を取りに来る間隔
+# 受付ボードの差分で、前回の最大IDより小さくても登録がこの秒数以内の出席記録は返し直す
+# （複数ワーカーで同時に登録すると、小さいIDの記録が後から commit されることがあるため）
+QR_ATTENDANCE_LOOKBACK_SECONDS = 30
+
+
 @admin_bp.route("/qr-attendance")
 def qr_attendance():
-    """会場QR出席の管理画面"""
+    """会場QR出席の管理画面（初期表示。以降の出席登録は api_qr_attendance_updates の差分で反映する）"""
+    from sqlalchemy.orm import aliased
+
     # 名簿CSVの読み込み順（DB登録順: created_at）を保ちつつクラス順に表示
-    participants = Participant.query.order_by(Participant.class_name, Participant.created_at).all()
+    # 本出欠は最新回答のステータスだけを同じクエリで取得する（参加者ごとの読み込みをしない）
+    final = aliased(FinalResponse)
+    rows = (
+        db.session.query(Participant, final.status)
+        .outerjoin(final, final.id == Participant.latest_final_id)
+        .order_by(Participant.class_name, Participant.created_at)
+        .all()
+    )
+    participants = [p for p, _ in rows]
+    final_status = {p.id: status for p, status in rows}
+    # record.participant は上で読み込んだ参加者から解決される（追加のクエリなし）
     records = AttendanceRecord.query.order_by(AttendanceRecord.checked_in_at.desc()).all()
     qr_url = url_for("attendance_scan", _external=True)
     total = len(participants)
@@ -170,12 +131,12 @@ def qr_attendance():
             latest_checkin[r.participant_id] = r
 
     def _member_info(p):
-        final = p.latest_final
+        status = final_status.get(p.id)
         rec = latest_checkin.get(p.id)
         return {
             "participant": p,
-            "final_attending": bool(final and final.status == "attending"),
-            "final_status": final.status if final else None,
+            "final_attending": status == "attending",
+            "final_status": status,
             "checked_in": rec is not None,
             "checked_in_at": rec.checked_in_at if rec else None,
         }
@@ -183,35 +144,27 @@ def qr_attendance():
     def _kana_key(p):
         return (p.name_kana or p.name or "")
 
-    roster = []
-    for key in [str(n) for n in range(31, 40)]:
-        members = sorted(
-            [p for p in participants
-             if p.class_name == key and p.role in ("生徒", "幹事")],
-            key=_kana_key,
-        )
-        infos = [_member_info(p) for p in members]
-        roster.append({
+    def _group(key, label, members):
+        infos = [_member_info(p) for p in sorted(members, key=_kana_key)]
+        return {
             "key": key,
-            "label": key,
+            "label": label,
             "members": infos,
             "attending_count": sum(1 for m in infos if m["final_attending"]),
             "arrived_count": sum(1 for m in infos if m["checked_in"]),
             "pending_count": sum(1 for m in infos if m["final_attending"] and not m["checked_in"]),
-        })
-    teachers = sorted(
-        [p for p in participants if p.role in ("教師", "学年主任")],
-        key=_kana_key,
-    )
-    teacher_infos = [_member_info(p) for p in teachers]
-    roster.append({
-        "key": "teacher",
-        "label": "教職員",
-        "members": teacher_infos,
-        "attending_count": sum(1 for m in teacher_infos if m["final_attending"]),
-        "arrived_count": sum(1 for m in teacher_infos if m["checked_in"]),
-        "pending_count": sum(1 for m in teacher_infos if m["final_attending"] and not m["checked_in"]),
-    })
+        }
+
+    # 参加者を1回だけ走査してクラスごとに振り分ける
+    by_class = {key: [] for key in QR_ATTENDANCE_CLASSES}
+    teachers = []
+    for p in participants:
+        if p.role in ("生徒", "幹事") and p.class_name in by_class:
+            by_class[p.class_name].append(p)
+        elif p.role in ("教師", "学年主任"):
+            teachers.append(p)
+    roster = [_group(key, key, members) for key, members in by_class.items()]
+    roster.append(_group("teacher", "教職員", teachers))
 
     return render_template(
         "admin/qr_attendance.html",
@@ -222,7 +175,78 @@ def qr_attendance():
         checked_count=checked_count,
         not_checked=not_checked,
         roster=roster,
+        # 受付ボードの差分取得の起点
+        last_record_id=max((r.id for r in records), default=0),
+        mail_cursor=max((r.email_sent_at for r in records if r.email_sent_at), default=None),
+        poll_seconds=QR_ATTENDANCE_POLL_SECONDS,
+    )
+
+
+@admin_bp.route("/api/qr-attendance/updates")
+def api_qr_attendance_updates():
+    """
+    受付ボードの差分（?since=<最後に受け取った出席記録ID>&mail_since=<確認メール送信日時>）。
+    新しい出席記録と、確認メールが送信済みになった出席記録のIDだけを返す。
+    取りこぼさないよう、どちらも前回の境界の記録を返し直すことがある（受付ボードはIDで重複を除く）。
+      - 出席記録: ID が since より大きいもの + QR_ATTENDANCE_LOOKBACK_SECONDS 秒以内に登録されたもの
+      - 確認メール: 送信日時が mail_since 以降（同じ時刻を含む。MySQL の DATETIME は秒未満を持たないため）
+    """
+    since = request.args.get("since", 0, type=int)
+    mail_since = request.args.get("mail_since", "")
+    try:
+        mail_since = datetime.fromisoformat(mail_since) if mail_since else None
+    except ValueError:
+        return jsonify({"error": "mail_since が不正です"}), 400
+
+    recent = datetime.utcnow() - timedelta(seconds=QR_ATTENDANCE_LOOKBACK_SECONDS)
+    new_records = (
+        db.session.query(
+            AttendanceRecord.id, AttendanceRecord.participant_id, AttendanceRecord.status,
+            AttendanceRecord.checked_in_at, AttendanceRecord.email_sent,
+            Participant.name, Participant.role, Participant.class_name, Participant.student_number,
+        )
+        .join(Participant, Participant.id == AttendanceRecord.participant_id)
+        .filter(db.or_(AttendanceRecord.id > since, AttendanceRecord.checked_in_at >= recent))
+        .order_by(AttendanceRecord.id)
+        .all()
     )
+    mailed_query = db.session.query(AttendanceRecord.id, AttendanceRecord.email_sent_at).filter(
+        AttendanceRecord.email_sent.is_(True), AttendanceRecord.email_sent_at.isnot(None),
+    )
+    if mail_since is not None:
+        mailed_query = mailed_query.filter(AttendanceRecord.email_sent_at >= mail_since)
+    mailed = mailed_query.all()
+
+    mail_cursor = max((sent_at for _, sent_at in mailed), default=mail_since)
+    checked_count = None
+    if new_records:
+        checked_count = (
+            db.session.query(db.func.count(db.distinct(AttendanceRecord.participant_id)))
+            .filter(AttendanceRecord.status == "checked_in")
+            .scalar()
+        )
+
+    return jsonify({
+        "last_id": max([since] + [r.id for r in new_records]),
+        "mail_cursor": mail_cursor.isoformat() if mail_cursor else "",
+        "checked_count": checked_count,   # 返す記録がなければ null（表示はそのまま）
+        "records": [
+            {
+                "id": r.id,
+                "participant_id": r.participant_id,
+                "status": r.status,
+                "name": r.name,
+                "role": r.role or "",
+                "class_name": r.class_name or "",
+                "student_number": r.student_number or "",
+                "checked_in_at": r.checked_in_at.strftime("%Y/%m/%d %H:%M") if r.checked_in_at else "",
+                "checked_in_time": r.checked_in_at.strftime("%H:%M") if r.checked_in_at else "",
+                "email_sent": bool(r.email_sent),
+            }
+            for r in new_records
+        ],
+        "mailed": [record_id for record_id, _ in mailed],
+    })
 
 
 @admin_bp.route('/participant/<int:participant_id>/set-attendance', methods=['POST'])
@@ -258,14 +282,9 @@ def toggle_form_lock(form_type):
         flash("不正なフォーム種別です。", "danger")
         return redirect(url_for("admin.index"))
     key = f"{form_type}_form_locked"
-    s = AppSetting.query.filter_by(key=key).first()
-    current = s.value == "1" if s else False
+    current = get_setting(key) == "1"
     new_val = "0" if current else "1"
-    if s:
-        s.value = new_val
-        s.updated_at = datetime.utcnow()
-    else:
-        db.session.add(AppSetting(key=key, value=new_val))
+    save_settings({key: new_val})
     db.session.commit()
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         from flask import make_response
@@ -279,10 +298,49 @@ def toggle_form_lock(form_type):
 # -----------------------------------------------
 # 参加者一覧・詳細
 # -----------------------------------------------
+PARTICIPANTS_PER_PAGE = 100       # 参加者一覧の1ページ件数（既定）
+PARTICIPANTS_PER_PAGE_MAX = 1000  # per_page で指定できる上限
+
+ROLE_ORDER = {"生徒": 0, "教師": 1, "学年主任": 2, "幹事": 3}
+
+
+def _participant_sort_columns(sort: str) -> list:
+    """参加者一覧の並べ替えキー（SQL式のリスト）を返す"""
+    # 出席番号: 数字のみなら数値順、それ以外は末尾（9999扱い）
+    number = db.case(
+        (Participant.student_number.regexp_match("^[0-9]+$"),
+         db.cast(Participant.student_number, db.Integer)),
+        else_=9999,
+    )
+    role = db.case(ROLE_ORDER, value=Participant.role, else_=4)
+    class_name = db.func.coalesce(Participant.class_name, "")
+    sort_map = {
+        "class":   [class_name, role, number],
+        "name":    [db.func.coalesce(Participant.name, "")],
+        "number":  [class_name, number],
+        "role":    [role, class_name, number],
+        "created": [Participant.created_at],
+        "email":   [db.func.coalesce(Participant.email, "")],
+    }
+    return sort_map.get(sort, sort_map["class"])
+
+
+def _keyset_condition(columns: list, values: list, directions: list):
+    """
+    キーセットページネーションの条件式。
+    (columns) が (values) より「後ろ」にある行を選ぶ（directions は各列の昇順=True / 降順=False）。
+    """
+    conditions = []
+    for i, (col, value, asc) in enumerate(zip(columns, values, directions)):
+        prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        conditions.append(db.and_(*prefix, col > value if asc else col < value))
+    return db.or_(*conditions)
+
+
 @admin_bp.route("/participants")
 def participants():
-    """参加者一覧（検索・絞り込み・並べ替え対応）"""
-    from sqlalchemy import case as sa_case
+    """参加者一覧（検索・絞り込み・並べ替え・ページ送り対応）"""
+    from sqlalchemy.orm import aliased, selectinload
 
     q              = request.args.get("q", "").strip()
     status_filter  = request.args.get("status", "all")
@@ -291,6 +349,10 @@ def participants():
     class_filter   = request.args.get("class_name", "all")
     sort           = request.args.get("sort", "class")
     order          = request.args.get("order", "asc")
+    per_page       = request.args.get("per_page", PARTICIPANTS_PER_PAGE, type=int)
+    after_id       = request.args.get("after", type=int)
+    before_id      = request.args.get("before", type=int)
+    per_page = max(1, min(per_page, PARTICIPANTS_PER_PAGE_MAX))
 
     query = Participant.query
 
@@ -306,59 +368,70 @@ def participants():
     if class_filter != "all":
         query = query.filter(Participant.class_name == class_filter)
 
-    all_participants = query.all()
-
-    # Python側で並べ替え（DB依存のregexp_replaceを回避）
-    def _num(p):
-        return int(p.student_number) if p.student_number and p.student_number.isdigit() else 9999
-
-    def _role_order(p):
-        return {"生徒": 0, "教師": 1, "学年主任": 2, "幹事": 3}.get(p.role, 4)
-
-    sort_key_map = {
-        "class":   lambda p: (p.class_name or "", _role_order(p), _num(p)),
-        "name":    lambda p: (p.name or "",),
-        "number":  lambda p: (p.class_name or "", _num(p)),
-        "role":    lambda p: (_role_order(p), p.class_name or "", _num(p)),
-        "created": lambda p: (p.created_at,),
-        "email":   lambda p: (p.email or "",),
-    }
-    key_func = sort_key_map.get(sort, sort_key_map["class"])
-    all_participants.sort(key=key_func, reverse=(order == "desc"))
-
-    # 仮出欠ステータスで絞り込み（Python側）
-    if status_filter != "all":
-        filtered = []
-        for p in all_participants:
-            prov = p.latest_provisional
-            if status_filter == "no_response" and prov is None:
-                filtered.append(p)
-            elif prov and prov.status == status_filter:
-                filtered.append(p)
-        all_participants = filtered
-
-    # 本出欠ステータスで絞り込み（Python側）
-    if final_filter != "all":
-        filtered = []
-        for p in all_participants:
-            final = p.latest_final
-            if final_filter == "no_response" and final is None:
-                filtered.append(p)
-            elif final and final.status == final_filter:
-                filtered.append(p)
-        all_participants = filtered
+    # 仮出欠・本出欠ステータスで絞り込み（最新回答IDで結合）
+    if status_filter == "no_response":
+        query = query.filter(Participant.latest_provisional_id.is_(None))
+    elif status_filter != "all":
+        prov = aliased(ProvisionalResponse)
+        query = (query.join(prov, prov.id == Participant.latest_provisional_id)
+                 .filter(prov.status == status_filter))
+    if final_filter == "no_response":
+        query = query.filter(Participant.latest_final_id.is_(None))
+    elif final_filter != "all":
+        final = aliased(FinalResponse)
+        query = (query.join(final, final.id == Participant.latest_final_id)
+                 .filter(final.status == final_filter))
+
+    total = query.order_by(None).count()
+
+    # 並べ替え: 指定キー + id（同順位は登録順）
+    columns = _participant_sort_columns(sort) + [Participant.id]
+    directions = [order != "desc"] * (len(columns) - 1) + [True]
+
+    # キーセットページネーション: after=<前ページ末尾のid> / before=<次ページ先頭のid>
+    cursor_id = after_id or before_id
+    backward = not after_id and bool(before_id)
+    if backward:
+        directions = [not d for d in directions]
+    if cursor_id:
+        cursor = db.session.query(*columns).filter(Participant.id == cursor_id).first()
+        if cursor is not None:
+            query = query.filter(_keyset_condition(columns, list(cursor), directions))
+        else:
+            cursor_id = None
+            backward = False
+            directions = [order != "desc"] * (len(columns) - 1) + [True]
+
+    page = (query
+            .options(selectinload(Participant.provisional_responses),
+                     selectinload(Participant.final_responses),
+                     selectinload(Participant.payment))
+            .order_by(*[c.asc() if d else c.desc() for c, d in zip(columns, directions)])
+            .limit(per_page + 1)
+            .all())
+    has_more = len(page) > per_page
+    page = page[:per_page]
+    if backward:
+        page.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = bool(cursor_id), has_more
 
     # クラス一覧（絞り込み用）
     classes = [r[0] for r in db.session.query(Participant.class_name)
                .filter(Participant.class_name != "")
                .distinct().order_by(Participant.class_name).all()]
 
+    list_args = dict(q=q, status=status_filter, final_status=final_filter,
+                     role=role_filter, class_name=class_filter, sort=sort, order=order)
+    if per_page != PARTICIPANTS_PER_PAGE:
+        list_args["per_page"] = per_page
+    prev_url = url_for("admin.participants", before=page[0].id, **list_args) if has_prev and page else None
+    next_url = url_for("admin.participants", after=page[-1].id, **list_args) if has_next and page else None
+
     def sort_url(col):
         new_order = "desc" if (sort == col and order == "asc") else "asc"
-        return url_for("admin.participants", q=q, status=status_filter,
-                       final_status=final_filter,
-                       role=role_filter, class_name=class_filter,
-                       sort=col, order=new_order)
+        return url_for("admin.participants", **dict(list_args, sort=col, order=new_order))
 
     def sort_icon(col):
         if sort != col:
@@ -366,7 +439,11 @@ def participants():
         return "bi-sort-up" if order == "asc" else "bi-sort-down"
 
     return render_template("admin/participants.html",
-                           participants=all_participants,
+                           participants=page,
+                           total=total,
+                           per_page=per_page,
+                           prev_url=prev_url,
+                           next_url=next_url,
                            q=q,
                            status_filter=status_filter,
                            final_filter=final_filter,
@@ -436,7 +513,7 @@ def set_final_status(participant_id):
     if status not in ("attending", "not_attending", "cancelled"):
         flash("無効なステータスです。", "danger")
         return redirect(url_for("admin.participant_detail", participant_id=participant_id))
-    from models import FinalResponse, Payment, AppSetting
+    from models import FinalResponse, Payment
     response = FinalResponse(
         participant_id=participant.id,
         status=status,
@@ -446,8 +523,7 @@ def set_final_status(participant_id):
     db.session.add(response)
 
     if status == "attending":
-        fee_setting = AppSetting.query.filter_by(key="reunion_fee").first()
-        reunion_fee_str = fee_setting.value if fee_setting else "0"
+        reunion_fee_str = get_settings().get("reunion_fee", "0")
         try:
             payment_expected = int(reunion_fee_str.replace(",", "").replace("円", "").strip())
         except ValueError:
@@ -487,6 +563,7 @@ def toggle_consent(participant_id, response_type):
         prov.share_consent = new_val
     if final:
         final.share_consent = new_val
+    participant.updated_at = datetime.utcnow()
     db.session.commit()
     label = "名前の共有を許可しました。" if new_val else "共有許可を取り消しました。"
     flash(label, "success")
@@ -559,6 +636,9 @@ def clear_responses(participant_id):
     ProvisionalResponse.query.filter_by(participant_id=participant_id).delete()
     FinalResponse.query.filter_by(participant_id=participant_id).delete()
     Payment.query.filter_by(participant_id=participant_id).delete()
+    # 一括削除はフラッシュ時の latest_*_id 更新を通らないため直接クリア
+    participant.latest_provisional_id = None
+    participant.latest_final_id = None
     participant.updated_at = datetime.utcnow()
     db.session.commit()
     flash(f"{participant.name} の回答・入金データをクリアしました。", "success")
@@ -605,11 +685,11 @@ def _today_jst():
 def _get_reminder_send_date_passed() -> bool:
     """リマインドメール送信日を過ぎているか判定する（JST基準）。未設定の場合は False。"""
     from datetime import date as _date
-    s = AppSetting.query.filter_by(key="reminder_send_date").first()
-    if not (s and s.value):
+    value = get_setting("reminder_send_date")
+    if not value:
         return False
     try:
-        return _today_jst() >= _date.fromisoformat(s.value)
+        return _today_jst() >= _date.fromisoformat(value)
     except ValueError:
         return False
 
@@ -617,11 +697,11 @@ def _get_reminder_send_date_passed() -> bool:
 def _get_final_reminder_date_passed() -> bool:
     """最終リマインド送信日を過ぎているか判定する（JST基準）。未設定の場合は False。"""
     from datetime import date as _date
-    s = AppSetting.query.filter_by(key="final_reminder_date").first()
-    if not (s and s.value):
+    value = get_setting("final_reminder_date")
+    if not value:
         return False
     try:
-        return _today_jst() >= _date.fromisoformat(s.value)
+        return _today_jst() >= _date.fromisoformat(value)
     except ValueError:
         return False
 
@@ -635,37 +715,39 @@ def _collect_pending_jobs(base_url: str) -> list:
     Phase 2 (reminder):       reminder_send_date 以降 & URL送信済み & 本出欠未回答
     Phase 3 (final_reminder): final_reminder_date 以降 & 本参加確定 & 最終リマインド未送信
     """
-    participants = Participant.query.filter(
-        ~Participant.email.like("%@placeholder.local"),
-    ).all()
-
-    jobs = []
-
-    for p in participants:
-        if p.latest_provisional:
-            if not any(ml.mail_type == "final_url" and ml.status in ("sent", "simulated") for ml in p.mail_logs):
-                jobs.append({"phase": "final_url", "pid": p.id, "final_url": generate_final_url(p, base_url)})
-
-    if _get_reminder_send_date_passed():
-        for p in participants:
-            has_url = any(ml.mail_type == "final_url" and ml.status in ("sent", "simulated") for ml in p.mail_logs)
-            has_reminded = any(ml.mail_type == "reminder" and ml.status in ("sent", "simulated") for ml in p.mail_logs)
-            if has_url and not has_reminded:
-                jobs.append({"phase": "reminder", "pid": p.id, "final_url": generate_final_url(p, base_url)})
-
-    if _get_final_reminder_date_passed():
-        for p in participants:
-            final = p.latest_final
-            if final and final.status == "attending":
-                if not any(ml.mail_type == "final_reminder" and ml.status in ("sent", "simulated") for ml in p.mail_logs):
-                    jobs.append({"phase": "final_reminder", "pid": p.id, "final_url": None})
-
+    # 参加者と最新の本出欠ステータスを1クエリ、送信済みメール種別を1クエリで取得する
+    rows = (
+        db.session.query(Participant, FinalResponse.status)
+        .outerjoin(FinalResponse, FinalResponse.id == Participant.latest_final_id)
+        .filter(~Participant.email.like("%@placeholder.local"))
+        .order_by(Participant.id)
+        .all()
+    )
+    sent = sent_mail_types_by_participant(PHASE_LABELS)
+    no_mail = frozenset()
+
+    phase1, phase2, phase3 = [], [], []
+    reminder_open = _get_reminder_send_date_passed()
+    final_reminder_open = _get_final_reminder_date_passed()
+    for p, final_status in rows:
+        sent_types = sent.get(p.id, no_mail)
+        if p.latest_provisional_id is not None and "final_url" not in sent_types:
+            phase1.append(p)
+        if reminder_open and "final_url" in sent_types and "reminder" not in sent_types:
+            phase2.append(p)
+        if final_reminder_open and final_status == "attending" and "final_reminder" not in sent_types:
+            phase3.append(p)
+
+    jobs = [{"phase": "final_url", "pid": p.id, "final_url": generate_final_url(p, base_url)} for p in phase1]
+    jobs += [{"phase": "reminder", "pid": p.id, "final_url": generate_final_url(p, base_url)} for p in phase2]
+    jobs += [{"phase": "final_reminder", "pid": p.id, "final_url": None} for p in phase3]
     return jobs
 
 
 @admin_bp.route("/api/auto-send-preview")
 def api_auto_send_preview():
     """自動送信のプレビュー情報をJSON返却"""
+    from services.mail_service import get_daily_send_limit, get_today_sent_count, get_remaining_today
     from collections import Counter
     base_url = current_app.config.get("APP_BASE_URL", "http://localhost:5000")
     all_jobs = _collect_pending_jobs(base_url)
@@ -681,6 +763,10 @@ def api_auto_send_preview():
         for ph in PHASE_LABELS
         if total_by_phase[ph] > 0
     ]
+    batch_ids = {j["pid"] for j in batch}
+    names = dict(
+        db.session.query(Participant.id, Participant.name).filter(Participant.id.in_(batch_ids))
+    ) if batch_ids else {}
 
     return jsonify({
         "has_targets": len(all_jobs) > 0,
@@ -691,8 +777,7 @@ def api_auto_send_preview():
         "today_sent": get_today_sent_count(),
         "phases": phases,
         "targets": [
-            {"id": j["pid"], "name": next((p.name for p in Participant.query.filter_by(id=j["pid"]).limit(1)), ""),
-             "phase": j["phase"]}
+            {"id": j["pid"], "name": names.get(j["pid"], ""), "phase": j["phase"]}
             for j in batch
         ],
     })
@@ -700,10 +785,8 @@ def api_auto_send_preview():
 
 @admin_bp.route("/auto-send", methods=["POST"])
 def auto_send():
-    """全フェーズ並行判定 → 次の最大100件に送信"""
-    import threading
-    import time as _time
-    import os
+    """全フェーズ並行判定 → 次の最大100件を送信キューに登録"""
+    from services.mail_service import get_remaining_today
     from collections import Counter
 
     base_url = current_app.config.get("APP_BASE_URL", "http://localhost:5000")
@@ -719,46 +802,11 @@ def auto_send():
         return redirect(url_for("admin.index"))
 
     batch = all_jobs[:min(BATCH_SIZE, remaining)]
-    app = current_app._get_current_object()
-
-    pdf_path = None
-    if any(j["phase"] == "final_reminder" for j in batch):
-        pdf_setting = AppSetting.query.filter_by(key="reunion_guide_pdf").first()
-        if pdf_setting and pdf_setting.value:
-            pdf_path = pdf_setting.value
-        else:
-            default_pdf = os.path.join(current_app.root_path, "static", "uploads", "reunion_guide.pdf")
-            if os.path.isfile(default_pdf):
-                pdf_path = default_pdf
-
-    def bulk_send():
-        with app.app_context():
-            sent = failed = 0
-            counts = {ph: 0 for ph in PHASE_LABELS}
-            for job in batch:
-                p = db.session.get(Participant, job["pid"])
-                if not p:
-                    continue
-                try:
-                    if job["phase"] == "final_url":
-                        send_final_url(p, job["final_url"])
-                    elif job["phase"] == "reminder":
-                        send_reminder(p, job["final_url"])
-                    elif job["phase"] == "final_reminder":
-                        send_final_reminder(p, attachment_path=pdf_path)
-                    sent += 1
-                    counts[job["phase"]] += 1
-                except Exception as e:
-                    failed += 1
-                    logger.error(f"自動送信失敗: {e}", exc_info=True)
-                _time.sleep(0.5)
-            summary = " / ".join(
-                f"{PHASE_LABELS[ph]}: {cnt}件" for ph, cnt in counts.items() if cnt > 0
-            )
-            logger.info(f"自動送信完了: {summary} | 成功{sent}件 / 失敗{failed}件")
-
-    thread = threading.Thread(target=bulk_send, daemon=True)
-    thread.start()
+    for phase in PHASE_LABELS:
+        pids = [j["pid"] for j in batch if j["phase"] == phase]
+        if pids:
+            enqueue_mail_jobs(pids, phase)
+    start_background_worker(current_app._get_current_object())
 
     phase_counter = Counter(j["phase"] for j in batch)
     parts = [f"{PHASE_LABELS[ph]} {cnt}件" for ph, cnt in phase_counter.items() if ph in PHASE_LABELS]
@@ -782,7 +830,8 @@ def mail_hub():
 @admin_bp.route("/api/mail-preview/<mail_type>")
 def api_mail_preview(mail_type):
     """メール種別ごとのプレビュー・対象者リストをJSON返却"""
-    from services.mail_service import MAIL_DEFAULTS, _get_template, _get_reunion_info, _get_mail_config
+    from services.mail_service import (MAIL_DEFAULTS, _get_template, _get_reunion_info, _get_mail_config,
+                                       get_daily_send_limit, get_today_sent_count, get_remaining_today)
 
     is_teacher = request.args.get("teacher", "0") == "1"
     reunion = _get_reunion_info()
@@ -888,12 +937,7 @@ def api_mail_preview(mail_type):
     remaining = get_remaining_today()
 
     import os
-    pdf_setting = AppSetting.query.filter_by(key="reunion_guide_pdf").first()
-    pdf_path = pdf_setting.value if pdf_setting and pdf_setting.value else None
-    if not pdf_path:
-        default_pdf = os.path.join(current_app.root_path, "static", "uploads", "reunion_guide.pdf")
-        if os.path.isfile(default_pdf):
-            pdf_path = default_pdf
+    pdf_path = get_guide_pdf_path()
     attachment_info = None
     if mail_type == "final_reminder" and pdf_path and os.path.isfile(pdf_path):
         attachment_info = {
@@ -1005,12 +1049,7 @@ def api_mail_preview_individual(participant_id, mail_type):
     import os
     attachment_info = None
     if mail_type == "final_reminder":
-        pdf_setting = AppSetting.query.filter_by(key="reunion_guide_pdf").first()
-        pdf_path = pdf_setting.value if pdf_setting and pdf_setting.value else None
-        if not pdf_path:
-            default_pdf = os.path.join(current_app.root_path, "static", "uploads", "reunion_guide.pdf")
-            if os.path.isfile(default_pdf):
-                pdf_path = default_pdf
+        pdf_path = get_guide_pdf_path()
         if pdf_path and os.path.isfile(pdf_path):
             attachment_info = {
                 "filename": os.path.basename(pdf_path),
@@ -1034,6 +1073,7 @@ def api_mail_preview_individual(participant_id, mail_type):
 @admin_bp.route("/send-final-url/<int:participant_id>", methods=["POST"])
 def send_final_url_single(participant_id):
     """本出欠URLを個別送信"""
+    from services.mail_service import send_final_url
     participant = db.session.get(Participant, participant_id)
     if participant is None:
         flash("参加者が見つかりません。", "danger")
@@ -1058,11 +1098,7 @@ def send_final_url_single(participant_id):
 @admin_bp.route("/send-final-url-bulk", methods=["POST"])
 def send_final_url_bulk():
     """本出欠URLを一括送信（仮出欠回答済み＆URL未送信の全員・段階送信）"""
-    import threading
-    import time
-
-    base_url = current_app.config.get("APP_BASE_URL", "http://localhost:5000")
-
+    from services.mail_service import get_daily_send_limit, get_today_sent_count, get_remaining_today
     participants = Participant.query.filter(
         ~Participant.email.like("%@placeholder.local"),
     ).all()
@@ -1091,31 +1127,13 @@ def send_final_url_bulk():
     daily_limit = get_daily_send_limit()
     stage = (get_today_sent_count() // daily_limit) + 1 if daily_limit > 0 else 1
 
-    app = current_app._get_current_object()
-    jobs = [(p.id, generate_final_url(p, base_url)) for p in batch]
-
-    def bulk_send():
-        with app.app_context():
-            sent = 0
-            failed = 0
-            for pid, final_url in jobs:
-                p = db.session.get(Participant, pid)
-                if p is None:
-                    continue
-                try:
-                    send_final_url(p, final_url)
-                    sent += 1
-                except Exception as e:
-                    logger.error(f"一括送信失敗: {p.email} - {e}", exc_info=True)
-                    failed += 1
-                time.sleep(0.5)
-            logger.info(f"第{stage}段階送信完了: {sent} 件成功 / {failed} 件失敗")
-
-    thread = threading.Thread(target=bulk_send, daemon=True)
-    thread.start()
+    result = enqueue_mail_jobs([p.id for p in batch], "final_url")
+    start_background_worker(current_app._get_current_object())
 
     remaining_after = len(targets) - len(batch)
     msg = f"第{stage}段階: {len(batch)} 件の送信を開始しました。"
+    if result["already"]:
+        msg += f"（うち {result['already']} 件は送信待ちに登録済み）"
     if remaining_after > 0:
         msg += f"（残り {remaining_after} 件は次回送信してください）"
     flash(msg, "info")
@@ -1125,6 +1143,7 @@ def send_final_url_bulk():
 @admin_bp.route("/send-reminder/<int:participant_id>", methods=["POST"])
 def send_reminder_single(participant_id):
     """リマインドメールを個別送信"""
+    from services.mail_service import send_reminder
     participant = db.session.get(Participant, participant_id)
     if participant is None:
         flash("参加者が見つかりません。", "danger")
@@ -1148,15 +1167,17 @@ def send_reminder_single(participant_id):
 @admin_bp.route("/send-final-reminder/<int:participant_id>", methods=["POST"])
 def send_final_reminder_single(participant_id):
     """最終リマインドを個別送信"""
+    from services.mail_service import send_final_reminder
     participant = db.session.get(Participant, participant_id)
     if participant is None:
         flash("参加者が見つかりません。", "danger")
         return redirect(url_for("admin.participants"))
 
+    import os
     pdf_path = None
-    s = AppSetting.query.filter_by(key="reunion_guide_pdf").first()
-    if s and s.value and os.path.isfile(s.value):
-        pdf_path = s.value
+    value = get_setting("reunion_guide_pdf")
+    if value and os.path.isfile(value):
+        pdf_path = value
 
     try:
         log = send_final_reminder(participant, attachment_path=pdf_path)
@@ -1203,11 +1224,7 @@ def send_unlock_notice_single(participant_id):
 @admin_bp.route("/send-reminder-bulk", methods=["POST"])
 def send_reminder_bulk():
     """リマインドメールを一括送信（本出欠URL送信済み＆本出欠未回答の参加者）"""
-    import threading
-    import time
-
-    base_url = current_app.config.get("APP_BASE_URL", "http://localhost:5000")
-
+    from services.mail_service import get_remaining_today
     participants = Participant.query.filter(
         ~Participant.email.like("%@placeholder.local"),
     ).all()
@@ -1227,31 +1244,13 @@ def send_reminder_bulk():
         return redirect(url_for("admin.participants"))
 
     batch = targets[:remaining]
-    app = current_app._get_current_object()
-    jobs = [(p.id, generate_final_url(p, base_url)) for p in batch]
-
-    def bulk_send():
-        with app.app_context():
-            sent = 0
-            failed = 0
-            for pid, final_url in jobs:
-                p = db.session.get(Participant, pid)
-                if p is None:
-                    continue
-                try:
-                    send_reminder(p, final_url)
-                    sent += 1
-                except Exception as e:
-                    logger.error(f"リマインド一括送信失敗: {p.email} - {e}", exc_info=True)
-                    failed += 1
-                time.sleep(0.5)
-            logger.info(f"リマインド一括送信完了: {sent} 件成功 / {failed} 件失敗")
-
-    thread = threading.Thread(target=bulk_send, daemon=True)
-    thread.start()
+    result = enqueue_mail_jobs([p.id for p in batch], "reminder")
+    start_background_worker(current_app._get_current_object())
 
     remaining_after = len(targets) - len(batch)
     msg = f"{len(batch)} 件のリマインド送信を開始しました。"
+    if result["already"]:
+        msg += f"（うち {result['already']} 件は送信待ちに登録済み）"
     if remaining_after > 0:
         msg += f"（残り {remaining_after} 件は次回送信してください）"
     flash(msg, "info")
@@ -1261,9 +1260,7 @@ def send_reminder_bulk():
 @admin_bp.route("/send-final-reminder-bulk", methods=["POST"])
 def send_final_reminder_bulk():
     """最終リマインドメールを一括送信（本出欠参加者にPDF添付）"""
-    import threading
-    import time
-
+    from services.mail_service import get_remaining_today
     participants = Participant.query.filter(
         ~Participant.email.like("%@placeholder.local"),
     ).all()
@@ -1290,42 +1287,16 @@ def send_final_reminder_bulk():
 
     batch = targets[:remaining]
 
-    # PDF添付ファイルのパス
-    pdf_setting = AppSetting.query.filter_by(key="reunion_guide_pdf").first()
-    pdf_path = None
-    if pdf_setting and pdf_setting.value:
-        pdf_path = pdf_setting.value
-    else:
-        import os
-        default_pdf = os.path.join(current_app.root_path, "static", "uploads", "reunion_guide.pdf")
-        if os.path.isfile(default_pdf):
-            pdf_path = default_pdf
-
-    app = current_app._get_current_object()
-    jobs = [p.id for p in batch]
-
-    def bulk_send():
-        with app.app_context():
-            sent = 0
-            failed = 0
-            for pid in jobs:
-                p = db.session.get(Participant, pid)
-                if p is None:
-                    continue
-                try:
-                    send_final_reminder(p, attachment_path=pdf_path)
-                    sent += 1
-                except Exception as e:
-                    logger.error(f"最終リマインド一括送信失敗: {p.email} - {e}", exc_info=True)
-                    failed += 1
-                time.sleep(0.5)
-            logger.info(f"最終リマインド一括送信完了: {sent} 件成功 / {failed} 件失敗")
-
-    thread = threading.Thread(target=bulk_send, daemon=True)
-    thread.start()
+    # PDF添付ファイルのパス（添付は送信時にワーカーが解決する。ここでは案内表示用）
+    pdf_path = get_guide_pdf_path()
+
+    result = enqueue_mail_jobs([p.id for p in batch], "final_reminder")
+    start_background_worker(current_app._get_current_object())
 
     remaining_after = len(targets) - len(batch)
     msg = f"{len(batch)} 件の最終リマインド送信を開始しました。"
+    if result["already"]:
+        msg += f"（うち {result['already']} 件は送信待ちに登録済み）"
     if pdf_path:
         msg += "（PDF添付あり）"
     else:
@@ -1336,6 +1307,64 @@ def send_final_reminder_bulk():
     return redirect(url_for("admin.participants"))
 
 
+# -----------------------------------------------
+# エクスポート（CSV / Excel）
+# -----------------------------------------------
+EXPORT_YIELD_PER = 500    # DB から一度に取り出す行数
+EXPORT_CHUNK_ROWS = 200   # CSV を何行ずつ送り出すか
+
+
+def _iter_csv(header, rows):
+    """CSV（BOM付きUTF-8）を EXPORT_CHUNK_ROWS 行ずつ文字列で返す"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _export_response(basename, header, rows, back_endpoint):
+    """
+    エクスポートのレスポンスを返す。
+    CSV は全体を組み立てずに行を生成しながら送る（ダウンロードがすぐ始まり、メモリも一定）。
+    ?format=xlsx なら openpyxl の write-only モードで一時ファイルに書いてから送る。
+    """
+    if request.args.get("format") != "xlsx":
+        return Response(
+            stream_with_context(_iter_csv(header, rows)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={basename}.csv"},
+        )
+
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        flash("openpyxl がインストールされていないため Excel 形式では出力できません。CSV をご利用ください。", "danger")
+        return redirect(url_for(back_endpoint))
+
+    import tempfile
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(basename)
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return send_file(
+        output,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name=f"{basename}.xlsx",
+    )
+
+
 # -----------------------------------------------
 # 入金管理
 # -----------------------------------------------
@@ -1367,48 +1396,45 @@ def payments():
 
 @admin_bp.route("/payments/export")
 def payments_export():
-    """入金一覧をCSVエクスポート"""
-    from models import Payment
-    payments = (
-        Payment.query
-        .join(Participant, Payment.participant_id == Participant.id)
-        .order_by(Participant.class_name, Participant.student_number)
-        .all()
-    )
+    """入金一覧をCSVエクスポート（?format=xlsx でExcel）"""
+    from sqlalchemy.orm import contains_eager
 
     PAY_LABELS = {"unpaid": "未払い", "paid": "支払済み", "partial": "一部支払い"}
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
+    header = [
         "氏名", "氏名（カナ）", "クラス", "出席番号", "役割",
         "入金ステータス", "入金金額", "支払予定金額", "支払日", "振込名義",
         "CSV照合", "CSV上の名義", "CSV上の金額", "CSV上の日付",
-    ])
-    for pay in payments:
-        p = pay.participant
-        writer.writerow([
-            p.name,
-            p.name_kana or "",
-            p.class_name or "",
-            p.student_number or "",
-            p.role or "生徒",
-            PAY_LABELS.get(pay.payment_status, pay.payment_status),
-            pay.paid_amount or 0,
-            pay.expected_amount or 0,
-            pay.payment_date.strftime("%Y-%m-%d") if pay.payment_date else "",
-            pay.transfer_name or "",
-            "照合済み" if pay.bank_csv_matched else "未照合",
-            pay.bank_csv_raw_name or "",
-            pay.bank_csv_amount or "",
-            pay.bank_csv_date.strftime("%Y-%m-%d") if pay.bank_csv_date else "",
-        ])
-
-    return Response(
-        "﻿" + output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=payments_export.csv"}
-    )
+    ]
+
+    def rows():
+        # 参加者は同じ SELECT で読み込み、EXPORT_YIELD_PER 行ずつ取り出す
+        payments = (
+            Payment.query
+            .join(Participant, Payment.participant_id == Participant.id)
+            .options(contains_eager(Payment.participant))
+            .order_by(Participant.class_name, Participant.student_number)
+            .yield_per(EXPORT_YIELD_PER)
+        )
+        for pay in payments:
+            p = pay.participant
+            yield [
+                p.name,
+                p.name_kana or "",
+                p.class_name or "",
+                p.student_number or "",
+                p.role or "生徒",
+                PAY_LABELS.get(pay.payment_status, pay.payment_status),
+                pay.paid_amount or 0,
+                pay.expected_amount or 0,
+                pay.payment_date.strftime("%Y-%m-%d") if pay.payment_date else "",
+                pay.transfer_name or "",
+                "照合済み" if pay.bank_csv_matched else "未照合",
+                pay.bank_csv_raw_name or "",
+                pay.bank_csv_amount or "",
+                pay.bank_csv_date.strftime("%Y-%m-%d") if pay.bank_csv_date else "",
+            ]
+
+    return _export_response("payments_export", header, rows(), "admin.payments")
 
 
 @admin_bp.route("/payment/<int:payment_id>/update", methods=["POST"])
@@ -1459,10 +1485,9 @@ def csv_import():
 
     file = request.files["csv_file"]
     try:
-        content = file.read()
-        records = parse_bank_csv(content, filename=file.filename)
-        saved = save_bank_imports(records)
-        flash(f"CSV取込完了: {len(records)} 件読込、{len(saved)} 件新規保存しました。", "success")
+        # アップロードをストリームのまま解析し、チャンク単位でDBに保存する
+        result = save_bank_imports(iter_bank_csv(file.stream, filename=file.filename))
+        flash(f"CSV取込完了: {result['read']} 件読込、{result['saved']} 件新規保存しました。", "success")
     except ValueError as e:
         flash(f"CSVの読み込みに失敗しました: {e}", "danger")
     except Exception as e:
@@ -1564,23 +1589,22 @@ def settings_mail():
         "mail_smtp_host", "mail_smtp_port",
         "mail_smtp_user", "mail_smtp_password",
         "mail_from", "mail_from_name", "mail_daily_limit",
+        "mail_send_rate", "mail_send_concurrency",
     ]
 
     if request.method == "POST":
+        values = {}
         for key in KEYS:
             val = request.form.get(key, "").strip()
             if key in ("mail_smtp_password", "brevo_api_key") and not val:
                 continue
-            setting = AppSetting.query.filter_by(key=key).first()
-            if setting:
-                setting.value = val
-            else:
-                db.session.add(AppSetting(key=key, value=val))
+            values[key] = val
+        save_settings(values)
         db.session.commit()
         flash("メール設定を保存しました。", "success")
         return redirect(url_for("admin.settings_mail"))
 
-    settings = {s.key: s.value for s in AppSetting.query.filter(AppSetting.key.in_(KEYS)).all()}
+    settings = {k: v for k, v in get_settings().items() if k in KEYS}
     cfg = current_app.config
     defaults = {
         "mail_mode":          cfg.get("MAIL_MODE", "console"),
@@ -1591,6 +1615,8 @@ def settings_mail():
         "mail_from":          cfg.get("MAIL_FROM", ""),
         "mail_from_name":     cfg.get("MAIL_FROM_NAME", "同窓会幹事"),
         "mail_daily_limit":   "100",
+        "mail_send_rate":     "2",
+        "mail_send_concurrency": "4",
     }
     for key in KEYS:
         if key not in settings or not settings[key]:
@@ -1601,6 +1627,7 @@ def settings_mail():
 @admin_bp.route("/settings/pdf-upload", methods=["POST"])
 def settings_pdf_upload():
     """案内PDFをアップロードする"""
+    from services.mail_service import invalidate_attachment
     import os
     if "pdf_file" not in request.files:
         flash("ファイルを選択してください。", "danger")
@@ -1615,12 +1642,10 @@ def settings_pdf_upload():
     os.makedirs(upload_dir, exist_ok=True)
     save_path = os.path.join(upload_dir, "reunion_guide.pdf")
     file.save(save_path)
+    # 同じパスに上書きするので、送信用に読み込み済みの内容を捨てる
+    invalidate_attachment(save_path)
 
-    setting = AppSetting.query.filter_by(key="reunion_guide_pdf").first()
-    if setting:
-        setting.value = save_path
-    else:
-        db.session.add(AppSetting(key="reunion_guide_pdf", value=save_path))
+    save_settings({"reunion_guide_pdf": save_path})
     db.session.commit()
 
     flash("案内PDFをアップロードしました。", "success")
@@ -1630,6 +1655,7 @@ def settings_pdf_upload():
 @admin_bp.route("/settings/mail-template", methods=["GET", "POST"])
 def settings_mail_template():
     """メール文章編集画面"""
+    from services.mail_service import MAIL_DEFAULTS
     KEYS = [
         "mail_provisional_confirm_attending_subject",             "mail_provisional_confirm_attending_body",
         "mail_provisional_confirm_attending_subject_teacher",     "mail_provisional_confirm_attending_body_teacher",
@@ -1654,18 +1680,12 @@ def settings_mail_template():
         "mail_verification_subject",                              "mail_verification_body",
     ]
     if request.method == "POST":
-        for key in KEYS:
-            val = request.form.get(key, "")
-            setting = AppSetting.query.filter_by(key=key).first()
-            if setting:
-                setting.value = val
-            else:
-                db.session.add(AppSetting(key=key, value=val))
+        save_settings({key: request.form.get(key, "") for key in KEYS})
         db.session.commit()
         flash("メール文章を保存しました。", "success")
         return redirect(url_for("admin.settings_mail_template"))
 
-    settings = {s.key: s.value for s in AppSetting.query.filter(AppSetting.key.in_(KEYS)).all()}
+    settings = {k: v for k, v in get_settings().items() if k in KEYS}
     # DB未設定のキーにはデフォルト値を入れる
     for key in KEYS:
         if key not in settings or not settings[key]:
@@ -1715,19 +1735,12 @@ def settings_reunion():
     ]
 
     if request.method == "POST":
-        for key in KEYS:
-            val = request.form.get(key, "").strip()
-            s = AppSetting.query.filter_by(key=key).first()
-            if s:
-                s.value = val
-                s.updated_at = datetime.utcnow()
-            else:
-                db.session.add(AppSetting(key=key, value=val))
+        save_settings({key: request.form.get(key, "").strip() for key in KEYS})
         db.session.commit()
         flash("同窓会情報を保存しました。", "success")
         return redirect(url_for("admin.settings_reunion"))
 
-    settings = {s.key: s.value for s in AppSetting.query.filter(AppSetting.key.in_(KEYS)).all()}
+    settings = {k: v for k, v in get_settings().items() if k in KEYS}
     cfg = current_app.config
     defaults = {
         "reunion_name":  cfg.get("REUNION_NAME", "同窓会"),
@@ -1783,10 +1796,28 @@ def roster():
     return render_template("admin/roster.html", participants=participants)
 
 
+ROSTER_IMPORT_PREVIEW_LIMIT = 100  # 確認画面に一覧表示する件数（種別ごと）
+
+
+def _pending_roster_path(token: str) -> str:
+    """確認待ちの名簿CSVの保存先（instance/roster_imports/）"""
+    import os
+    return os.path.join(current_app.instance_path, "roster_imports", f"{token}.csv")
+
+
+def _render_roster_import_preview(plan, token, filename):
+    from services.roster_import_service import PARTICIPANT_FIELDS
+    return render_template("admin/roster_import_preview.html",
+                           plan=plan, token=token, filename=filename,
+                           field_labels=PARTICIPANT_FIELDS,
+                           limit=ROSTER_IMPORT_PREVIEW_LIMIT)
+
+
 @admin_bp.route("/roster/import", methods=["POST"])
 def roster_import():
     """
-    名簿CSVを取込んで参加者を一括登録する。
+    名簿CSVを取込み、現在の名簿との差分（追加・更新・削除）を確認画面に表示する。
+    反映は確認画面から /roster/import/apply で行う。
 
     CSVフォーマット（1行目はヘッダー行、列順序はヘッダー名で自動判別）:
       氏名, メールアドレス, クラス, 出席番号, 幹事メモ
@@ -1796,8 +1827,14 @@ def roster_import():
       鈴木花子,suzuki@example.com,2-B,12
 
     ヘッダーがない場合は 氏名・メール・クラス・出席番号・幹事メモ の固定順とみなす。
-    メールアドレスが既存の場合はデータを更新する（重複登録にならない）。
+    メールアドレス（なければ クラス+出席番号+氏名）が一致する参加者は更新する（重複登録にならない）。
     """
+    import os
+    import secrets
+    import time
+    from flask import session
+    from services.roster_import_service import parse_roster_csv, plan_roster_import
+
     if "csv_file" not in request.files:
         flash("ファイルを選択してください。", "danger")
         return redirect(url_for("admin.participants") + "#csv")
@@ -1808,213 +1845,64 @@ def roster_import():
         return redirect(url_for("admin.participants") + "#csv")
 
     content = file.read()
-    text = None
-    for encoding in ["utf-8-sig", "shift_jis", "cp932", "utf-8"]:
-        try:
-            text = content.decode(encoding)
-            break
-        except UnicodeDecodeError:
-            continue
-
-    if text is None:
-        flash("CSVのエンコーディングを判別できませんでした。UTF-8かShift_JISで保存してください。", "danger")
+    try:
+        plan = plan_roster_import(parse_roster_csv(content))
+    except ValueError as e:
+        flash(str(e), "danger")
         return redirect(url_for("admin.participants") + "#csv")
 
-    reader = csv.reader(io.StringIO(text))
-    rows = list(reader)
+    # 確認画面から反映するまでアップロードされたCSVを保存しておく（1日以上前のものは消す）
+    token = secrets.token_urlsafe(16)
+    path = _pending_roster_path(token)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for name in os.listdir(os.path.dirname(path)):
+        old = os.path.join(os.path.dirname(path), name)
+        if time.time() - os.path.getmtime(old) > 86400:
+            os.remove(old)
+    with open(path, "wb") as f:
+        f.write(content)
+    session["roster_import"] = {"token": token, "filename": file.filename}
 
-    if not rows:
-        flash("CSVが空です。", "danger")
-        return redirect(url_for("admin.participants") + "#csv")
+    return _render_roster_import_preview(plan, token, file.filename)
 
-    # ヘッダー行の検出と列インデックスの解決
-    NAME_HEADERS          = {"氏名", "名前", "name"}
-    NAME_KANA_HEADERS     = {"氏名カナ", "氏名（カナ）", "フリガナ", "ふりがな", "kana", "name_kana"}
-    EMAIL_HEADERS         = {"メールアドレス", "メール", "email", "mail"}
-    CLASS_HEADERS         = {"クラス", "class", "組", "担当クラス"}
-    NUMBER_HEADERS        = {"出席番号", "番号", "number", "no"}
-    ROLE_HEADERS          = {"役割", "role", "種別", "区分"}
-    MEMO_HEADERS          = {"幹事メモ", "メモ", "memo"}
-    TOKEN_HEADERS         = {"トークン", "token"}
-    PROV_STATUS_HEADERS   = {"仮出欠", "provisional_status"}
-    FINAL_STATUS_HEADERS  = {"本出欠", "final_status"}
-    COMPANIONS_HEADERS    = {"同伴者数", "companions"}
-    TRANSFER_NAME_HEADERS = {"振込名義", "transfer_name"}
-    REMARKS_HEADERS       = {"備考", "remarks", "本出欠備考"}
-    PAY_STATUS_HEADERS    = {"入金ステータス", "payment_status"}
-    PAID_AMOUNT_HEADERS   = {"入金金額", "paid_amount"}
-    EXPECTED_AMOUNT_HEADERS = {"支払予定金額", "expected_amount", "予定金額"}
-    PAYMENT_DATE_HEADERS  = {"支払日", "payment_date"}
-
-    first = [h.strip().lower() for h in rows[0]]
-    has_header = any(h in NAME_HEADERS or h in EMAIL_HEADERS for h in first)
-
-    if has_header:
-        def find_idx(candidates):
-            for i, h in enumerate(first):
-                if h in {c.lower() for c in candidates}:
-                    return i
-            return None
-
-        idx_name          = find_idx(NAME_HEADERS)
-        idx_name_kana     = find_idx(NAME_KANA_HEADERS)
-        idx_email         = find_idx(EMAIL_HEADERS)
-        idx_class         = find_idx(CLASS_HEADERS)
-        idx_number        = find_idx(NUMBER_HEADERS)
-        idx_role          = find_idx(ROLE_HEADERS)
-        idx_memo          = find_idx(MEMO_HEADERS)
-        idx_token         = find_idx(TOKEN_HEADERS)
-        idx_prov_status   = find_idx(PROV_STATUS_HEADERS)
-        idx_final_status  = find_idx(FINAL_STATUS_HEADERS)
-        idx_companions    = find_idx(COMPANIONS_HEADERS)
-        idx_transfer_name    = find_idx(TRANSFER_NAME_HEADERS)
-        idx_remarks          = find_idx(REMARKS_HEADERS)
-        idx_pay_status       = find_idx(PAY_STATUS_HEADERS)
-        idx_paid_amount      = find_idx(PAID_AMOUNT_HEADERS)
-        idx_expected_amount  = find_idx(EXPECTED_AMOUNT_HEADERS)
-        idx_payment_date     = find_idx(PAYMENT_DATE_HEADERS)
-        data_rows            = rows[1:]
-    else:
-        # ヘッダーなし → 固定順: 氏名, 氏名カナ, メール, クラス, 出席番号, 役割, 幹事メモ
-        idx_name, idx_name_kana, idx_email, idx_class, idx_number, idx_role, idx_memo = 0, 1, 2, 3, 4, 5, 6
-        idx_token = idx_prov_status = idx_final_status = None
-        idx_companions = idx_transfer_name = idx_remarks = None
-        idx_pay_status = idx_paid_amount = idx_expected_amount = idx_payment_date = None
-        data_rows = rows
-
-    if idx_name is None:
-        flash("CSVに「氏名」列が見つかりません。", "danger")
+
+@admin_bp.route("/roster/import/apply", methods=["POST"])
+def roster_import_apply():
+    """確認画面で確認した差分を反映する（1トランザクション）"""
+    import os
+    from flask import session
+    from services.roster_import_service import parse_roster_csv, plan_roster_import, apply_roster_import
+
+    pending = session.get("roster_import") or {}
+    token = request.form.get("token", "")
+    path = _pending_roster_path(token) if token else ""
+    if not token or pending.get("token") != token or not os.path.isfile(path):
+        flash("取込むCSVが見つかりません。もう一度ファイルを選択してください。", "danger")
         return redirect(url_for("admin.participants") + "#csv")
 
-    def get_col(row, idx):
-        if idx is not None and idx < len(row):
-            return row[idx].strip()
-        return ""
-
-    # 有効な役割値
-    VALID_ROLES = {"生徒", "教師", "学年主任", "幹事"}
-
-    PROV_STATUS_MAP  = {"参加": "attending", "不参加": "not_attending", "未定": "undecided",
-                        "attending": "attending", "not_attending": "not_attending", "undecided": "undecided"}
-    FINAL_STATUS_MAP = {"参加": "attending", "不参加": "not_attending", "直前キャンセル": "cancelled",
-                        "attending": "attending", "not_attending": "not_attending", "cancelled": "cancelled"}
-    PAY_STATUS_MAP   = {"未払い": "unpaid", "支払済み": "paid", "一部支払い": "partial",
-                        "unpaid": "unpaid", "paid": "paid", "partial": "partial"}
-
-    # CSVの行を先にパースしてから全削除→全追加
-    import re
-    from datetime import date as date_type
-    new_participants = []
-    skipped = 0
-
-    for row in data_rows:
-        if not row or all(cell.strip() == "" for cell in row):
-            continue
+    with open(path, "rb") as f:
+        plan = plan_roster_import(parse_roster_csv(f.read()))
 
-        name          = get_col(row, idx_name)
-        name_kana     = get_col(row, idx_name_kana)
-        email         = get_col(row, idx_email).lower()
-        class_        = get_col(row, idx_class)
-        number        = get_col(row, idx_number)
-        role          = get_col(row, idx_role) or "生徒"
-        memo          = get_col(row, idx_memo)
-        token         = get_col(row, idx_token)
-        prov_status   = PROV_STATUS_MAP.get(get_col(row, idx_prov_status), "")
-        final_status  = FINAL_STATUS_MAP.get(get_col(row, idx_final_status), "")
-        companions_raw = get_col(row, idx_companions)
-        companions    = int(companions_raw) if companions_raw.isdigit() else 0
-        transfer_name = normalize_transfer_name(get_col(row, idx_transfer_name))
-        remarks       = get_col(row, idx_remarks)
-        pay_status    = PAY_STATUS_MAP.get(get_col(row, idx_pay_status), "")
-        paid_raw      = get_col(row, idx_paid_amount)
-        paid_amount   = int(paid_raw) if paid_raw.isdigit() else 0
-        expected_raw  = get_col(row, idx_expected_amount)
-        expected_amount = int(expected_raw) if expected_raw.isdigit() else 0
-        pay_date_raw  = get_col(row, idx_payment_date)
-        payment_date  = None
-        if pay_date_raw:
-            try:
-                from datetime import datetime as dt
-                payment_date = dt.strptime(pay_date_raw, "%Y-%m-%d").date()
-            except ValueError:
-                pass
-
-        if not name:
-            skipped += 1
-            continue
+    # 確認画面を表示した後に名簿が変わっていたら、新しい差分で確認し直してもらう
+    if plan["digest"] != request.form.get("digest"):
+        flash("確認画面の表示後に名簿が変更されました。差分を確認してから、もう一度反映してください。", "warning")
+        return _render_roster_import_preview(plan, token, pending.get("filename", ""))
 
-        if role not in VALID_ROLES:
-            role = "生徒"
-
-        if role == "学年主任":
-            class_ = ""
-        elif class_:
-            if not re.fullmatch(r'\d{2}', class_):
-                digits = re.sub(r'\D', '', class_)
-                class_ = digits[:2] if len(digits) >= 2 else digits
-
-        if not email or "@" not in email:
-            email = f"__no_email_{name}_{class_}_{role}@placeholder.local"
-
-        new_participants.append(dict(
-            name=name, name_kana=name_kana,
-            email=email, class_name=class_,
-            student_number=number, role=role, teacher_memo=memo,
-            _token=token,
-            _prov_status=prov_status, _final_status=final_status,
-            _companions=companions, _transfer_name=transfer_name, _remarks=remarks,
-            _pay_status=pay_status, _paid_amount=paid_amount,
-            _expected_amount=expected_amount, _payment_date=payment_date,
-        ))
-
-    # 全テーブルをリセットして再登録
-    MailLog.query.delete()
-    from models import ProvisionalResponse, FinalResponse, Payment, BankImport
-    FinalResponse.query.delete()
-    ProvisionalResponse.query.delete()
-    Payment.query.delete()
-    BankImport.query.delete()
-    Participant.query.delete()
-    db.session.flush()
-
-    for p_data in new_participants:
-        token           = p_data.pop("_token")
-        prov_status     = p_data.pop("_prov_status")
-        final_status    = p_data.pop("_final_status")
-        companions      = p_data.pop("_companions")
-        transfer_name   = p_data.pop("_transfer_name")
-        remarks         = p_data.pop("_remarks")
-        pay_status      = p_data.pop("_pay_status")
-        paid_amount     = p_data.pop("_paid_amount")
-        expected_amount = p_data.pop("_expected_amount")
-        payment_date    = p_data.pop("_payment_date")
-
-        p = Participant(**p_data)
-        if token:
-            p.token = token
-        db.session.add(p)
-        db.session.flush()
-
-        if prov_status:
-            db.session.add(ProvisionalResponse(participant_id=p.id, status=prov_status))
-
-        if final_status:
-            db.session.add(FinalResponse(
-                participant_id=p.id, status=final_status,
-                companions=companions, transfer_name=transfer_name,
-                remarks=remarks,
-            ))
-            db.session.add(Payment(
-                participant_id=p.id,
-                payment_status=pay_status or "unpaid",
-                paid_amount=paid_amount,
-                expected_amount=expected_amount,
-                payment_date=payment_date,
-                transfer_name=transfer_name,
-            ))
+    try:
+        result = apply_roster_import(plan)
+    except Exception as e:
+        logger.error(f"名簿取込エラー: {e}", exc_info=True)
+        flash(f"名簿の取込に失敗しました（変更は反映されていません）: {e}", "danger")
+        return redirect(url_for("admin.participants") + "#csv")
 
-    db.session.commit()
-    flash(f"名簿を全件上書きしました: {len(new_participants)} 名登録、{skipped} 行スキップ", "success")
+    os.remove(path)
+    session.pop("roster_import", None)
+    flash(
+        f"名簿を取込みました: 追加 {result['inserted']} 名、更新 {result['updated']} 名、"
+        f"削除 {result['deleted']} 名、回答の追加 {result['responses']} 件"
+        f"（変更なし {plan['unchanged']} 名、スキップ {plan['skipped'] + plan['duplicates']} 行）",
+        "success",
+    )
     return redirect(url_for("admin.participants"))
 
 
@@ -2074,58 +1962,57 @@ def roster_delete(participant_id):
 @admin_bp.route("/roster/export")
 def roster_export():
     """
-    現在の参加者名簿を全データ付きでCSVエクスポートする。
+    現在の参加者名簿を全データ付きでCSVエクスポートする（?format=xlsx でExcel）。
     このCSVを再インポートすることで仮出欠・本出欠・入金状態を含め完全復元できる。
     """
-    from models import ProvisionalResponse, FinalResponse, Payment
-    participants = Participant.query.order_by(Participant.class_name, Participant.student_number).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
+    from sqlalchemy.orm import aliased
 
-    writer.writerow([
+    header = [
         "氏名", "氏名（カナ）",
         "メールアドレス", "クラス", "出席番号", "役割", "幹事メモ",
         "トークン", "仮出欠", "本出欠", "同伴者数", "振込名義", "備考",
         "入金ステータス", "入金金額", "支払予定金額", "支払日",
-    ])
+    ]
 
     PROV_LABELS  = {"attending": "参加", "not_attending": "不参加", "undecided": "未定"}
     FINAL_LABELS = {"attending": "参加", "not_attending": "不参加", "cancelled": "直前キャンセル"}
     PAY_LABELS   = {"unpaid": "未払い", "paid": "支払済み", "partial": "一部支払い"}
 
-    for p in participants:
-        email_out = "" if p.email and "@placeholder.local" in p.email else (p.email or "")
-        prov  = p.latest_provisional
-        final = p.latest_final
-        pay   = p.payment
-        writer.writerow([
-            p.name,
-            p.name_kana or "",
-            email_out,
-            p.class_name or "",
-            p.student_number or "",
-            p.role or "生徒",
-            p.teacher_memo or "",
-            p.token or "",
-            PROV_LABELS.get(prov.status, "")    if prov  else "",
-            FINAL_LABELS.get(final.status, "")  if final else "",
-            final.companions                    if final else "",
-            final.transfer_name                 if final else "",
-            final.remarks                       if final else "",
-            PAY_LABELS.get(pay.payment_status, "") if pay else "",
-            pay.paid_amount                     if pay else "",
-            pay.expected_amount                 if pay else "",
-            pay.payment_date.strftime("%Y-%m-%d") if (pay and pay.payment_date) else "",
-        ])
-
-    csv_content = output.getvalue()
-
-    return Response(
-        "\ufeff" + csv_content,
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=roster_export.csv"}
-    )
+    def rows():
+        # 最新回答（latest_*_id）と入金を外部結合して1クエリで読み、EXPORT_YIELD_PER 行ずつ取り出す
+        prov_alias = aliased(ProvisionalResponse)
+        final_alias = aliased(FinalResponse)
+        records = (
+            db.session.query(Participant, prov_alias.status, final_alias, Payment)
+            .outerjoin(prov_alias, prov_alias.id == Participant.latest_provisional_id)
+            .outerjoin(final_alias, final_alias.id == Participant.latest_final_id)
+            .outerjoin(Payment, Payment.participant_id == Participant.id)
+            .order_by(Participant.class_name, Participant.student_number)
+            .yield_per(EXPORT_YIELD_PER)
+        )
+        for p, prov_status, final, pay in records:
+            email_out = "" if p.email and "@placeholder.local" in p.email else (p.email or "")
+            yield [
+                p.name,
+                p.name_kana or "",
+                email_out,
+                p.class_name or "",
+                p.student_number or "",
+                p.role or "生徒",
+                p.teacher_memo or "",
+                p.token or "",
+                PROV_LABELS.get(prov_status, "")    if prov_status else "",
+                FINAL_LABELS.get(final.status, "")  if final else "",
+                final.companions                    if final else "",
+                final.transfer_name                 if final else "",
+                final.remarks                       if final else "",
+                PAY_LABELS.get(pay.payment_status, "") if pay else "",
+                pay.paid_amount                     if pay else "",
+                pay.expected_amount                 if pay else "",
+                pay.payment_date.strftime("%Y-%m-%d") if (pay and pay.payment_date) else "",
+            ]
+
+    return _export_response("roster_export", header, rows(), "admin.roster")
 
 
 @admin_bp.route("/final-form-preview")
@@ -2149,13 +2036,12 @@ def final_form_preview():
         "transfer_account_type", "transfer_account_number", "transfer_account_name", "transfer_deadline",
         "reunion_fee",
     ]
-    transfer_info = {}
-    for s in AppSetting.query.filter(AppSetting.key.in_(transfer_keys)).all():
-        transfer_info[s.key] = s.value
+    settings = get_settings()
+    transfer_info = {k: settings[k] for k in transfer_keys if k in settings}
 
     default_transfer_name = normalize_transfer_name("3105ヤマダタロウ")
-    fd = AppSetting.query.filter_by(key="final_deadline").first()
-    final_deadline_jp = _format_deadline_jp(fd.value) if fd and fd.value else ""
+    fd = settings.get("final_deadline")
+    final_deadline_jp = _format_deadline_jp(fd) if fd else ""
 
     return render_template(
         "final_form.html",
@@ -2201,9 +2087,7 @@ GUIDE_DEFAULTS = {
 @admin_bp.route("/reunion-guide")
 def reunion_guide():
     """同窓会ご案内PDF用プレビュー（ブラウザからPDF保存）"""
-    settings = {}
-    for s in AppSetting.query.all():
-        settings[s.key] = s.value
+    settings = get_settings()
     for k, v in GUIDE_DEFAULTS.items():
         settings.setdefault(k, v)
 
@@ -2223,21 +2107,12 @@ def settings_reunion_guide():
     """同窓会ご案内の編集"""
     keys = list(GUIDE_DEFAULTS.keys())
     if request.method == "POST":
-        for k in keys:
-            val = request.form.get(k, "").strip()
-            s = AppSetting.query.filter_by(key=k).first()
-            if s:
-                s.value = val
-                s.updated_at = datetime.utcnow()
-            else:
-                db.session.add(AppSetting(key=k, value=val))
+        save_settings({k: request.form.get(k, "").strip() for k in keys})
         db.session.commit()
         flash("案内状の内容を保存しました。", "success")
         return redirect(url_for("admin.settings_reunion_guide"))
 
-    settings = {}
-    for s in AppSetting.query.filter(AppSetting.key.in_(keys)).all():
-        settings[s.key] = s.value
+    settings = {k: v for k, v in get_settings().items() if k in keys}
     for k, v in GUIDE_DEFAULTS.items():
         settings.setdefault(k, v)
     return render_template("admin/settings_reunion_guide.html", settings=settings)
@@ -16,29 +16,20 @@ URL:
      b. 一致複数（同姓同名）→ クラス・出席番号で絞り込み
      c. 一致なし → 新規登録
 """
-import re
 import secrets
 import logging
 from datetime import datetime, timedelta
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
 from extensions import db
-from models import Participant, ProvisionalResponse, FinalResponse, Payment, VerificationToken
-from models import AppSetting
-from services.token_service import get_participant_by_token, ensure_token, generate_final_url
-from services.mail_service import send_provisional_confirmation, send_final_confirmation, send_cancel_confirmation, send_verification_email
-from utils import normalize_transfer_name, decompose_voiced
+from models import Participant, ProvisionalResponse, FinalResponse, Payment, VerificationToken, PLACEHOLDER_DOMAIN
+from services.settings_service import get_setting, get_settings, has_setting, use_shared_settings
+from services.token_service import get_participant_for_final_form, ensure_token, generate_final_url
+from utils import normalize_name, normalize_transfer_name, decompose_voiced
 
 logger = logging.getLogger(__name__)
 
 forms_bp = Blueprint("forms", __name__, url_prefix="/form")
 
-PLACEHOLDER_DOMAIN = "@placeholder.local"
-
-
-def _normalize_name(name: str) -> str:
-    """氏名を正規化（スペース除去・全角半角統一）して比較用に返す"""
-    return re.sub(r'[\s\u3000]+', '', name)
-
 
 def _find_roster_match(name: str, class_name: str, student_number: str):
     """
@@ -53,18 +44,11 @@ def _find_roster_match(name: str, class_name: str, student_number: str):
         Participant or None: 一意に特定できた場合のみ返す。
                              複数候補が残る場合は None（新規登録に委ねる）。
     """
-    # プレースホルダーメールを持つ（＝まだ本人未連絡）レコードを対象に絞る
-    candidates = Participant.query.filter(
-        Participant.email.like(f"%{PLACEHOLDER_DOMAIN}")
-    ).all()
-
-    norm_input = _normalize_name(name)
-
-    # 氏名が一致するものを抽出（スペース差異を無視）
-    name_matches = [
-        p for p in candidates
-        if _normalize_name(p.name) == norm_input
-    ]
+    # プレースホルダーメールを持つ（＝まだ本人未連絡）レコードのうち氏名が一致するもの
+    # （スペース差異を無視。name_normalized / is_placeholder のインデックスで1回だけ検索する）
+    name_matches = Participant.query.filter_by(
+        is_placeholder=True, name_normalized=normalize_name(name),
+    ).order_by(Participant.id).all()
 
     if not name_matches:
         return None
@@ -95,9 +79,9 @@ def provisional():
     if request.method == "GET":
         from services.mail_service import _format_deadline_jp
         deadline = ""
-        s = AppSetting.query.filter_by(key="provisional_deadline").first()
-        if s and s.value:
-            deadline = _format_deadline_jp(s.value)
+        value = get_setting("provisional_deadline")
+        if value:
+            deadline = _format_deadline_jp(value)
         locked = _is_provisional_form_locked()
         return render_template("provisional_form.html", provisional_deadline=deadline, locked=locked)
 
@@ -207,6 +191,7 @@ def provisional():
     # 認証メールを送信
     base_url = current_app.config.get("APP_BASE_URL", request.host_url.rstrip("/"))
     verify_url = f"{base_url}/form/verify/{vtk.token}"
+    from services.mail_service import send_verification_email
     try:
         send_verification_email(email, name, verify_url)
     except Exception as e:
@@ -279,6 +264,7 @@ def verify(token):
     logger.info(f"メール認証完了・回答確定: {participant.name} ({vtk.new_email}) → {vtk.prov_status}")
 
     # 確認メール送信
+    from services.mail_service import send_provisional_confirmation
     try:
         status_label = ProvisionalResponse.STATUS_LABELS.get(vtk.prov_status, vtk.prov_status)
         base_url = current_app.config.get("APP_BASE_URL", request.host_url.rstrip("/"))
@@ -297,30 +283,28 @@ def _today_jst():
 
 def _is_provisional_form_locked() -> bool:
     """手動ロック設定を優先し、なければ provisional_deadline 翌日以降（JST）でロック。"""
-    manual = AppSetting.query.filter_by(key="provisional_form_locked").first()
-    if manual:
-        return manual.value == "1"
-    s = AppSetting.query.filter_by(key="provisional_deadline").first()
-    if not (s and s.value):
+    if has_setting("provisional_form_locked"):
+        return get_setting("provisional_form_locked") == "1"
+    value = get_setting("provisional_deadline")
+    if not value:
         return False
     try:
         from datetime import date as _date
-        return _today_jst() > _date.fromisoformat(s.value)
+        return _today_jst() > _date.fromisoformat(value)
     except ValueError:
         return False
 
 
 def _is_final_form_locked() -> bool:
     """手動ロック設定を優先し、なければ final_deadline 翌日以降（JST）でロック。"""
-    manual = AppSetting.query.filter_by(key="final_form_locked").first()
-    if manual:
-        return manual.value == "1"
-    s = AppSetting.query.filter_by(key="final_deadline").first()
-    if not (s and s.value):
+    if has_setting("final_form_locked"):
+        return get_setting("final_form_locked") == "1"
+    value = get_setting("final_deadline")
+    if not value:
         return False
     try:
         from datetime import date as _date
-        return _today_jst() > _date.fromisoformat(s.value)
+        return _today_jst() > _date.fromisoformat(value)
     except ValueError:
         return False
 
@@ -356,24 +340,53 @@ def _build_transfer_name_patterns(base_name: str) -> list:
     return patterns
 
 
+# 本出欠フォームに表示する振込先情報の設定キー
+FINAL_FORM_TRANSFER_KEYS = [
+    "transfer_bank", "transfer_branch", "transfer_branch_number",
+    "transfer_account_type", "transfer_account_number", "transfer_account_name", "transfer_deadline",
+    "reunion_fee",
+]
+
+
+def _load_final_form(token: str):
+    """
+    本出欠フォームの表示・送信に使う参加者・回答・設定を1リクエスト分まとめて読み込む。
+    参加者＋最新の本出欠回答＋入金情報で1クエリ、設定はプロセス内の共有キャッシュから取る
+    （読み込む場合も1クエリ）ので最大2クエリ。トークンが無効なら None
+    """
+    participant, existing = get_participant_for_final_form(token)
+    if participant is None:
+        return None
+
+    from services.mail_service import _format_deadline_jp
+    use_shared_settings()
+    settings = get_settings()
+    fd = settings.get("final_deadline")
+    # 会費（支払予定金額）
+    try:
+        payment_expected = int((settings.get("reunion_fee") or "0").replace(",", "").replace("円", "").strip())
+    except ValueError:
+        payment_expected = 0
+    return {
+        "participant": participant,
+        "existing": existing,
+        "transfer_info": {k: settings[k] for k in FINAL_FORM_TRANSFER_KEYS if k in settings},
+        "locked": _is_final_form_locked(),
+        "final_deadline_jp": _format_deadline_jp(fd) if fd else "",
+        "payment_expected": payment_expected,
+    }
+
+
 @forms_bp.route("/final/<token>", methods=["GET", "POST"])
 def final(token):
     """本出欠フォーム（トークン付きURL）"""
-    participant = get_participant_by_token(token)
-    if participant is None:
+    form = _load_final_form(token)
+    if form is None:
         abort(404)
 
-    existing = participant.latest_final
-
-    # 振込先情報をDBから取得
-    transfer_keys = [
-        "transfer_bank", "transfer_branch", "transfer_branch_number",
-        "transfer_account_type", "transfer_account_number", "transfer_account_name", "transfer_deadline",
-        "reunion_fee",
-    ]
-    transfer_info = {}
-    for s in AppSetting.query.filter(AppSetting.key.in_(transfer_keys)).all():
-        transfer_info[s.key] = s.value
+    participant = form["participant"]
+    existing = form["existing"]
+    transfer_info = form["transfer_info"]
 
     # 振込名義を自動生成: 学籍番号(クラス+出席番号) + カナ氏名
     # 学籍番号がない場合は "3000" をプレフィックスとして使用
@@ -389,12 +402,9 @@ def final(token):
     transfer_name_patterns = _build_transfer_name_patterns(default_transfer_name)
 
     is_teacher = participant.role in ("教師", "学年主任", "副担任")
-    locked = _is_final_form_locked()
+    locked = form["locked"]
     can_cancel = locked and existing and existing.status == "attending"
-
-    from services.mail_service import _format_deadline_jp
-    fd = AppSetting.query.filter_by(key="final_deadline").first()
-    final_deadline_jp = _format_deadline_jp(fd.value) if fd and fd.value else ""
+    final_deadline_jp = form["final_deadline_jp"]
 
     if request.method == "GET":
         return render_template("final_form.html",
@@ -431,6 +441,7 @@ def final(token):
             participant.updated_at = datetime.utcnow()
             db.session.commit()
             logger.info(f"直前キャンセル: {participant.name} ({participant.email})")
+            from services.mail_service import send_cancel_confirmation
             try:
                 send_cancel_confirmation(participant, cancel_reason)
             except Exception as e:
@@ -471,13 +482,7 @@ def final(token):
                                can_cancel=False,
                                is_teacher=is_teacher)
 
-    # 会費を取得（AppSettingから）
-    fee_setting = AppSetting.query.filter_by(key="reunion_fee").first()
-    reunion_fee_str = fee_setting.value if fee_setting else "0"
-    try:
-        payment_expected = int(reunion_fee_str.replace(",", "").replace("円", "").strip())
-    except ValueError:
-        payment_expected = 0
+    payment_expected = form["payment_expected"]
 
     response = FinalResponse(
         participant_id=participant.id,
@@ -512,6 +517,7 @@ def final(token):
     logger.info(f"本出欠登録: {participant.name} ({participant.email}) → {status}")
 
     # 送信完了メールを送信（失敗してもフォーム送信はブロックしない）
+    from services.mail_service import send_final_confirmation
     try:
         status_label = FinalResponse.STATUS_LABELS.get(status, status)
         base_url = current_app.config.get("APP_BASE_URL", request.host_url.rstrip("/"))
@@ -528,35 +534,18 @@ def final(token):
 def api_names():
     """クラスに属する生徒名一覧をJSON返却（仮出欠フォームのドロップダウン用）"""
     from flask import jsonify
-    from sqlalchemy import or_
+    from services.roster_service import get_class_roster, NAMES_CACHE_MAX_AGE
     class_name = request.args.get("class", "").strip()
     if not class_name:
         return jsonify([])
-    def _teacher_sort_key(p):
-        role_order = 0 if p.role == "学年主任" else 1
-        num = int(p.student_number) if p.student_number and p.student_number.isdigit() else 9999
-        return (role_order, p.class_name or "", num)
-
-    if class_name == "teacher":
-        participants = Participant.query.filter(
-            or_(Participant.role == "教師", Participant.role == "学年主任")
-        ).all()
-        participants.sort(key=_teacher_sort_key)
-    else:
-        students = Participant.query.filter(
-            Participant.class_name == class_name,
-            or_(Participant.role == "生徒", Participant.role == "幹事")
-        ).all()
-        students.sort(key=lambda p: (int(p.student_number) if p.student_number and p.student_number.isdigit() else 9999))
-        # 学年主任（class_nameが空）＋当クラスの教師
-        heads = Participant.query.filter_by(role="学年主任").all()
-        class_teachers = Participant.query.filter_by(class_name=class_name, role="教師").all()
-        class_teachers.sort(key=lambda p: (int(p.student_number) if p.student_number and p.student_number.isdigit() else 9999))
-        participants = students + heads + class_teachers
-    def _responded(p):
-        prov = p.latest_provisional
-        return bool(prov and prov.submitted_at)
-    return jsonify([{"id": p.id, "name": p.name, "role": p.role or "", "name_kana": p.name_kana or "", "number": p.student_number or "", "responded": _responded(p)} for p in participants])
+
+    # クラス別名簿はデータ変更時のみ作り直し、再取得には 304 を返す
+    body, etag = get_class_roster(class_name)
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = NAMES_CACHE_MAX_AGE
+    return response.make_conditional(request)
 
 
 @forms_bp.route("/done")
@@ -0,0 +1,78 @@
+"""
+services/attendance_service.py - 会場QR出席登録
+
+受付の列を止めないよう、スキャン時は出席記録を書いて確認メールを送信キュー（mail_jobs）に
+積むだけにする。メールの送信と AttendanceRecord.email_sent の更新は
+mail_queue_service のワーカーがリクエストの外で行う。
+
+同じ参加者が CHECKIN_WINDOW_SECONDS 秒以内に再スキャンした場合（二度押し・読み直し）は
+新しい記録を作らず、直前の記録を返す。gunicorn の複数ワーカーに同時に届いた場合も
+idempotency_key（参加者×登録経路×時間枠）のユニーク制約で1件にする。
+"""
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import AttendanceRecord
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_WINDOW_SECONDS = 120   # この秒数以内の再スキャンは同じ出席登録として扱う
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _idempotency_key(participant_id: int, source: str, now: datetime) -> str:
+    window = int((now - _EPOCH).total_seconds()) // CHECKIN_WINDOW_SECONDS
+    return f"{source}:{participant_id}:{window}"
+
+
+def _recent_checkin(participant_id: int, now: datetime):
+    """CHECKIN_WINDOW_SECONDS 秒以内の出席記録（なければ None）"""
+    return (
+        AttendanceRecord.query
+        .filter(
+            AttendanceRecord.participant_id == participant_id,
+            AttendanceRecord.status == "checked_in",
+            AttendanceRecord.checked_in_at >= now - timedelta(seconds=CHECKIN_WINDOW_SECONDS),
+        )
+        .order_by(AttendanceRecord.checked_in_at.desc())
+        .first()
+    )
+
+
+def check_in(participant, source: str = "qr") -> tuple:
+    """
+    出席を登録し、確認メールを送信キューに積む（メールアドレス未登録の名簿レコードには送らない）。
+
+    Returns:
+        (AttendanceRecord, 新たに登録したら True / 再スキャンで既存の記録を返したら False)
+    """
+    now = datetime.utcnow()
+    recent = _recent_checkin(participant.id, now)
+    if recent is not None:
+        return recent, False
+
+    key = _idempotency_key(participant.id, source, now)
+    record = AttendanceRecord(participant_id=participant.id, source=source, status="checked_in",
+                              checked_in_at=now, idempotency_key=key)
+    try:
+        with db.session.begin_nested():
+            db.session.add(record)
+        db.session.commit()
+    except IntegrityError:
+        # 同時に届いた同じスキャンが先に登録した
+        db.session.rollback()
+        return AttendanceRecord.query.filter_by(idempotency_key=key).one(), False
+
+    if not participant.is_placeholder:
+        from services.mail_queue_service import enqueue_mail_jobs, start_background_worker
+        try:
+            enqueue_mail_jobs([participant.id], "attendance_checkin")
+            start_background_worker(current_app._get_current_object())
+        except Exception as e:
+            # 出席記録は登録済みなので、メールの登録に失敗しても受付は止めない
+            db.session.rollback()
+            logger.error(f"出席登録確認メールの送信登録に失敗: participant={participant.id} - {e}", exc_info=True)
+    return record, True
@@ -0,0 +1,23 @@
+"""
+services/cache_version.py - プロセス内スナップショットの「データのバージョン」
+
+status_service（/status）・roster_service（/form/api/names）は描画済みの結果をプロセス内に保持し、
+元のテーブルの件数・最大ID・最終更新日時（updated_at 列があるもの）が変わったときだけ作り直す。
+DBを見て判定するので、gunicorn の複数ワーカーでも整合する。
+"""
+from sqlalchemy import func, select
+from extensions import db
+
+
+def data_version(*models) -> tuple:
+    """models の行の追加・変更・削除で変わる値の組を1クエリで返す"""
+    def _scalar(*cols):
+        return select(*cols).scalar_subquery()
+
+    columns = []
+    for model in models:
+        columns.append(_scalar(func.count(model.id)))
+        columns.append(_scalar(func.max(model.id)))
+        if hasattr(model, "updated_at"):
+            columns.append(_scalar(func.max(model.updated_at)))
+    return tuple(db.session.query(*columns).one())
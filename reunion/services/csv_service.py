@@ -8,6 +8,7 @@ services/csv_service.py - 銀行CSVの取込・パース処理
 銀行によってCSVのフォーマットが異なる。
 よくある列名のパターンを複数定義し、自動マッチングする。
 """
+import codecs
 import csv
 import io
 import logging
@@ -89,6 +90,20 @@ def _parse_amount(amount_str: str) -> int:
         return 0
 
 
+# エンコーディング判別の候補（この順に試す）
+ENCODING_CANDIDATES = ["utf-8-sig", "shift_jis", "cp932", "utf-8"]
+# ストリーミング取込でエンコーディング判別に使う先頭バイト数・読み込み単位
+ENCODING_SNIFF_BYTES = 64 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+# DB保存時の1回あたりの件数
+SAVE_CHUNK_SIZE = 1000
+
+# ストリーミング中にデコードできない文字が出たときの切り替え先（上位互換のもののみ）
+_ENCODING_FALLBACKS = {"shift_jis": "cp932"}
+
+_ENCODING_ERROR = "CSVファイルのエンコーディングを判別できませんでした。UTF-8かShift_JISで保存してください。"
+
+
 def parse_bank_csv(file_content: bytes, filename: str = "") -> list:
     """
     銀行CSVファイルのバイト列を解析して、レコードのリストを返す。
@@ -99,11 +114,9 @@ def parse_bank_csv(file_content: bytes, filename: str = "") -> list:
     Raises:
         ValueError: CSVの形式が認識できない場合
     """
-    records = []
-
     # エンコーディングを自動判別（UTF-8 → Shift_JIS の順で試す）
     text = None
-    for encoding in ["utf-8-sig", "shift_jis", "cp932", "utf-8"]:
+    for encoding in ENCODING_CANDIDATES:
         try:
             text = file_content.decode(encoding)
             break
@@ -111,30 +124,119 @@ def parse_bank_csv(file_content: bytes, filename: str = "") -> list:
             continue
 
     if text is None:
-        raise ValueError("CSVファイルのエンコーディングを判別できませんでした。UTF-8かShift_JISで保存してください。")
+        raise ValueError(_ENCODING_ERROR)
 
-    reader = csv.reader(io.StringIO(text))
-    rows = list(reader)
+    return list(_iter_records(csv.reader(io.StringIO(text)), filename))
+
+
+def iter_bank_csv(stream, filename: str = ""):
+    """
+    銀行CSVをファイルストリームから1行ずつ解析し、レコードを順に返すジェネレータ。
+    ファイル全体をメモリに載せないため、大きなCSVでもメモリ使用量が一定になる。
+
+    エンコーディングは ASCII 以外のバイトが最初に現れた位置から ENCODING_SNIFF_BYTES バイトで
+    判別し、以降はインクリメンタルにデコードする。判別後の位置でデコードできない文字が
+    出た場合は ValueError になる。
+
+    Yields:
+        dict: parse_bank_csv と同じ形式のレコード
+
+    Raises:
+        ValueError: CSVの形式が認識できない場合
+    """
+    yield from _iter_records(csv.reader(_iter_text_lines(stream)), filename)
 
-    if not rows:
-        raise ValueError("CSVファイルが空です。")
+
+def _detect_encoding(prefix: bytes, at_eof: bool) -> Optional[str]:
+    """先頭バイト列をエラーなくデコードできる最初の候補エンコーディングを返す"""
+    for encoding in ENCODING_CANDIDATES:
+        try:
+            # 末尾で切れた多バイト文字はエラーにしない（final=False）
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=at_eof)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def _iter_text_lines(stream):
+    """
+    バイトストリームをインクリメンタルにデコードし、1行ずつ（改行付きで）返す。
+
+    ASCII だけの部分はどの候補エンコーディングでも同じ文字になるので、判別を待たずに返す。
+    英数字のヘッダーやローマ字の行が続いた後で Shift_JIS の行が現れても、
+    ファイル全体で判別する parse_bank_csv と同じエンコーディングになる。
+    """
+    encoding = None
+    decoder = None
+    pending = ""
+    chunk = stream.read(ENCODING_SNIFF_BYTES)
+    while True:
+        final = not chunk
+        if decoder is None and not chunk.isascii():
+            encoding = _detect_encoding(chunk, at_eof=len(chunk) < ENCODING_SNIFF_BYTES)
+            if encoding is None:
+                raise ValueError(_ENCODING_ERROR)
+            decoder = codecs.getincrementaldecoder(encoding)()
+
+        if decoder is None:
+            text = pending + chunk.decode("ascii")
+        else:
+            buffered, _ = decoder.getstate()
+            try:
+                text = pending + decoder.decode(chunk, final=final)
+            except UnicodeDecodeError:
+                # 判別時には Shift_JIS と判別できても、後半に CP932 拡張文字（①など）があれば
+                # 上位互換の CP932 に切り替えて続きを読む
+                fallback = _ENCODING_FALLBACKS.get(encoding)
+                if fallback is None:
+                    raise ValueError(_ENCODING_ERROR)
+                logger.info(f"エンコーディングを {encoding} から {fallback} に切り替えます")
+                encoding = fallback
+                decoder = codecs.getincrementaldecoder(encoding)()
+                try:
+                    text = pending + decoder.decode(buffered + chunk, final=final)
+                except UnicodeDecodeError:
+                    raise ValueError(_ENCODING_ERROR)
+        lines = text.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+        if final:
+            break
+        # 判別前は判別に使う単位で読む（ASCII 以外のバイトを含む読み込み単位で判別する）
+        chunk = stream.read(STREAM_CHUNK_BYTES if decoder is not None else ENCODING_SNIFF_BYTES)
+    if pending:
+        yield pending
+
+
+def _iter_records(rows, filename: str):
+    """CSVの行イテレータからヘッダー行を探し、データ行をレコードに変換して返す"""
+    rows = iter(rows)
+    count = 0
 
     # ヘッダー行をスキャンして探す（上部メタデータ行をスキップ）
     all_candidates = set(c.lower() for c in DATE_COLUMN_CANDIDATES + NAME_COLUMN_CANDIDATES + AMOUNT_COLUMN_CANDIDATES)
     header_row_idx = None
+    headers = None
+    is_empty = True
     for i, row in enumerate(rows):
+        is_empty = False
         cells_lower = [c.strip().lower() for c in row]
         if sum(1 for c in cells_lower if c in all_candidates) >= 2:
             header_row_idx = i
+            headers = row
             break
 
+    if is_empty:
+        raise ValueError("CSVファイルが空です。")
+
     if header_row_idx is None:
         raise ValueError(
             f"CSVのヘッダー行を認識できませんでした。\n"
             f"「日付」「振込名義」「金額」に相当する列名が必要です。"
         )
 
-    headers = rows[header_row_idx]
     date_idx = _find_column(headers, DATE_COLUMN_CANDIDATES)
     name_idx = _find_column(headers, NAME_COLUMN_CANDIDATES)
     amount_idx = _find_column(headers, AMOUNT_COLUMN_CANDIDATES)
@@ -147,7 +249,7 @@ def parse_bank_csv(file_content: bytes, filename: str = "") -> list:
         )
 
     # データ行を処理
-    for row_num, row in enumerate(rows[header_row_idx + 1:], start=header_row_idx + 2):
+    for row_num, row in enumerate(rows, start=header_row_idx + 2):
         if not row or all(cell.strip() == "" for cell in row):
             continue  # 空行はスキップ
 
@@ -162,54 +264,130 @@ def parse_bank_csv(file_content: bytes, filename: str = "") -> list:
             if raw_amount <= 0:
                 continue
 
-            records.append({
+            record = {
                 "raw_name": raw_name,
                 "raw_date": raw_date,
                 "raw_amount": raw_amount,
                 "filename": filename,
-            })
+            }
 
         except Exception as e:
             logger.warning(f"行 {row_num} の解析をスキップ: {e}")
             continue
 
-    logger.info(f"CSVパース完了: {len(records)} 件取込 (ファイル: {filename})")
-    return records
+        count += 1
+        yield record
+
+    logger.info(f"CSVパース完了: {count} 件取込 (ファイル: {filename})")
+
+
+def _dedup_key(rec: dict) -> tuple:
+    """重複判定キー（同一ファイル名・名義・日付・金額）"""
+    return (rec["filename"], rec["raw_name"], rec["raw_date"], rec["raw_amount"])
+
+
+def _load_existing_keys(filenames: set) -> set:
+    """指定ファイル名で取込済みの重複判定キーを1クエリで取得する"""
+    from models import BankImport
+    from extensions import db
 
+    if not filenames:
+        return set()
+    rows = db.session.query(
+        BankImport.filename, BankImport.raw_name, BankImport.raw_date, BankImport.raw_amount,
+    ).filter(BankImport.filename.in_(filenames)).all()
+    return {tuple(row) for row in rows}
 
-def save_bank_imports(records: list) -> list:
+
+def _chunked(records, size: int):
+    """イテラブルを size 件ずつのリストに分けて返す"""
+    chunk = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def save_bank_imports(records) -> dict:
     """
     パースした銀行CSVレコードをDBに保存する。
     重複チェック（同一ファイル名・名義・日付・金額）を行い、重複はスキップする。
+
+    records はリストでも iter_bank_csv のジェネレータでもよい。SAVE_CHUNK_SIZE 件ずつ
+    メモリ上で重複を除いて一括INSERTし、全件処理後に1回だけコミットする（途中で失敗したら全件取り消し）。
+
+    Returns:
+        dict: read=読込件数, saved=新規保存件数, skipped=重複スキップ件数
     """
-    from models import BankImport
     from extensions import db
 
-    saved = []
-    skipped = 0
+    existing = {}  # ファイル名 → 取込済みキーの集合
+    counts = {"read": 0, "saved": 0, "skipped": 0}
+    try:
+        for chunk in _chunked(records, SAVE_CHUNK_SIZE):
+            counts["read"] += len(chunk)
+            _save_chunk(chunk, existing, counts)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
 
-    for rec in records:
-        existing = BankImport.query.filter_by(
-            filename=rec["filename"],
-            raw_name=rec["raw_name"],
-            raw_date=rec["raw_date"],
-            raw_amount=rec["raw_amount"],
-        ).first()
-
-        if existing:
-            skipped += 1
-            continue
+    logger.info(f"DB保存完了: {counts['saved']} 件保存, {counts['skipped']} 件スキップ（重複）")
+    return counts
 
-        bank_import = BankImport(
-            filename=rec["filename"],
-            raw_name=rec["raw_name"],
-            raw_date=rec["raw_date"],
-            raw_amount=rec["raw_amount"],
-            match_status="unmatched",
-        )
-        db.session.add(bank_import)
-        saved.append(bank_import)
 
-    db.session.commit()
-    logger.info(f"DB保存完了: {len(saved)} 件保存, {skipped} 件スキップ（重複）")
-    return saved
+def _save_chunk(chunk: list, existing: dict, counts: dict) -> None:
+    """
+    1チャンク分を重複除去して一括INSERTする。
+    同時取込で uq_bank_imports_dedup 違反になった場合は、セーブポイントまで戻して
+    キーを読み直し、1回だけ再試行する。
+    """
+    from sqlalchemy import insert
+    from sqlalchemy.exc import IntegrityError
+    from models import BankImport
+    from extensions import db
+
+    filenames = {rec["filename"] for rec in chunk}
+    for fn in filenames - existing.keys():
+        existing[fn] = _load_existing_keys({fn})
+
+    for attempt in range(2):
+        now = datetime.utcnow()
+        rows = []
+        skipped = 0
+        added = set()
+        for rec in chunk:
+            key = _dedup_key(rec)
+            if key in existing[rec["filename"]] or key in added:
+                skipped += 1
+                continue
+            added.add(key)
+            rows.append({
+                "filename": rec["filename"],
+                "raw_name": rec["raw_name"],
+                "raw_date": rec["raw_date"],
+                "raw_amount": rec["raw_amount"],
+                "match_status": "unmatched",
+                "import_date": now,
+                "created_at": now,
+            })
+
+        try:
+            if rows:
+                with db.session.begin_nested():
+                    db.session.execute(insert(BankImport), rows)
+            break
+        except IntegrityError:
+            if attempt == 1:
+                raise
+            logger.warning("銀行CSVの同時取込を検出したため、重複チェックをやり直します")
+            for fn in filenames:
+                existing[fn] = _load_existing_keys({fn})
+
+    for key in added:
+        existing[key[0]].add(key)
+    counts["saved"] += len(rows)
+    counts["skipped"] += skipped
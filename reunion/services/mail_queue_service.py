@@ -0,0 +1,560 @@
+"""
+services/mail_queue_service.py - 一括メール送信キュー
+
+一括送信ボタンは mail_jobs に1人1通ずつ登録するだけにし、送信はワーカーが行う。
+（会場QR出席登録の確認メールも同じキューで送る: attendance_service.check_in）
+  - 登録は参加者×メール種別で冪等（送信待ち・送信中のものは積み直さない）
+  - ワーカーは条件付き UPDATE でジョブを確保（リース）してから送信するので、
+    gunicorn の複数ワーカーや CLI ワーカーが同時に動いても二重送信しない
+  - 失敗したジョブは待ち時間を延ばしながら再試行し、上限を超えたら failed にする
+  - リース期限が切れた送信中ジョブ（ワーカーの再起動など）は他のワーカーが引き継ぐ
+    （送信に時間がかかっている間は、確保したワーカーがリースを延長し続ける）
+  - 送信は複数スレッドで並行して行い、送信レート・同時送信数は管理画面のメール設定で変更できる
+
+ワーカーの起動:
+  - 一括送信の登録時にプロセス内のバックグラウンドスレッドを起動する（start_background_worker）
+  - 常駐させる場合: flask --app app mail-worker
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Participant, MailJob, MailLog, AttendanceRecord
+from services.settings_service import get_setting, settings_scope
+
+logger = logging.getLogger(__name__)
+
+MAIL_TYPES = ("final_url", "reminder", "final_reminder", "attendance_checkin")
+MAIL_TYPE_LABELS = {"final_url": "本出欠URL", "reminder": "リマインド", "final_reminder": "最終リマインド",
+                    "attendance_checkin": "会場出席登録確認"}
+
+SEND_BATCH_SIZE = 20           # 一度に確保するジョブ数
+LEASE_SECONDS = 300            # ジョブ確保の有効期限
+LEASE_RENEW_SECONDS = 100      # 送信の完了を待つ間、この間隔で確保中のジョブのリースを延長する
+MAX_ATTEMPTS = 5               # 送信を試みる上限回数
+RETRY_BASE_SECONDS = 60        # 再試行の待ち時間（1回目）。以降は倍々
+RETRY_MAX_SECONDS = 3600       # 再試行の待ち時間の上限
+IDLE_POLL_SECONDS = 60         # バックグラウンドワーカーが次のジョブを待つ最長間隔
+
+SENT_STATUSES = ("sent", "simulated")
+# 1日の送信上限に達しても送る種別（会場での出席登録確認は当日届かないと意味がないため上限の対象外）
+UNLIMITED_MAIL_TYPES = ("attendance_checkin",)
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _retry_delay(attempts: int) -> int:
+    """attempts 回目の失敗後の待ち時間（秒）"""
+    return min(RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), RETRY_MAX_SECONDS)
+
+
+# -----------------------------------------------
+# 登録
+# -----------------------------------------------
+def enqueue_mail_jobs(participant_ids, mail_type: str) -> dict:
+    """
+    参加者ごとの送信ジョブを登録する（参加者×メール種別で冪等）。
+
+    送信待ち・送信中のジョブがあればそのまま、送信済み・失敗のジョブは送信待ちに戻す
+    （呼び出し側は「まだ送れていない人」を対象にしている前提）。
+
+    Returns:
+        {"queued": 新たに送信待ちにした件数, "already": 既に送信待ち・送信中だった件数}
+    """
+    if mail_type not in MAIL_TYPES:
+        raise ValueError(f"未対応のメール種別です: {mail_type}")
+    participant_ids = list(dict.fromkeys(participant_ids))
+    result = {"queued": 0, "already": 0}
+    if not participant_ids:
+        return result
+
+    now = datetime.utcnow()
+    existing = {
+        job.participant_id: job
+        for job in MailJob.query.filter(
+            MailJob.mail_type == mail_type,
+            MailJob.participant_id.in_(participant_ids),
+        )
+    }
+    for pid in participant_ids:
+        job = existing.get(pid)
+        if job is not None:
+            if job.status in ("pending", "running"):
+                result["already"] += 1
+                continue
+            job.status = "pending"
+            job.attempts = 0
+            job.run_after = now
+            job.locked_by = None
+            job.locked_until = None
+            job.last_error = ""
+            result["queued"] += 1
+            continue
+        try:
+            # 同時に登録された場合はユニーク制約で弾かれるので、その行だけ取り消す
+            with db.session.begin_nested():
+                db.session.add(MailJob(participant_id=pid, mail_type=mail_type, run_after=now))
+            result["queued"] += 1
+        except IntegrityError:
+            result["already"] += 1
+    db.session.commit()
+    return result
+
+
+def queue_counts() -> dict:
+    """状態ごとのジョブ件数 {status: count}"""
+    rows = db.session.query(MailJob.status, db.func.count(MailJob.id)).group_by(MailJob.status).all()
+    return {status: count for status, count in rows}
+
+
+# -----------------------------------------------
+# 確保・送信
+# -----------------------------------------------
+def _claimable(now):
+    return db.or_(
+        db.and_(MailJob.status == "pending", MailJob.run_after <= now),
+        db.and_(MailJob.status == "running", MailJob.locked_until < now),
+    )
+
+
+def claim_jobs(worker_id: str, limit: int, mail_types=None) -> list:
+    """送信可能なジョブを最大 limit 件確保して返す（mail_types を渡したらその種別だけ。commit は1回）"""
+    now = datetime.utcnow()
+    query = db.session.query(MailJob.id).filter(_claimable(now))
+    if mail_types is not None:
+        query = query.filter(MailJob.mail_type.in_(mail_types))
+    candidates = [job_id for (job_id,) in query.order_by(MailJob.id).limit(limit * 2)]
+    claimed_ids = []
+    for job_id in candidates:
+        if len(claimed_ids) >= limit:
+            break
+        # 他のワーカーが先に確保していれば 0 行更新になる
+        claimed = (
+            MailJob.query
+            .filter(MailJob.id == job_id, _claimable(now))
+            .update({
+                MailJob.status: "running",
+                MailJob.locked_by: worker_id,
+                MailJob.locked_until: now + timedelta(seconds=LEASE_SECONDS),
+                MailJob.attempts: MailJob.attempts + 1,
+                MailJob.updated_at: now,
+            }, synchronize_session=False)
+        )
+        if claimed:
+            claimed_ids.append(job_id)
+    db.session.commit()
+    if not claimed_ids:
+        return []
+    return MailJob.query.filter(MailJob.id.in_(claimed_ids)).order_by(MailJob.id).all()
+
+
+def _renew_leases(job_ids, worker_id: str) -> None:
+    """確保中のジョブのリース期限を延ばす（他のワーカーに取られたものはそのまま）。commit は呼び出し側"""
+    if not job_ids:
+        return
+    (MailJob.query
+     .filter(MailJob.id.in_(list(job_ids)), MailJob.status == "running", MailJob.locked_by == worker_id)
+     .update({MailJob.locked_until: datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)},
+             synchronize_session=False))
+
+
+def _wait_renewing_leases(futures, job_ids, worker_id: str) -> None:
+    """
+    確保したバッチの送信がすべて終わるまで待つ。低い送信レートや SMTP のタイムアウトで
+    送信が LEASE_SECONDS を超えても他のワーカーに引き継がれないよう、待つ間リースを延長し続ける。
+    """
+    while wait(futures, timeout=LEASE_RENEW_SECONDS).not_done:
+        _renew_leases(job_ids, worker_id)
+        db.session.commit()
+
+
+def _finish_job(job_id: int, worker_id: str, **values) -> None:
+    """確保中のジョブを更新する（リースを他のワーカーに取られていたら何もしない）。commit は呼び出し側"""
+    values.setdefault("locked_by", None)
+    values.setdefault("locked_until", None)
+    values["updated_at"] = datetime.utcnow()
+    (MailJob.query
+     .filter(MailJob.id == job_id, MailJob.status == "running", MailJob.locked_by == worker_id)
+     .update({getattr(MailJob, k): v for k, v in values.items()}, synchronize_session=False))
+
+
+def _sent_pairs(participant_ids) -> set:
+    """送信済みの (participant_id, mail_type) の組"""
+    if not participant_ids:
+        return set()
+    return set(
+        db.session.query(MailLog.participant_id, MailLog.mail_type)
+        .filter(MailLog.participant_id.in_(list(participant_ids)), MailLog.status.in_(SENT_STATUSES))
+        .distinct()
+    )
+
+
+def _unmailed_checkin_ids(participant_ids) -> set:
+    """確認メールを送っていない出席記録がある参加者ID"""
+    if not participant_ids:
+        return set()
+    return {
+        pid for (pid,) in
+        db.session.query(AttendanceRecord.participant_id)
+        .filter(AttendanceRecord.participant_id.in_(list(participant_ids)),
+                AttendanceRecord.status == "checked_in", AttendanceRecord.email_sent.is_(False))
+        .distinct()
+    }
+
+
+def get_guide_pdf_path():
+    """最終リマインドに添付する案内PDFのパス（未設定なら既定の配置場所、なければ None）"""
+    path = get_setting("reunion_guide_pdf")
+    if path:
+        return path
+    default_pdf = os.path.join(current_app.root_path, "static", "uploads", "reunion_guide.pdf")
+    return default_pdf if os.path.isfile(default_pdf) else None
+
+
+def _build_message(participant, mail_type: str) -> tuple:
+    """
+    ジョブのメール件名・本文を作る
+    （send_final_url / send_reminder / send_final_reminder と同じ文面）
+    """
+    from services.mail_service import (_build_final_url_mail_body, _build_reminder_mail_body,
+                                       _build_final_reminder_body, _build_attendance_confirmation_body)
+    from services.token_service import ensure_token, generate_final_url
+
+    name, role = participant.display_name, participant.role or ""
+    if mail_type == "attendance_checkin":
+        # 登録日時は送信時刻ではなく、直近の出席登録の時刻
+        checked_in_at = (
+            db.session.query(db.func.max(AttendanceRecord.checked_in_at))
+            .filter(AttendanceRecord.participant_id == participant.id, AttendanceRecord.status == "checked_in")
+            .scalar()
+        )
+        return _build_attendance_confirmation_body(name, checked_in_at)
+    if mail_type == "final_url":
+        base_url = current_app.config.get("APP_BASE_URL", "http://localhost:5000")
+        return _build_final_url_mail_body(name, generate_final_url(participant, base_url), role=role)
+    if mail_type == "reminder":
+        base_url = current_app.config.get("APP_BASE_URL", "http://localhost:5000")
+        return _build_reminder_mail_body(name, generate_final_url(participant, base_url), role=role)
+    base_url = current_app.config.get("APP_BASE_URL", "")
+    token = ensure_token(participant)
+    final_url = f"{base_url}/form/final/{token}" if base_url else ""
+    return _build_final_reminder_body(name, role=role, final_url=final_url)
+
+
+def _prepare_batch(jobs, worker_id: str) -> tuple:
+    """
+    確保したジョブの送信内容を作る。送信不要なジョブはここで終了にする。
+    Returns: (送信するメールのリスト, スキップ件数)
+    """
+    participants = {
+        p.id: p for p in
+        Participant.query.filter(Participant.id.in_({job.participant_id for job in jobs}))
+    }
+    sent = _sent_pairs(participants)
+    unmailed_checkins = set()
+    if any(job.mail_type == "attendance_checkin" for job in jobs):
+        unmailed_checkins = _unmailed_checkin_ids(participants)
+    attachment_path = None
+    if any(job.mail_type == "final_reminder" for job in jobs):
+        attachment_path = get_guide_pdf_path()
+
+    items, skipped = [], 0
+    for job in jobs:
+        participant = participants.get(job.participant_id)
+        if participant is None or participant.email.endswith("@placeholder.local"):
+            _finish_job(job.id, worker_id, status="cancelled", last_error="送信先メールアドレスがありません")
+            skipped += 1
+            continue
+        # 別経路（個別送信・前のワーカーの送信後の中断）で送信済みなら送らない。
+        # 出席登録の確認は登録のたびに送るので、MailLog ではなく未送信の出席記録の有無で判定する
+        if job.mail_type == "attendance_checkin":
+            already_sent = participant.id not in unmailed_checkins
+        else:
+            already_sent = (participant.id, job.mail_type) in sent
+        if already_sent:
+            _finish_job(job.id, worker_id, status="sent")
+            skipped += 1
+            continue
+        item = {
+            "job_id": job.id,
+            "attempts": job.attempts,
+            "participant_id": participant.id,
+            "email": participant.email,
+            "mail_type": job.mail_type,
+            "attachment_path": attachment_path if job.mail_type == "final_reminder" else None,
+        }
+        try:
+            item["subject"], item["body"] = _build_message(participant, job.mail_type)
+        except Exception as e:
+            # 文面が作れない場合は送信失敗と同じく再試行に回す
+            item["error"] = e
+        items.append(item)
+    return items, skipped
+
+
+def _mark_attendance_mail_sent(participant_id: int) -> None:
+    """出席登録の確認メールを送ったら、その参加者の未送信の出席記録を送信済みにする（commit は呼び出し側）"""
+    (AttendanceRecord.query
+     .filter_by(participant_id=participant_id, status="checked_in", email_sent=False)
+     .update({AttendanceRecord.email_sent: True, AttendanceRecord.email_sent_at: datetime.utcnow()},
+             synchronize_session=False))
+
+
+def _record_result(item: dict, error, worker_id: str) -> str:
+    """
+    送信結果を MailLog とジョブに反映する（commit は呼び出し側でまとめて行う）。
+    Returns: "sent" / "retry" / "failed"
+    """
+    label = MAIL_TYPE_LABELS[item["mail_type"]]
+    job_id, attempts, email = item["job_id"], item["attempts"], item["email"]
+    log = MailLog(participant_id=item["participant_id"], mail_type=item["mail_type"],
+                  sent_at=datetime.utcnow())
+    if error is None:
+        log.status = item["status"]
+        db.session.add(log)
+        if log.status == "sent":
+            logger.info(f"{label}送信成功: {email}")
+        if item["mail_type"] == "attendance_checkin":
+            _mark_attendance_mail_sent(item["participant_id"])
+        _finish_job(job_id, worker_id, status="sent", last_error="")
+        return "sent"
+
+    log.status = "failed"
+    log.error_message = str(error)
+    db.session.add(log)
+    logger.error(f"{label}送信失敗: {email} - {error}", exc_info=error)
+    if attempts >= MAX_ATTEMPTS:
+        _finish_job(job_id, worker_id, status="failed", last_error=str(error))
+        logger.error(f"送信キュー: 再試行上限に達しました job={job_id} {email} - {error}")
+        return "failed"
+    delay = _retry_delay(attempts)
+    _finish_job(job_id, worker_id, status="pending", last_error=str(error),
+                run_after=datetime.utcnow() + timedelta(seconds=delay))
+    logger.warning(f"送信キュー: {delay}秒後に再試行します job={job_id} {email} - {error}")
+    return "retry"
+
+
+class TokenBucket:
+    """
+    送信レートの制限（トークンバケット）。複数スレッドから acquire してよい。
+    rate 通/秒で補充し、最大 capacity 通まで続けて送れる。rate が 0 以下なら制限しない。
+    capacity を超える通数（brevo のまとめ送信）は、たまった分で送ってから不足分を後の acquire で待つ。
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count: int = 1) -> None:
+        """count 通分のトークンを取る（たまるまで待つ）"""
+        if self.rate <= 0:
+            return
+        need = min(count, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= need:
+                    self._tokens -= count
+                    return
+                wait_seconds = (need - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+def _dispatch_in_thread(app, bucket: TokenBucket, mail_cfg: dict, group: list) -> list:
+    """送信スレッドでメールを送る（DBには触らない）。Returns: group と同じ順の結果"""
+    from services.mail_service import dispatch_batch
+
+    # brevo のまとめ送信も1リクエストではなく宛先の数で数える（送信レートはメールの通数）
+    bucket.acquire(len(group))
+    with app.app_context():
+        return dispatch_batch([(item["email"], item["subject"], item["body"]) for item in group],
+                              mail_cfg, attachment_path=group[0]["attachment_path"])
+
+
+def _dispatch_groups(items: list, mail_cfg: dict) -> list:
+    """
+    送信単位に分ける。brevo モードでは同じ種別・同じ添付のメールを1リクエストにまとめ、
+    それ以外は1通ずつ送る。
+    """
+    from services.mail_service import BREVO_MAX_VERSIONS
+
+    if mail_cfg["mode"] != "brevo":
+        return [[item] for item in items]
+    grouped = {}
+    for item in items:
+        grouped.setdefault((item["mail_type"], item["attachment_path"]), []).append(item)
+    return [group[i:i + BREVO_MAX_VERSIONS]
+            for group in grouped.values()
+            for i in range(0, len(group), BREVO_MAX_VERSIONS)]
+
+
+def drain_queue(worker_id: str = None, max_jobs: int = None) -> dict:
+    """
+    送信可能なジョブがなくなるか、1日の送信上限に達するまで送信する
+    （上限に達した後も UNLIMITED_MAIL_TYPES のジョブは送る）。
+    ジョブは SEND_BATCH_SIZE 件ずつ確保し、送信は最大 mail_send_concurrency 本のスレッドで
+    mail_send_rate 通/秒を超えないように並行して行う（brevo モードでは同じ種別のメールを
+    1リクエストにまとめ、送信レートは宛先の数で数える）。MailLog・ジョブの更新は確保したバッチごとに1回 commit する。
+    送信の完了を待つ間は、結果を反映していないジョブのリースを LEASE_RENEW_SECONDS ごとに延長する。
+    Returns: {"sent", "skipped", "retry", "failed", "limit_reached"}
+    """
+    from services.mail_service import (get_remaining_today, get_send_rate, get_send_concurrency,
+                                       _get_mail_config, bind_thread_smtp_session, BREVO_MAX_VERSIONS)
+
+    worker_id = worker_id or _worker_id()
+    counts = {"sent": 0, "skipped": 0, "retry": 0, "failed": 0, "limit_reached": False}
+    processed = 0
+    app = current_app._get_current_object()
+
+    # 設定はバッチの間1回だけ読み込む
+    with settings_scope():
+        remaining = get_remaining_today()
+        concurrency = get_send_concurrency()
+        bucket = TokenBucket(get_send_rate())
+        mail_cfg = _get_mail_config()
+        # brevo は1リクエストにまとめて送れるので、一度に多めに確保する
+        batch_size = BREVO_MAX_VERSIONS if mail_cfg["mode"] == "brevo" else max(SEND_BATCH_SIZE, concurrency)
+        # SMTP の場合は送信スレッドごとにログイン済みの接続を使い回す
+        smtp_sessions = []
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="mail-send",
+                                  initializer=bind_thread_smtp_session, initargs=(smtp_sessions,))
+        try:
+            while max_jobs is None or processed < max_jobs:
+                mail_types = None
+                if remaining <= 0:
+                    # 上限に達したら UNLIMITED_MAIL_TYPES のジョブだけ送る
+                    counts["limit_reached"] = True
+                    mail_types = UNLIMITED_MAIL_TYPES
+                limit = batch_size if mail_types else min(batch_size, remaining)
+                if max_jobs is not None:
+                    limit = min(limit, max_jobs - processed)
+                jobs = claim_jobs(worker_id, limit, mail_types)
+                if not jobs:
+                    break
+                processed += len(jobs)
+
+                items, skipped = _prepare_batch(jobs, worker_id)
+                counts["skipped"] += skipped
+                for item in items:
+                    if "error" in item:
+                        counts[_record_result(item, item["error"], worker_id)] += 1
+                # 送信を待つ間は書き込みのトランザクションを開いたままにしない
+                # （SQLite では DB 全体がロックされ、会場の出席登録などの書き込みが待たされるため）
+                db.session.commit()
+                groups = _dispatch_groups([item for item in items if "error" not in item], mail_cfg)
+                futures = [(group, pool.submit(_dispatch_in_thread, app, bucket, mail_cfg, group))
+                           for group in groups]
+                # バッチ全体の送信が終わってから結果をまとめて1回で commit する
+                # （待つ間は書き込みのトランザクションを開かず、1通ごとの commit もしない）
+                _wait_renewing_leases([future for _, future in futures],
+                                      [item["job_id"] for group in groups for item in group], worker_id)
+                for group, future in futures:
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = [e] * len(group)
+                    for item, result in zip(group, results):
+                        error = result if isinstance(result, Exception) else None
+                        if error is None:
+                            item["status"] = result
+                        outcome = _record_result(item, error, worker_id)
+                        counts[outcome] += 1
+                        if outcome == "sent":
+                            remaining -= 1
+                db.session.commit()
+        finally:
+            pool.shutdown(wait=True)
+            for session in smtp_sessions:
+                session.close()
+
+    if processed:
+        logger.info(
+            f"送信キュー処理: 成功{counts['sent']}件 / 再試行待ち{counts['retry']}件 / "
+            f"失敗{counts['failed']}件 / スキップ{counts['skipped']}件"
+        )
+    return counts
+
+
+def next_wakeup(mail_types=None):
+    """
+    次に送信可能になるジョブの日時（送信待ちの run_after・送信中のリース期限の最小）。なければ None
+    mail_types を渡したらその種別のジョブだけを見る。
+    """
+    def _min(column, status):
+        query = db.session.query(db.func.min(column)).filter(MailJob.status == status)
+        if mail_types is not None:
+            query = query.filter(MailJob.mail_type.in_(mail_types))
+        return query.scalar()
+
+    pending = _min(MailJob.run_after, "pending")
+    running = _min(MailJob.locked_until, "running")
+    times = [t for t in (pending, running) if t is not None]
+    return min(times) if times else None
+
+
+# -----------------------------------------------
+# ワーカー
+# -----------------------------------------------
+_worker_lock = threading.Lock()
+_worker_thread = None
+
+
+def _background_loop(app) -> None:
+    global _worker_thread
+    with app.app_context():
+        worker_id = _worker_id()
+        while True:
+            limit_reached = False
+            try:
+                limit_reached = drain_queue(worker_id)["limit_reached"]
+                with _worker_lock:
+                    # 終了判定と start_background_worker を排他にし、直前に登録されたジョブを取りこぼさない
+                    wakeup = next_wakeup(UNLIMITED_MAIL_TYPES) if limit_reached else next_wakeup()
+                    if wakeup is None:
+                        _worker_thread = None
+                        return
+            except Exception as e:
+                logger.error(f"送信キューワーカーでエラー: {e}", exc_info=True)
+                db.session.rollback()
+                wakeup = datetime.utcnow() + timedelta(seconds=IDLE_POLL_SECONDS)
+            finally:
+                db.session.remove()
+            idle = (wakeup - datetime.utcnow()).total_seconds()
+            time.sleep(min(max(idle, 1), IDLE_POLL_SECONDS))
+
+
+def start_background_worker(app) -> bool:
+    """プロセス内の送信スレッドを起動する（起動済みなら何もしない）。起動したら True"""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return False
+        _worker_thread = threading.Thread(target=_background_loop, args=(app,), daemon=True,
+                                          name="mail-queue-worker")
+        _worker_thread.start()
+        return True
+
+
+def run_worker(poll_interval: int = 5, once: bool = False) -> None:
+    """常駐ワーカー（flask --app app mail-worker から呼ぶ）。app_context 内で実行すること"""
+    worker_id = _worker_id()
+    logger.info(f"送信キューワーカー開始: {worker_id}")
+    while True:
+        result = drain_queue(worker_id)
+        db.session.remove()
+        if once:
+            return
+        time.sleep(IDLE_POLL_SECONDS if result["limit_reached"] else poll_interval)
@@ -6,11 +6,19 @@ MAIL_MODE=smtp    の場合: SMTPで実際に送信する
 MAIL_MODE=gas     の場合: GAS Webhookで送信する
 MAIL_MODE=brevo   の場合: Brevo Transactional Email APIで送信する
 """
+import base64
 import json
 import os
+import re
+import select
+import stat
 import smtplib
 import logging
+import threading
+import http.client
+import urllib.parse
 import urllib.request
+from functools import lru_cache
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
@@ -18,7 +26,8 @@ from email import encoders
 from datetime import datetime, date
 from flask import current_app
 from extensions import db
-from models import MailLog, AppSetting
+from models import MailLog
+from services.settings_service import get_setting
 
 logger = logging.getLogger(__name__)
 
@@ -656,35 +665,58 @@ def _format_deadline_jp(deadline: str) -> str:
         return deadline
 
 
+# テンプレートの {変数} （値のない変数はそのまま残す）
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+# 期限未設定時に残る空パターンの除去（いずれも "23:59" を含む場合だけ対象になる）
+_DEADLINE_CLEANUP_RULES = (
+    (re.compile(r'【\s*23:59締切】'), ''),
+    (re.compile(r'【\s*23:59 JST までに】'), ''),
+    (re.compile(r'※回答期限（\s*23:59）まで[^\n]*\n'), ''),
+    (re.compile(r'※ご回答期限（\s*23:59）まで[^\n]*\n'), ''),
+    (re.compile(r'※やむを得ず[^\n]*23:59まで[^\n]*ご連絡ください。\n'),
+     lambda m: m.group() if '/' in m.group() else ''),
+)
+_TRAILING_SPACES_RE = re.compile(r' +\n')
+
+
+@lru_cache(maxsize=256)
+def _compile_template(template: str) -> tuple:
+    """
+    テンプレート文字列を (先頭の固定文字列, ((変数名, 直後の固定文字列), ...)) に分解する。
+    同じ文面は何度も使われるので、テンプレート文字列をキーにキャッシュする。
+    """
+    parts = _PLACEHOLDER_RE.split(template)
+    return parts[0], tuple(zip(parts[1::2], parts[2::2]))
+
+
 def _render_template(template: str, **kwargs) -> str:
     """テンプレート文字列の {変数} を置換し、空になったブラケットを除去する"""
-    import re
-    for key, val in kwargs.items():
-        template = template.replace("{" + key + "}", str(val))
+    head, segments = _compile_template(template)
+    out = [head]
+    for name, literal in segments:
+        out.append(str(kwargs[name]) if name in kwargs else "{" + name + "}")
+        out.append(literal)
+    text = "".join(out)
     # 期限未設定時に残る空パターンを除去
-    template = re.sub(r'【\s*23:59締切】', '', template)
-    template = re.sub(r'【\s*23:59 JST までに】', '', template)
-    template = re.sub(r'※回答期限（\s*23:59）まで[^\n]*\n', '', template)
-    template = re.sub(r'※ご回答期限（\s*23:59）まで[^\n]*\n', '', template)
-    template = re.sub(r'※やむを得ず[^\n]*23:59まで[^\n]*ご連絡ください。\n', lambda m: m.group() if '/' in m.group() else '', template)
+    if "23:59" in text:
+        for pattern, repl in _DEADLINE_CLEANUP_RULES:
+            text = pattern.sub(repl, text)
     # 署名末尾スペース除去
-    template = re.sub(r' +\n', '\n', template)
-    template = template.rstrip() + '\n' if template.strip() else template
-    return template
+    if " \n" in text:
+        text = _TRAILING_SPACES_RE.sub("\n", text)
+    return text.rstrip() + '\n' if text.strip() else text
 
 
 def _get_template(key: str, fallback: str) -> str:
     """DBからテンプレートを取得。なければfallbackを返す"""
-    s = AppSetting.query.filter_by(key=key).first()
-    return s.value if (s and s.value) else fallback
+    return get_setting(key, fallback)
 
 
 def _get_reunion_info() -> dict:
     """DBから同窓会情報を取得。なければcurrent_app.configから取得"""
     cfg = current_app.config
-    def get(key, fallback):
-        s = AppSetting.query.filter_by(key=key).first()
-        return s.value if (s and s.value) else fallback
+    get = get_setting
     info = {
         "reunion_name":     get("reunion_name",     cfg.get("REUNION_NAME", "同窓会")),
         "reunion_date":     get("reunion_date",     cfg.get("REUNION_DATE", "")),
@@ -796,6 +828,164 @@ def _send_gas(to_email: str, subject: str, body: str, from_name: str) -> None:
             raise RuntimeError(f"GAS送信エラー: {result.get('error')}")
 
 
+SMTP_TIMEOUT_SECONDS = 30
+SMTP_MAX_MESSAGES_PER_CONNECTION = 50   # 1接続で送る上限（超えたら接続し直す）
+
+_smtp_local = threading.local()
+
+
+def _smtp_connect(cfg: dict) -> smtplib.SMTP:
+    """SMTPサーバーに接続して STARTTLS・ログインまで済ませる"""
+    server = smtplib.SMTP(cfg["smtp_host"], cfg["smtp_port"], timeout=SMTP_TIMEOUT_SECONDS)
+    try:
+        server.ehlo()
+        server.starttls()
+        server.ehlo()
+        server.login(cfg["smtp_user"], cfg["smtp_password"])
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+class SMTPSession:
+    """
+    一括送信の間、ログイン済みのSMTP接続を使い回す。
+    切断されていたら接続し直して1回だけ再送し、max_messages 通ごとに接続を入れ替える。
+    """
+
+    def __init__(self, max_messages: int = SMTP_MAX_MESSAGES_PER_CONNECTION):
+        self.max_messages = max_messages
+        self.connections = 0     # 接続した回数
+        self._server = None
+        self._key = None
+        self._count = 0
+
+    def send(self, cfg: dict, to_email: str, message: str) -> None:
+        key = (cfg["smtp_host"], cfg["smtp_port"], cfg["smtp_user"], cfg["smtp_password"])
+        if self._server is None or self._key != key or self._count >= self.max_messages:
+            self._reconnect(cfg, key)
+        try:
+            self._server.sendmail(cfg["from_addr"], [to_email], message)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+            # 421 はサーバー側からの切断予告。それ以外の応答エラーはそのまま返す
+            if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code != 421:
+                raise
+            logger.info(f"SMTP接続が切れたため再接続します: {e}")
+            self._reconnect(cfg, key)
+            self._server.sendmail(cfg["from_addr"], [to_email], message)
+        self._count += 1
+
+    def _reconnect(self, cfg: dict, key: tuple) -> None:
+        self.close()
+        self._server = _smtp_connect(cfg)
+        self._key = key
+        self._count = 0
+        self.connections += 1
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+
+
+def bind_thread_smtp_session(registry: list) -> None:
+    """
+    このスレッドの SMTP 送信で接続を使い回すようにする（ThreadPoolExecutor の initializer 用）。
+    作ったセッションは registry に追加するので、スレッドプールの終了後に close すること。
+    """
+    session = SMTPSession()
+    _smtp_local.session = session
+    registry.append(session)
+
+
+def _smtp_deliver(cfg: dict, to_email: str, message: str) -> None:
+    """SMTPで1通送る（bind_thread_smtp_session 済みのスレッドなら接続を使い回し、それ以外は1通ごとに接続する）"""
+    session = getattr(_smtp_local, "session", None)
+    if session is not None:
+        session.send(cfg, to_email, message)
+        return
+    server = _smtp_connect(cfg)
+    try:
+        server.sendmail(cfg["from_addr"], [to_email], message)
+    finally:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+
+# 添付ファイルのキャッシュ {path: {"key", "filename", "raw", "base64", "mime_part", "mime_text"}}
+# 一括送信では同じ案内PDFを全員に添付するため、読み込み・エンコードは1回だけにする
+_attachment_cache = {}
+_attachment_lock = threading.Lock()
+
+
+def get_attachment(path: str):
+    """
+    添付ファイルを読み込み、Brevo 用の base64 と SMTP 用の MIME パートを作って返す。
+    パス・更新日時・サイズが変わらない間はキャッシュを使う。ファイルがなければ None。
+    """
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    with _attachment_lock:
+        cached = _attachment_cache.get(path)
+        if cached and cached["key"] == key:
+            return cached
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    filename = os.path.basename(path)
+    mime_part = MIMEBase("application", "octet-stream")
+    mime_part.set_payload(raw)
+    encoders.encode_base64(mime_part)
+    mime_part.add_header("Content-Disposition", "attachment", filename=filename)
+    attachment = {
+        "key": key,
+        "filename": filename,
+        "raw": raw,
+        "base64": base64.b64encode(raw).decode("utf-8"),
+        "mime_part": mime_part,
+        "mime_text": mime_part.as_string(),
+    }
+    with _attachment_lock:
+        _attachment_cache[path] = attachment
+    return attachment
+
+
+def _as_string_with_attachment(msg: MIMEMultipart, attachment) -> str:
+    """
+    multipart/mixed の msg の末尾に添付を加えた文字列を返す。
+    添付部分は毎回シリアライズせず、キャッシュ済みの文字列（mime_text）を差し込む。
+    """
+    text = msg.as_string()
+    if not attachment:
+        return text
+    closing = f"\n--{msg.get_boundary()}--"
+    i = text.rindex(closing)
+    return f"{text[:i]}\n--{msg.get_boundary()}\n{attachment['mime_text']}{text[i:]}"
+
+
+def invalidate_attachment(path: str = None) -> None:
+    """添付ファイルのキャッシュを捨てる（path 省略時はすべて）"""
+    with _attachment_lock:
+        if path is None:
+            _attachment_cache.clear()
+        else:
+            _attachment_cache.pop(path, None)
+
+
 def _send_smtp_cfg(to_email: str, subject: str, body: str, cfg: dict, attachment_path: str = None) -> None:
     """SMTPでメールを送信する"""
     msg = MIMEMultipart("mixed")
@@ -809,20 +999,7 @@ def _send_smtp_cfg(to_email: str, subject: str, body: str, cfg: dict, attachment
     alt.attach(MIMEText(_text_to_html(body), "html", "utf-8"))
     msg.attach(alt)
 
-    if attachment_path and os.path.isfile(attachment_path):
-        with open(attachment_path, "rb") as f:
-            attach = MIMEBase("application", "octet-stream")
-            attach.set_payload(f.read())
-        encoders.encode_base64(attach)
-        filename = os.path.basename(attachment_path)
-        attach.add_header("Content-Disposition", "attachment", filename=filename)
-        msg.attach(attach)
-
-    with smtplib.SMTP(cfg["smtp_host"], cfg["smtp_port"]) as server:
-        server.ehlo()
-        server.starttls()
-        server.login(cfg["smtp_user"], cfg["smtp_password"])
-        server.sendmail(cfg["from_addr"], [to_email], msg.as_string())
+    _smtp_deliver(cfg, to_email, _as_string_with_attachment(msg, get_attachment(attachment_path)))
 
 
 def _send_smtp_text(to_email: str, subject: str, body: str, cfg: dict, attachment_path: str = None) -> None:
@@ -833,52 +1010,151 @@ def _send_smtp_text(to_email: str, subject: str, body: str, cfg: dict, attachmen
     msg["To"] = to_email
     msg["Reply-To"] = cfg["from_addr"]
     msg.attach(MIMEText(body, "plain", "utf-8"))
-    if attachment_path and os.path.isfile(attachment_path):
-        with open(attachment_path, "rb") as f:
-            attach = MIMEBase("application", "octet-stream")
-            attach.set_payload(f.read())
-        encoders.encode_base64(attach)
-        attach.add_header("Content-Disposition", "attachment", filename=os.path.basename(attachment_path))
-        msg.attach(attach)
-    with smtplib.SMTP(cfg["smtp_host"], cfg["smtp_port"]) as server:
-        server.ehlo(); server.starttls()
-        server.login(cfg["smtp_user"], cfg["smtp_password"])
-        server.sendmail(cfg["from_addr"], [to_email], msg.as_string())
+    _smtp_deliver(cfg, to_email, _as_string_with_attachment(msg, get_attachment(attachment_path)))
 
 
-def _send_brevo(to_email: str, subject: str, body: str, cfg: dict, attachment_path: str = None) -> None:
-    """Brevo Transactional Email APIでメールを送信する（テキスト形式）"""
-    import base64
+BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
+BREVO_MAX_VERSIONS = 100   # messageVersions で1リクエストにまとめる宛先数の上限
+
+_brevo_local = threading.local()
+
+
+def _connection_dropped(conn) -> bool:
+    """
+    keep-alive 中の接続がサーバー側で閉じられていれば True。
+    応答を待っていない接続が読み込み可能なら、切断（EOF）か不正なデータなので使い回さない
+    """
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class BrevoClient:
+    """Brevo Transactional Email API のクライアント（HTTP接続を keep-alive で使い回す）"""
+
+    def __init__(self, url: str = BREVO_API_URL):
+        self.url = url
+        parts = urllib.parse.urlsplit(url)
+        self._conn_class = (http.client.HTTPSConnection if parts.scheme == "https"
+                            else http.client.HTTPConnection)
+        self._host = parts.netloc
+        self._path = parts.path
+        self._conn = None
+        self.connections = 0     # 接続した回数
+
+    def post(self, api_key: str, data: dict) -> dict:
+        payload = json.dumps(data).encode("utf-8")
+        headers = {
+            "Content-Type":  "application/json",
+            "Accept":        "application/json",
+            "api-key":       api_key,
+        }
+        if self._conn is not None and _connection_dropped(self._conn):
+            # 待機中にサーバー側で閉じられた keep-alive 接続は使わない
+            self.close()
+        reused = self._conn is not None
+        if not reused:
+            self._connect()
+        try:
+            self._conn.request("POST", self._path, body=payload, headers=headers)
+        except (ConnectionResetError, BrokenPipeError):
+            self.close()
+            if not reused:
+                raise
+            # 使い回した接続が閉じられていてリクエストを書き込めなかった（サーバーには届いていない）ので、
+            # 繋ぎ直して1回だけ送り直す
+            self._connect()
+            try:
+                self._conn.request("POST", self._path, body=payload, headers=headers)
+            except Exception:
+                self.close()
+                raise
+        except Exception:
+            self.close()
+            raise
+        try:
+            res = self._conn.getresponse()
+            body = res.read()
+        except Exception:
+            # リクエストは書き込み済みで、Brevo が受け付けている可能性がある。
+            # 送り直すと最大 BREVO_MAX_VERSIONS 人に二重送信になるので、送信キューの再試行に任せる
+            self.close()
+            raise
+        if res.will_close:
+            self.close()
+        if res.status not in (200, 201, 202):
+            raise RuntimeError(f"Brevo APIエラー: HTTP {res.status} {body[:200].decode('utf-8', 'replace')}")
+        return json.loads(body) if body else {}
+
+    def _connect(self) -> None:
+        self._conn = self._conn_class(self._host, timeout=30)
+        self.connections += 1
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _brevo_client() -> BrevoClient:
+    """このスレッドの BrevoClient（BREVO_API_URL が変わったら作り直す）"""
+    client = getattr(_brevo_local, "client", None)
+    if client is None or client.url != BREVO_API_URL:
+        if client is not None:
+            client.close()
+        client = BrevoClient(BREVO_API_URL)
+        _brevo_local.client = client
+    return client
+
+
+def _brevo_request(cfg: dict, attachment_path: str = None) -> tuple:
+    """(APIキー, 送信元・添付など全宛先共通のリクエスト) を返す"""
     api_key = cfg.get("brevo_api_key", "") or os.environ.get("BREVO_API_KEY", "") or current_app.config.get("BREVO_API_KEY", "")
     if not api_key:
         raise ValueError("BREVO_API_KEY が設定されていません")
 
     data = {
         "sender":      {"name": cfg["from_name"], "email": cfg["from_addr"]},
-        "to":          [{"email": to_email}],
         "replyTo":     {"email": cfg["from_addr"]},
-        "subject":     subject,
-        "textContent": body,
     }
-    if attachment_path and os.path.isfile(attachment_path):
-        with open(attachment_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode("utf-8")
-        data["attachment"] = [{"content": encoded, "name": os.path.basename(attachment_path)}]
-    payload = json.dumps(data).encode("utf-8")
+    attachment = get_attachment(attachment_path)
+    if attachment:
+        data["attachment"] = [{"content": attachment["base64"], "name": attachment["filename"]}]
+    return api_key, data
 
-    req = urllib.request.Request(
-        "https://api.brevo.com/v3/smtp/email",
-        data=payload,
-        headers={
-            "Content-Type":  "application/json",
-            "Accept":        "application/json",
-            "api-key":       api_key,
-        },
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=30) as res:
-        if res.status not in (200, 201):
-            raise RuntimeError(f"Brevo APIエラー: HTTP {res.status}")
+
+def _send_brevo(to_email: str, subject: str, body: str, cfg: dict, attachment_path: str = None) -> None:
+    """Brevo Transactional Email APIでメールを送信する（テキスト形式）"""
+    api_key, data = _brevo_request(cfg, attachment_path)
+    data.update({
+        "to":          [{"email": to_email}],
+        "subject":     subject,
+        "textContent": body,
+    })
+    _brevo_client().post(api_key, data)
+
+
+def _send_brevo_batch(messages: list, cfg: dict, attachment_path: str = None) -> list:
+    """
+    複数の宛先を messageVersions で1リクエストにまとめて送る（件名・本文は宛先ごと）。
+    messages: [(to_email, subject, body), ...]（BREVO_MAX_VERSIONS 件まで）
+    Returns: Brevo の messageId のリスト
+    """
+    api_key, data = _brevo_request(cfg, attachment_path)
+    data.update({
+        # 既定の件名・本文（各 version で上書きする）
+        "subject":     messages[0][1],
+        "textContent": messages[0][2],
+        "messageVersions": [
+            {"to": [{"email": to_email}], "subject": subject, "textContent": body}
+            for to_email, subject, body in messages
+        ],
+    })
+    return _brevo_client().post(api_key, data).get("messageIds", [])
 
 
 def _send_console(to_email: str, subject: str, body: str) -> None:
@@ -895,10 +1171,7 @@ def _send_console(to_email: str, subject: str, body: str) -> None:
 
 def _get_mail_config():
     """DB設定を優先、なければ .env（current_app.config）を使う。"""
-    def get(key, fallback):
-        s = AppSetting.query.filter_by(key=key).first()
-        return s.value if (s and s.value) else fallback
-
+    get = get_setting
     cfg = current_app.config
     return {
         "mode":          get("mail_mode",          cfg.get("MAIL_MODE", "console")),
@@ -912,11 +1185,17 @@ def _get_mail_config():
     }
 
 
-def _dispatch_send(to_email: str, subject: str, body: str, mail_cfg: dict, attachment_path: str = None) -> str:
-    """モードに応じてメール送信し、ステータス文字列を返す（テキスト形式固定）"""
+def _with_contact(body: str, mail_cfg: dict) -> str:
+    """本文末尾に送信元アドレスを添える"""
     from_addr = mail_cfg.get("from_addr", "")
     if from_addr:
         body = body.rstrip("\n") + f"\nE-mail: {from_addr}\n"
+    return body
+
+
+def _dispatch_send(to_email: str, subject: str, body: str, mail_cfg: dict, attachment_path: str = None) -> str:
+    """モードに応じてメール送信し、ステータス文字列を返す（テキスト形式固定）"""
+    body = _with_contact(body, mail_cfg)
     mode = mail_cfg["mode"]
     if mode == "gas":
         _send_gas(to_email, subject, body, mail_cfg["from_name"])
@@ -934,6 +1213,36 @@ def _dispatch_send(to_email: str, subject: str, body: str, mail_cfg: dict, attac
         return "simulated"
 
 
+def dispatch_batch(messages: list, mail_cfg: dict, attachment_path: str = None) -> list:
+    """
+    同じ種類・同じ添付のメールをまとめて送る。
+    brevo モードでは BREVO_MAX_VERSIONS 通ずつ1リクエスト（messageVersions）にし、
+    それ以外のモードでは1通ずつ _dispatch_send で送る。
+    messages: [(to_email, subject, body), ...]
+    Returns: messages と同じ順の結果（ステータス文字列、または送信時の例外）
+    """
+    if mail_cfg["mode"] != "brevo":
+        results = []
+        for to_email, subject, body in messages:
+            try:
+                results.append(_dispatch_send(to_email, subject, body, mail_cfg, attachment_path=attachment_path))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    results = []
+    for i in range(0, len(messages), BREVO_MAX_VERSIONS):
+        chunk = [(to_email, subject, _with_contact(body, mail_cfg))
+                 for to_email, subject, body in messages[i:i + BREVO_MAX_VERSIONS]]
+        try:
+            _send_brevo_batch(chunk, mail_cfg, attachment_path=attachment_path)
+            results.extend(["sent"] * len(chunk))
+        except Exception as e:
+            # リクエスト単位で受け付けられるので、失敗したらその全宛先を失敗扱いにする
+            results.extend([e] * len(chunk))
+    return results
+
+
 def send_final_url(participant, final_url: str) -> MailLog:
     """参加者に本出欠URLを送信する。"""
     mail_cfg = _get_mail_config()
@@ -1262,15 +1571,37 @@ def send_final_reminder(participant, attachment_path: str = None) -> MailLog:
 
 def get_daily_send_limit() -> int:
     """1日のメール送信制限数を取得する"""
-    s = AppSetting.query.filter_by(key="mail_daily_limit").first()
-    if s and s.value:
+    value = get_setting("mail_daily_limit")
+    if value:
         try:
-            return int(s.value)
+            return int(value)
         except ValueError:
             pass
     return 100  # デフォルト100件/日
 
 
+def get_send_rate() -> float:
+    """一括送信の送信レート（通/秒）を取得する。0 なら制限なし"""
+    value = get_setting("mail_send_rate")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    return 2.0  # デフォルト2通/秒（従来の0.5秒間隔）
+
+
+def get_send_concurrency() -> int:
+    """一括送信の同時送信数を取得する（1〜10）"""
+    value = get_setting("mail_send_concurrency")
+    if value:
+        try:
+            return min(max(int(value), 1), 10)
+        except ValueError:
+            pass
+    return 4
+
+
 def get_today_sent_count() -> int:
     """今日送信済みのメール件数を取得する（JST基準）"""
     from datetime import timezone, timedelta
@@ -1325,39 +1656,19 @@ def send_cancel_confirmation(participant, cancel_reason: str) -> MailLog:
     return log
 
 
-def send_attendance_confirmation(participant) -> MailLog:
-    """会場QR出席登録完了メールを送信する。"""
-    mail_cfg = _get_mail_config()
+def _build_attendance_confirmation_body(participant_name: str, checked_in_at=None) -> tuple:
+    """会場QR出席登録完了メールの件名・本文を生成する"""
     reunion = _get_reunion_info()
+    checked_in_at = checked_in_at or datetime.utcnow()
     subject = f"【{reunion['reunion_name']}】会場出席登録を受け付けました"
     body = (
-        f"{participant.display_name} 様\n\n"
+        f"{participant_name} 様\n\n"
         f"{reunion['reunion_name']}の会場出席登録を受け付けました。\n"
-        f"登録日時: {datetime.utcnow().strftime('%Y/%m/%d %H:%M')}\n\n"
+        f"登録日時: {checked_in_at.strftime('%Y/%m/%d %H:%M')}\n\n"
         f"会場: {reunion['reunion_venue']}\n"
         f"ご来場ありがとうございます。\n"
     )
-
-    log = MailLog(
-        participant_id=participant.id,
-        mail_type="attendance_checkin",
-        sent_at=datetime.utcnow(),
-    )
-
-    try:
-        log.status = _dispatch_send(participant.email, subject, body, mail_cfg)
-        if log.status == "sent":
-            logger.info(f"会場出席登録確認メール送信成功: {participant.email}")
-        db.session.add(log)
-        db.session.commit()
-    except Exception as e:
-        log.status = "failed"
-        log.error_message = str(e)
-        db.session.add(log)
-        db.session.commit()
-        logger.error(f"会場出席登録確認メール送信失敗: {participant.email} - {e}", exc_info=True)
-
-    return log
+    return subject, body
 
 
 def send_unlock_notice(participant, final_url: str, deadline_str: str) -> MailLog:
@@ -4,6 +4,7 @@ services/matching_service.py - 銀行CSV照合サービス
 import re
 import unicodedata
 import logging
+from sqlalchemy.orm import selectinload
 from models import BankImport, Participant, Payment
 from extensions import db
 
@@ -35,8 +36,11 @@ def _normalize_name(name: str) -> str:
 
 
 def _similarity_score(a: str, b: str) -> float:
-    a_norm = _normalize_name(a)
-    b_norm = _normalize_name(b)
+    return _normalized_similarity(_normalize_name(a), _normalize_name(b))
+
+
+def _normalized_similarity(a_norm: str, b_norm: str) -> float:
+    """正規化済みの2つの名義の類似度（_similarity_score の本体）"""
     if not a_norm or not b_norm:
         return 0.0
     if a_norm == b_norm:
@@ -72,39 +76,115 @@ def _alt_transfer_name(participant) -> str:
     return kana or participant.name or ""
 
 
+def _candidate_names(participant) -> list:
+    """照合候補名を集める（本出欠の振込名義 + 名簿から生成した名義）"""
+    candidate_names = []
+    final = participant.latest_final
+    if final and final.transfer_name:
+        candidate_names.append(final.transfer_name)
+    expected = _expected_transfer_name(participant)
+    if expected:
+        candidate_names.append(expected)
+    # 旧カナでも照合（旧姓で振込む場合に対応）
+    alt = _alt_transfer_name(participant)
+    if alt and alt != expected:
+        candidate_names.append(alt)
+    # カナ氏名単体でも照合（新旧両方）
+    if participant.name_kana:
+        candidate_names.append(participant.name_kana)
+    return candidate_names
+
+
+class _MatchingIndex:
+    """
+    照合候補名のインメモリ索引
+
+    参加者ごとの候補名を一度だけ正規化し、
+      - 完全一致: 正規化名 → 参加者 のハッシュ引き
+      - 部分一致・文字一致: 文字 → 正規化名 の転置索引
+    で比較対象を絞り込む。スコアは _similarity_score と同じ式で計算し、
+    同点の場合は参加者一覧で先に現れる人を優先する（総当たり版と同じ結果）。
+    """
+
+    def __init__(self, participants: list):
+        self.participants = participants
+        self._names = []     # 正規化名の一覧
+        self._positions = [] # 正規化名ごとの最小の参加者インデックス
+        self._exact = {}     # 正規化名 → self._names のインデックス
+        self._postings = {}  # 文字 → その文字を含む正規化名インデックスのリスト
+
+        for pos, participant in enumerate(participants):
+            for name in _candidate_names(participant):
+                norm = _normalize_name(name)
+                if not norm or norm in self._exact:
+                    continue
+                name_id = len(self._names)
+                self._exact[norm] = name_id
+                self._names.append(norm)
+                self._positions.append(pos)
+                for c in set(norm):
+                    self._postings.setdefault(c, []).append(name_id)
+
+    def best_match(self, raw_name: str, threshold: float = 0.0) -> tuple:
+        """
+        振込名義に最も近い参加者を返す。
+
+        Returns:
+            (Participant, score): threshold 以上で最も高いスコアの参加者。
+                                  該当なしの場合は (None, 0.0)。
+        """
+        a_norm = _normalize_name(raw_name)
+        if not a_norm:
+            return None, 0.0
+        a_len = len(a_norm)
+
+        # 完全一致はハッシュで即決（ただし先に並ぶ参加者の同点候補は下で確認する）
+        best_score, best_pos = 0.0, len(self.participants)
+        exact_id = self._exact.get(a_norm)
+        if exact_id is not None:
+            best_score, best_pos = 1.0, self._positions[exact_id]
+
+        # 共通文字数（a_norm 側の出現回数で数える）を転置索引で集計
+        char_counts = {}
+        for c in a_norm:
+            char_counts[c] = char_counts.get(c, 0) + 1
+        common = {}
+        for c, count in char_counts.items():
+            for name_id in self._postings.get(c, ()):
+                common[name_id] = common.get(name_id, 0) + count
+
+        for name_id, shared in common.items():
+            pos = self._positions[name_id]
+            if best_score == 1.0 and pos >= best_pos:
+                continue
+            b_len = len(self._names[name_id])
+            longer = max(a_len, b_len)
+            # スコアの上限（部分一致なら 短い方/長い方、それ以外は 共通文字数/長い方）
+            upper = max(shared, min(a_len, b_len)) / longer
+            if upper < threshold or upper < best_score:
+                continue
+            score = _normalized_similarity(a_norm, self._names[name_id])
+            if score > best_score or (score == best_score and pos < best_pos):
+                best_score, best_pos = score, pos
+
+        if best_score <= 0.0 or best_score < threshold:
+            return None, 0.0
+        return self.participants[best_pos], best_score
+
+
 def run_auto_matching(threshold: float = 0.8) -> dict:
     """未照合のCSVレコードに対して自動照合を実行する"""
     unmatched_imports = BankImport.query.filter_by(match_status="unmatched").all()
-    all_participants = Participant.query.all()
+    all_participants = Participant.query.options(
+        selectinload(Participant.final_responses),
+        selectinload(Participant.payment),
+    ).all()
+    index = _MatchingIndex(all_participants)
 
     results = {"auto_confirmed": 0, "matched": 0, "unmatched": 0}
 
     for bank_import in unmatched_imports:
-        best_score = 0.0
-        best_participant = None
-
-        for participant in all_participants:
-            # 照合候補名を集める（本出欠の振込名義 + 名簿から生成した名義）
-            candidate_names = []
-            final = participant.latest_final
-            if final and final.transfer_name:
-                candidate_names.append(final.transfer_name)
-            expected = _expected_transfer_name(participant)
-            if expected:
-                candidate_names.append(expected)
-            # 旧カナでも照合（旧姓で振込む場合に対応）
-            alt = _alt_transfer_name(participant)
-            if alt and alt != expected:
-                candidate_names.append(alt)
-            # カナ氏名単体でも照合（新旧両方）
-            if participant.name_kana:
-                candidate_names.append(participant.name_kana)
-
-            for name in candidate_names:
-                score = _similarity_score(bank_import.raw_name, name)
-                if score > best_score:
-                    best_score = score
-                    best_participant = participant
+        best_participant, best_score = index.best_match(bank_import.raw_name, threshold)
 
         if best_participant and best_score >= threshold:
             bank_import.matched_participant_id = best_participant.id
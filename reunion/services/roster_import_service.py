@@ -0,0 +1,480 @@
+"""
+services/roster_import_service.py - 名簿CSVの取込（差分反映）
+
+名簿CSVと現在の参加者を突き合わせて追加・更新・削除の差分を作り、
+確認後に1トランザクションの一括SQLで反映する。
+参加者を全削除して入れ直さないので、回答履歴・メール送信履歴・入金照合は残る。
+
+  1. parse_roster_csv    CSVを読み込み、1行1件の dict にする
+  2. plan_roster_import  現在の参加者と突き合わせた差分（プレビュー表示用）を作る
+  3. apply_roster_import 差分を一括 INSERT / UPDATE / DELETE で反映してコミットする
+
+突き合わせのキー:
+  - メールアドレス
+  - 一致しなければ クラス + 出席番号 + 氏名
+
+反映のルール:
+  - CSVにない列は変更しない（メールアドレスが空の行は登録済みのアドレスを残す）
+  - 回答・入金の列の空欄は変更しない
+  - 仮出欠・本出欠が現在の最新回答と異なる場合は、新しい回答として追加する
+  - CSVにない参加者は削除する（回答・メール送信履歴も削除し、照合済みの銀行CSVは未照合に戻す）
+"""
+import csv
+import hashlib
+import io
+import logging
+import re
+from datetime import datetime
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import (Participant, ProvisionalResponse, FinalResponse, Payment, BankImport,
+                    MailLog, MailJob, AttendanceRecord, VerificationToken, PLACEHOLDER_DOMAIN,
+                    participant_search_columns, refresh_latest_response_ids)
+from utils import normalize_transfer_name
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = 500  # 一括 INSERT・IN 句に渡す件数
+
+# 列名の候補（小文字で比較）
+COLUMN_HEADERS = {
+    "name":            {"氏名", "名前", "name"},
+    "name_kana":       {"氏名カナ", "氏名（カナ）", "フリガナ", "ふりがな", "kana", "name_kana"},
+    "email":           {"メールアドレス", "メール", "email", "mail"},
+    "class_name":      {"クラス", "class", "組", "担当クラス"},
+    "student_number":  {"出席番号", "番号", "number", "no"},
+    "role":            {"役割", "role", "種別", "区分"},
+    "teacher_memo":    {"幹事メモ", "メモ", "memo"},
+    "token":           {"トークン", "token"},
+    "prov_status":     {"仮出欠", "provisional_status"},
+    "final_status":    {"本出欠", "final_status"},
+    "companions":      {"同伴者数", "companions"},
+    "transfer_name":   {"振込名義", "transfer_name"},
+    "remarks":         {"備考", "remarks", "本出欠備考"},
+    "pay_status":      {"入金ステータス", "payment_status"},
+    "paid_amount":     {"入金金額", "paid_amount"},
+    "expected_amount": {"支払予定金額", "expected_amount", "予定金額"},
+    "payment_date":    {"支払日", "payment_date"},
+}
+# ヘッダーがない場合の固定順
+HEADERLESS_COLUMNS = ["name", "name_kana", "email", "class_name", "student_number", "role", "teacher_memo"]
+
+# 差分の対象にする参加者の列と表示名
+PARTICIPANT_FIELDS = {
+    "name": "氏名",
+    "name_kana": "氏名（カナ）",
+    "email": "メールアドレス",
+    "class_name": "クラス",
+    "student_number": "出席番号",
+    "role": "役割",
+    "teacher_memo": "幹事メモ",
+    "token": "トークン",
+}
+
+VALID_ROLES = {"生徒", "教師", "学年主任", "幹事"}
+
+PROV_STATUS_MAP  = {"参加": "attending", "不参加": "not_attending", "未定": "undecided",
+                    "attending": "attending", "not_attending": "not_attending", "undecided": "undecided"}
+FINAL_STATUS_MAP = {"参加": "attending", "不参加": "not_attending", "直前キャンセル": "cancelled",
+                    "attending": "attending", "not_attending": "not_attending", "cancelled": "cancelled"}
+PAY_STATUS_MAP   = {"未払い": "unpaid", "支払済み": "paid", "一部支払い": "partial",
+                    "unpaid": "unpaid", "paid": "paid", "partial": "partial"}
+
+
+# -----------------------------------------------
+# 1. CSVの読み込み
+# -----------------------------------------------
+def parse_roster_csv(content: bytes) -> dict:
+    """
+    名簿CSVを読み込む。列の順序はヘッダー名で自動判別する
+    （ヘッダーがない場合は 氏名・氏名カナ・メール・クラス・出席番号・役割・幹事メモ の固定順）。
+
+    Returns:
+        dict: records=行ごとの dict のリスト, columns=CSVにある列の集合, skipped=氏名が空でスキップした行数
+    Raises:
+        ValueError: エンコーディングを判別できない・空・氏名列がない場合
+    """
+    text = None
+    for encoding in ["utf-8-sig", "shift_jis", "cp932", "utf-8"]:
+        try:
+            text = content.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    if text is None:
+        raise ValueError("CSVのエンコーディングを判別できませんでした。UTF-8かShift_JISで保存してください。")
+
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        raise ValueError("CSVが空です。")
+
+    first = [h.strip().lower() for h in rows[0]]
+    has_header = any(h in COLUMN_HEADERS["name"] or h in COLUMN_HEADERS["email"] for h in first)
+    if has_header:
+        indexes = {}
+        for field, candidates in COLUMN_HEADERS.items():
+            lowered = {c.lower() for c in candidates}
+            idx = next((i for i, h in enumerate(first) if h in lowered), None)
+            if idx is not None:
+                indexes[field] = idx
+        data_rows = rows[1:]
+    else:
+        indexes = {field: i for i, field in enumerate(HEADERLESS_COLUMNS)}
+        data_rows = rows
+
+    if "name" not in indexes:
+        raise ValueError("CSVに「氏名」列が見つかりません。")
+
+    records = []
+    skipped = 0
+    for row in data_rows:
+        if not row or all(cell.strip() == "" for cell in row):
+            continue
+        values = {field: (row[idx].strip() if idx < len(row) else "") for field, idx in indexes.items()}
+        record = _normalize_record(values)
+        if record is None:
+            skipped += 1
+            continue
+        records.append(record)
+
+    return {"records": records, "columns": set(indexes), "skipped": skipped}
+
+
+def _to_int(value: str):
+    return int(value) if value.isdigit() else None
+
+
+def _normalize_record(values: dict):
+    """CSVの1行を登録用の値にそろえる。氏名が空なら None"""
+    name = values.get("name", "")
+    if not name:
+        return None
+
+    role = values.get("role", "") or "生徒"
+    if role not in VALID_ROLES:
+        role = "生徒"
+
+    class_ = values.get("class_name", "")
+    if role == "学年主任":
+        class_ = ""
+    elif class_ and not re.fullmatch(r'\d{2}', class_):
+        digits = re.sub(r'\D', '', class_)
+        class_ = digits[:2] if len(digits) >= 2 else digits
+
+    email = values.get("email", "").lower()
+    if not email or "@" not in email:
+        email = f"__no_email_{name}_{class_}_{role}{PLACEHOLDER_DOMAIN}"
+
+    payment_date = None
+    if values.get("payment_date"):
+        try:
+            payment_date = datetime.strptime(values["payment_date"], "%Y-%m-%d").date()
+        except ValueError:
+            pass
+
+    return {
+        "name": name,
+        "name_kana": values.get("name_kana", ""),
+        "email": email,
+        "class_name": class_,
+        "student_number": values.get("student_number", ""),
+        "role": role,
+        "teacher_memo": values.get("teacher_memo", ""),
+        "token": values.get("token", ""),
+        "prov_status": PROV_STATUS_MAP.get(values.get("prov_status", ""), ""),
+        "final_status": FINAL_STATUS_MAP.get(values.get("final_status", ""), ""),
+        "companions": _to_int(values.get("companions", "")),
+        "transfer_name": normalize_transfer_name(values.get("transfer_name", "")),
+        "remarks": values.get("remarks", ""),
+        "pay_status": PAY_STATUS_MAP.get(values.get("pay_status", ""), ""),
+        "paid_amount": _to_int(values.get("paid_amount", "")),
+        "expected_amount": _to_int(values.get("expected_amount", "")),
+        "payment_date": payment_date,
+    }
+
+
+# -----------------------------------------------
+# 2. 差分の作成
+# -----------------------------------------------
+def _load_current() -> list:
+    """現在の参加者を最新回答・入金と合わせて1クエリで読み込む"""
+    prov = aliased(ProvisionalResponse)
+    final = aliased(FinalResponse)
+    q = (
+        select(
+            Participant.id, Participant.name, Participant.name_kana, Participant.email,
+            Participant.class_name, Participant.student_number, Participant.role,
+            Participant.teacher_memo, Participant.token,
+            prov.status.label("prov_status"),
+            final.status.label("final_status"),
+            final.companions.label("companions"),
+            final.transfer_name.label("transfer_name"),
+            final.remarks.label("remarks"),
+            Payment.id.label("payment_id"),
+            Payment.payment_status.label("pay_status"),
+            Payment.paid_amount.label("paid_amount"),
+            Payment.expected_amount.label("expected_amount"),
+            Payment.payment_date.label("payment_date"),
+            Payment.transfer_name.label("payment_transfer_name"),
+        )
+        .outerjoin(prov, prov.id == Participant.latest_provisional_id)
+        .outerjoin(final, final.id == Participant.latest_final_id)
+        .outerjoin(Payment, Payment.participant_id == Participant.id)
+        .order_by(Participant.id)
+    )
+    return [dict(row) for row in db.session.execute(q).mappings()]
+
+
+def _fallback_key(row: dict) -> tuple:
+    return (row["class_name"] or "", row["student_number"] or "", row["name"])
+
+
+def _participant_changes(rec: dict, cur: dict, columns: set) -> dict:
+    """参加者の列の差分 {列: (現在の値, 新しい値)}。CSVにない列は比べない（氏名・メールは常に比べる）"""
+    changes = {}
+    for field in PARTICIPANT_FIELDS:
+        if field not in columns and field not in ("name", "email"):
+            continue
+        new, old = rec[field], cur[field] or ""
+        if field == "email" and new.endswith(PLACEHOLDER_DOMAIN):
+            continue  # メールアドレスなしの行では登録済みのアドレス（仮アドレスを含む）を残す
+        if field == "token" and not new:
+            continue
+        if new != old:
+            changes[field] = (old, new)
+    return changes
+
+
+def _response_rows(rec: dict, cur, columns: set, participant_ref: dict) -> dict:
+    """
+    回答・入金の差分。participant_ref は既存なら {"participant_id": id}、新規なら {"email": email}。
+    Returns: provisional / final / payment_insert / payment_update（該当しなければ None）
+    """
+    cur = cur or {}
+    result = {"provisional": None, "final": None, "payment_insert": None, "payment_update": None}
+
+    if "prov_status" in columns and rec["prov_status"] and rec["prov_status"] != cur.get("prov_status"):
+        result["provisional"] = {**participant_ref, "status": rec["prov_status"]}
+
+    if "final_status" not in columns or not rec["final_status"]:
+        return result
+
+    # 本出欠: CSVにある列だけ比べ、ない列は現在の回答の値を引き継ぐ
+    current_final = {
+        "status": cur.get("final_status"),
+        "companions": cur.get("companions") or 0,
+        "transfer_name": normalize_transfer_name(cur.get("transfer_name") or ""),
+        "remarks": cur.get("remarks") or "",
+    }
+    final = {**current_final, "status": rec["final_status"]}
+    if "companions" in columns and rec["companions"] is not None:
+        final["companions"] = rec["companions"]
+    if "transfer_name" in columns and rec["transfer_name"]:
+        final["transfer_name"] = rec["transfer_name"]
+    if "remarks" in columns and rec["remarks"]:
+        final["remarks"] = rec["remarks"]
+    if final != current_final:
+        result["final"] = {**participant_ref, **final}
+
+    # 入金: CSVに入金の値がある・本出欠が参加なら1件（本出欠フォームと同じ）。CSVの空欄は変更しない
+    payment = {}
+    if "pay_status" in columns and rec["pay_status"]:
+        payment["payment_status"] = rec["pay_status"]
+    for field in ("paid_amount", "expected_amount", "payment_date"):
+        if field in columns and rec[field] is not None:
+            payment[field] = rec[field]
+    if "transfer_name" in columns and rec["transfer_name"]:
+        payment["transfer_name"] = rec["transfer_name"]
+
+    if cur.get("payment_id") is None:
+        if not payment.get("payment_status") and rec["final_status"] != "attending":
+            return result
+        result["payment_insert"] = {
+            **participant_ref,
+            "payment_status": "unpaid", "paid_amount": 0, "expected_amount": 0,
+            "payment_date": None, "transfer_name": final["transfer_name"],
+            **payment,
+        }
+    else:
+        current_payment = {
+            **cur,
+            "payment_status": cur.get("pay_status"),
+            "transfer_name": normalize_transfer_name(cur.get("payment_transfer_name") or ""),
+        }
+        changed = {k: v for k, v in payment.items() if current_payment.get(k) != v}
+        if changed:
+            result["payment_update"] = {"id": cur["payment_id"], **changed}
+    return result
+
+
+def plan_roster_import(parsed: dict) -> dict:
+    """
+    parse_roster_csv の結果と現在の参加者を突き合わせて差分を作る（DBは変更しない）。
+
+    Returns:
+        dict:
+          inserts   追加する参加者（CSVの行）
+          updates   [{"id", "name", "changes": {列: (現在, 新)}}]
+          deletes   削除する参加者 [{"id", "name", "email", "class_name", "student_number"}]
+          provisional / final / payment_inserts / payment_updates  回答・入金の追加と更新
+          unchanged 変更のない参加者数, skipped 氏名なしの行数, duplicates CSV内で重複した行数
+          digest    差分の要約ハッシュ（確認画面と反映時で差分が変わっていないかの確認用）
+    """
+    columns = parsed["columns"]
+    current = _load_current()
+    by_email = {(row["email"] or "").lower(): row for row in current}
+    by_key = {}
+    for row in current:
+        by_key.setdefault(_fallback_key(row), row)
+
+    plan = {
+        "inserts": [], "updates": [], "deletes": [],
+        "provisional": [], "final": [], "payment_inserts": [], "payment_updates": [],
+        "unchanged": 0, "skipped": parsed["skipped"], "duplicates": 0,
+    }
+    matched_ids = set()
+    csv_emails = set()
+
+    for rec in parsed["records"]:
+        if rec["email"] in csv_emails:
+            plan["duplicates"] += 1
+            continue
+        csv_emails.add(rec["email"])
+
+        cur = by_email.get(rec["email"])
+        if cur is None or cur["id"] in matched_ids:
+            cur = by_key.get(_fallback_key(rec))
+        if cur is not None and cur["id"] in matched_ids:
+            cur = None
+
+        if cur is None:
+            plan["inserts"].append(rec)
+            responses = _response_rows(rec, None, columns, {"email": rec["email"]})
+        else:
+            matched_ids.add(cur["id"])
+            changes = _participant_changes(rec, cur, columns)
+            if changes:
+                plan["updates"].append({"id": cur["id"], "name": cur["name"], "changes": changes})
+            responses = _response_rows(rec, cur, columns, {"participant_id": cur["id"]})
+            if not changes and not any(responses.values()):
+                plan["unchanged"] += 1
+
+        for key, target in (("provisional", "provisional"), ("final", "final"),
+                            ("payment_insert", "payment_inserts"), ("payment_update", "payment_updates")):
+            if responses[key]:
+                plan[target].append(responses[key])
+
+    plan["deletes"] = [
+        {k: row[k] for k in ("id", "name", "email", "class_name", "student_number")}
+        for row in current if row["id"] not in matched_ids
+    ]
+    plan["digest"] = _plan_digest(plan)
+    return plan
+
+
+def _plan_digest(plan: dict) -> str:
+    summary = repr((
+        [rec["email"] for rec in plan["inserts"]],
+        [(u["id"], sorted(u["changes"].items())) for u in plan["updates"]],
+        [d["id"] for d in plan["deletes"]],
+        [sorted(r.items()) for key in ("provisional", "final", "payment_inserts", "payment_updates")
+         for r in plan[key]],
+    ))
+    return hashlib.sha256(summary.encode()).hexdigest()[:16]
+
+
+# -----------------------------------------------
+# 3. 反映
+# -----------------------------------------------
+def _chunked(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _delete_participants(ids: list) -> None:
+    """参加者と関連レコードを一括削除する（照合済みの銀行CSVは未照合に戻す）"""
+    for chunk in _chunked(ids, BULK_CHUNK_SIZE):
+        db.session.execute(
+            update(BankImport)
+            .where(BankImport.matched_participant_id.in_(chunk))
+            .values(matched_participant_id=None, match_status="unmatched"),
+            execution_options={"synchronize_session": False},
+        )
+        for model in (MailJob, MailLog, AttendanceRecord, VerificationToken,
+                      Payment, FinalResponse, ProvisionalResponse, Participant):
+            column = model.id if model is Participant else model.participant_id
+            db.session.execute(delete(model).where(column.in_(chunk)),
+                               execution_options={"synchronize_session": False})
+
+
+def apply_roster_import(plan: dict) -> dict:
+    """
+    plan_roster_import の差分を一括SQLで反映し、1回だけコミットする（失敗したら全件取り消し）。
+
+    Returns:
+        dict: inserted / updated / deleted / responses（追加した回答数）
+    """
+    now = datetime.utcnow()
+    try:
+        # 削除 → 更新 → 追加の順（削除・変更で空いたメールアドレスを新規の行が使えるように）
+        # 一括 INSERT / UPDATE はORMのイベントを通らないので、名寄せ用カラムもここで設定する
+        _delete_participants([d["id"] for d in plan["deletes"]])
+
+        if plan["updates"]:
+            rows = []
+            for u in plan["updates"]:
+                values = {k: new for k, (_, new) in u["changes"].items()}
+                rows.append({"id": u["id"], "updated_at": now, **values, **participant_search_columns(values)})
+            db.session.execute(update(Participant), rows)
+
+        new_ids = {}
+        participant_columns = list(PARTICIPANT_FIELDS)
+        for chunk in _chunked(plan["inserts"], BULK_CHUNK_SIZE):
+            db.session.execute(insert(Participant), [
+                {**{k: rec[k] for k in participant_columns}, "token": rec["token"] or None,
+                 **participant_search_columns(rec), "created_at": now, "updated_at": now}
+                for rec in chunk
+            ])
+            emails = [rec["email"] for rec in chunk]
+            new_ids.update(db.session.execute(
+                select(Participant.email, Participant.id).where(Participant.email.in_(emails))
+            ).all())
+
+        def resolve(rows):
+            resolved = []
+            for row in rows:
+                row = dict(row)
+                if "email" in row:
+                    row["participant_id"] = new_ids[row.pop("email")]
+                resolved.append(row)
+            return resolved
+
+        provisional = resolve(plan["provisional"])
+        final = resolve(plan["final"])
+        for model, rows, timestamp in ((ProvisionalResponse, provisional, "submitted_at"),
+                                       (FinalResponse, final, "submitted_at"),
+                                       (Payment, resolve(plan["payment_inserts"]), "created_at")):
+            for chunk in _chunked(rows, BULK_CHUNK_SIZE):
+                db.session.execute(insert(model), [{**row, timestamp: now} for row in chunk])
+        if plan["payment_updates"]:
+            db.session.execute(update(Payment), [{**row, "updated_at": now} for row in plan["payment_updates"]])
+
+        # 一括INSERTはフラッシュを経由しないので、最新回答IDをここで更新する
+        refresh_latest_response_ids(
+            db.session.connection(), {row["participant_id"] for row in provisional + final}
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    result = {
+        "inserted": len(plan["inserts"]),
+        "updated": len(plan["updates"]),
+        "deleted": len(plan["deletes"]),
+        "responses": len(plan["provisional"]) + len(plan["final"]),
+    }
+    logger.info(f"名簿取込: 追加 {result['inserted']} / 更新 {result['updated']} / "
+                f"削除 {result['deleted']} / 回答追加 {result['responses']}")
+    return result
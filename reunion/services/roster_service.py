@@ -0,0 +1,96 @@
+"""
+services/roster_service.py - クラス別名簿（/form/api/names）のスナップショット
+
+仮出欠フォーム・当日受付（QR）画面はクラスを選ぶたびに名簿を取りに来るため、
+全参加者を1クエリで読み込んでクラス別に並べた結果（JSON）をプロセス内に保持して使い回す。
+
+参加者・仮出欠回答の件数・最大ID・最終更新日時を「データのバージョン」とし、
+名簿の取込・編集や仮出欠の回答でこれが変わったときだけ作り直す
+（判定は services/cache_version.data_version。status_service と共通）。
+"""
+import hashlib
+from flask import current_app
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import Participant, ProvisionalResponse
+from services.cache_version import data_version
+
+TEACHER_CLASS = "teacher"        # 教師・学年主任の一覧を返すクラス指定
+STUDENT_ROLES = {"生徒", "幹事"}
+NAMES_CACHE_MAX_AGE = 15         # ブラウザ・リバースプロキシが再検証せずに使い回す秒数
+
+# 最後に作ったスナップショット
+# {"version", "groups", "responses": {クラス: (JSON, etag)}}
+_snapshot = None
+
+
+def _number(member: dict) -> int:
+    number = member["number"]
+    return int(number) if number.isdigit() else 9999
+
+
+def _build_groups() -> dict:
+    """全参加者を1クエリで読み込み、クラス別の生徒・教師と学年主任に分ける（並べ替え済み）"""
+    prov = aliased(ProvisionalResponse)
+    rows = (
+        db.session.query(
+            Participant.id, Participant.name, Participant.role, Participant.name_kana,
+            Participant.student_number, Participant.class_name, prov.submitted_at,
+        )
+        .outerjoin(prov, prov.id == Participant.latest_provisional_id)
+        .order_by(Participant.id)
+        .all()
+    )
+
+    students, class_teachers, heads, teachers = {}, {}, [], []
+    for pid, name, role, name_kana, number, class_name, submitted_at in rows:
+        member = {"id": pid, "name": name, "role": role or "", "name_kana": name_kana or "",
+                  "number": number or "", "responded": submitted_at is not None}
+        if role in STUDENT_ROLES:
+            students.setdefault(class_name, []).append(member)
+        elif role == "学年主任":
+            heads.append(member)
+            teachers.append((0, class_name or "", member))
+        elif role == "教師":
+            class_teachers.setdefault(class_name, []).append(member)
+            teachers.append((1, class_name or "", member))
+
+    for members in (*students.values(), *class_teachers.values()):
+        members.sort(key=_number)
+    teachers.sort(key=lambda t: (t[0], t[1], _number(t[2])))
+    return {
+        "students": students,
+        "class_teachers": class_teachers,
+        "heads": heads,
+        "teachers": [member for _, _, member in teachers],
+    }
+
+
+def _members(groups: dict, class_name: str) -> list:
+    """クラスの生徒（出席番号順）＋学年主任＋クラスの教師。TEACHER_CLASS なら教師・学年主任の一覧"""
+    if class_name == TEACHER_CLASS:
+        return groups["teachers"]
+    return groups["students"].get(class_name, []) + groups["heads"] + groups["class_teachers"].get(class_name, [])
+
+
+def get_class_roster(class_name: str) -> tuple:
+    """
+    クラスの名簿JSONを返す（データが変わっていればスナップショットを作り直す）。
+    Returns: (JSON文字列, etag)  etag は内容のハッシュなので、他のクラスの変更では変わらない
+    """
+    global _snapshot
+    version = data_version(Participant, ProvisionalResponse)
+    snapshot = _snapshot
+    if snapshot is None or snapshot["version"] != version:
+        snapshot = {"version": version, "groups": _build_groups(), "responses": {}}
+        _snapshot = snapshot
+
+    cached = snapshot["responses"].get(class_name)
+    if cached is None:
+        groups = snapshot["groups"]
+        body = current_app.json.dumps(_members(groups, class_name))
+        cached = (body, hashlib.sha1(body.encode()).hexdigest()[:20])
+        # 名簿にあるクラスだけ保持する（任意の ?class= で増え続けないように）
+        if class_name == TEACHER_CLASS or class_name in groups["students"] or class_name in groups["class_teachers"]:
+            snapshot["responses"][class_name] = cached
+    return cached
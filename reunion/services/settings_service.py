@@ -0,0 +1,114 @@
+"""
+services/settings_service.py - アプリ設定（AppSetting）の読み込みキャッシュ
+
+メール1通ごとに設定・同窓会情報・テンプレートを1キーずつ SELECT していたため、
+全キーを1クエリで読み込み、リクエスト（flask.g）の間は使い回す。
+
+  - リクエスト外・長時間動くワーカーでは settings_scope() で範囲を区切る
+    （一括送信1回分などのバッチの最初と最後でキャッシュを捨てる）
+  - AppSetting を追加・変更・削除して flush するとキャッシュを捨てる
+    （save_settings を使わない書き込みでも古い値を読まない）
+  - アクセスが集中する公開フォームは use_shared_settings() でプロセス内の共有キャッシュ
+    （SHARED_SETTINGS_TTL 秒）を使う。他のワーカーでの変更は最大 TTL 秒遅れて反映される
+"""
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from extensions import db
+from models import AppSetting
+
+_G_KEY = "_app_settings"
+SHARED_SETTINGS_TTL = 10  # 共有キャッシュを使い回す秒数
+
+# プロセス内で共有する読み込み結果 (読み込んだ時刻 time.monotonic(), {key: value})
+_shared = None
+
+
+def _query_settings() -> dict:
+    return {key: value for key, value in db.session.query(AppSetting.key, AppSetting.value)}
+
+
+def _load() -> dict:
+    if not has_app_context():
+        return _query_settings()
+    cache = g.get(_G_KEY)
+    if cache is None:
+        cache = _query_settings()
+        setattr(g, _G_KEY, cache)
+    return cache
+
+
+def get_settings() -> dict:
+    """保存されている全設定 {key: value}（呼び出し側で書き換えてよいコピー）"""
+    return dict(_load())
+
+
+def get_setting(key: str, default=None):
+    """設定値を返す。未保存・空文字なら default"""
+    value = _load().get(key)
+    return value if value else default
+
+
+def has_setting(key: str) -> bool:
+    """値が空でも、その設定が保存されていれば True"""
+    return key in _load()
+
+
+def use_shared_settings(ttl: float = SHARED_SETTINGS_TTL) -> None:
+    """
+    このリクエストの設定を、プロセス内で共有する読み込み結果（ttl 秒以内のもの）から使う。
+    リマインド一斉送信の直後など、同じ設定を読むリクエストが集中するページ用。
+    """
+    global _shared
+    if g.get(_G_KEY) is not None:
+        return
+    shared = _shared
+    now = time.monotonic()
+    if shared is None or now - shared[0] > ttl:
+        shared = (now, _query_settings())
+        _shared = shared
+    setattr(g, _G_KEY, shared[1])
+
+
+def invalidate_settings() -> None:
+    """読み込み済みの設定を捨てる（次の読み込みでDBから読み直す）"""
+    global _shared
+    _shared = None
+    if has_app_context():
+        g.pop(_G_KEY, None)
+
+
+@contextmanager
+def settings_scope():
+    """ブロックの間だけ設定を使い回す（一括送信ワーカーなどリクエスト外のバッチ用）"""
+    invalidate_settings()
+    try:
+        yield
+    finally:
+        invalidate_settings()
+
+
+def save_settings(values: dict) -> None:
+    """
+    複数の設定をまとめて保存する（既存行は1クエリで読み込んで更新）。
+    commit は呼び出し側で行う。
+    """
+    existing = {s.key: s for s in AppSetting.query.filter(AppSetting.key.in_(list(values))).all()}
+    for key, value in values.items():
+        s = existing.get(key)
+        if s:
+            s.value = value
+        else:
+            db.session.add(AppSetting(key=key, value=value))
+    invalidate_settings()
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_on_flush(session, flush_context):
+    """AppSetting の書き込みが flush されたらキャッシュを捨てる"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, AppSetting):
+            invalidate_settings()
+            return
@@ -0,0 +1,101 @@
+"""
+services/stats_service.py - 集計クエリ
+
+参加者ごとの「最新の回答」や送信済みメールの有無を SQL 側で集計する。
+Participant.latest_provisional / latest_final を1人ずつ呼ぶと N+1 クエリになるため、
+一覧・ダッシュボードではこちらを使う。最新回答は participants.latest_*_id で結合する。
+"""
+from sqlalchemy import case, func
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import Participant, ProvisionalResponse, FinalResponse, Payment, MailLog
+
+# 送信済みとみなす MailLog.status
+SENT_STATUSES = ("sent", "simulated")
+
+
+def sent_mail_participant_ids(mail_type: str):
+    """
+    mail_type のメールを送信済みの参加者IDのサブクエリ（列: pid）を返す。
+
+    一覧・ダッシュボードはこれを1回だけ外部結合して判定する。サブクエリは索引
+    ix_mail_logs_participant_type_status（participant_id, mail_type, status）だけを読み、
+    participant_id 順に並んでいるので DISTINCT にも一時的な並べ替えが要らない。
+    """
+    return (
+        db.session.query(MailLog.participant_id.label("pid"))
+        .filter(MailLog.mail_type == mail_type, MailLog.status.in_(SENT_STATUSES))
+        .distinct()
+        .subquery()
+    )
+
+
+def sent_mail_types_by_participant(mail_types) -> dict:
+    """
+    mail_types のうち送信済みのメール種別を参加者ごとに返す（1クエリ）。
+    Returns: {participant_id: {mail_type, ...}}（1通も送っていない参加者は含まない）
+    """
+    rows = (
+        db.session.query(MailLog.participant_id, MailLog.mail_type)
+        .filter(MailLog.mail_type.in_(list(mail_types)), MailLog.status.in_(SENT_STATUSES))
+        .group_by(MailLog.participant_id, MailLog.mail_type)
+    )
+    sent = {}
+    for pid, mail_type in rows:
+        sent.setdefault(pid, set()).add(mail_type)
+    return sent
+
+
+def get_dashboard_counts() -> dict:
+    """ダッシュボードの参加者集計を1クエリで返す"""
+    final_url_ids = sent_mail_participant_ids("final_url")
+    prov = aliased(ProvisionalResponse)
+    final = aliased(FinalResponse)
+
+    def _count(*whens, else_=0):
+        return func.coalesce(func.sum(case(*whens, else_=else_)), 0)
+
+    row = (
+        db.session.query(
+            func.count(Participant.id),
+            _count((prov.status == "attending", 1)),
+            _count((prov.status == "not_attending", 1)),
+            _count((prov.status == "undecided", 1)),
+            _count((prov.id.is_(None), 1)),
+            _count((final.status == "attending", 1)),
+            _count((final.status == "cancelled", 1)),
+            _count((final.id.is_(None), 0), (final.status.in_(("attending", "cancelled")), 0), else_=1),
+            _count((final.id.is_(None), 1)),
+            _count((final_url_ids.c.pid.isnot(None), 1)),
+            _count((Payment.payment_status == "paid", 1)),
+            _count((Payment.id.is_(None), 0), (Payment.payment_status == "paid", 0),
+                   (final.status.in_(("not_attending", "cancelled")), 0), else_=1),
+            _count((Participant.email.like("%@placeholder.local"), 1)),
+        )
+        .select_from(Participant)
+        .outerjoin(prov, prov.id == Participant.latest_provisional_id)
+        .outerjoin(final, final.id == Participant.latest_final_id)
+        .outerjoin(final_url_ids, final_url_ids.c.pid == Participant.id)
+        .outerjoin(Payment, Payment.participant_id == Participant.id)
+        .one()
+    )
+    (total, prov_attending, prov_not_attending, prov_undecided, prov_none,
+     final_attending, final_cancelled, final_not_attending, final_none,
+     final_url_sent, paid, unpaid, no_email) = (int(v or 0) for v in row)
+
+    return {
+        "total": total,
+        "provisional_attending": prov_attending,
+        "provisional_not_attending": prov_not_attending,
+        "provisional_undecided": prov_undecided,
+        "final_attending": final_attending,
+        "final_not_attending": final_not_attending,
+        "final_cancelled": final_cancelled,
+        "final_no_response": final_none,
+        "no_provisional_response": prov_none,
+        "paid": paid,
+        "unpaid": unpaid,
+        "no_email": no_email,
+        "final_url_sent": final_url_sent,
+        "final_url_unsent": total - final_url_sent,
+    }
@@ -0,0 +1,118 @@
+"""
+services/status_service.py - 参加状況ページ（/status）のスナップショット
+
+/status は告知日などに多数の同級生から繰り返し開かれるため、
+集計とクラス別一覧、描画済みHTMLをプロセス内に保持して使い回す。
+
+参加者・回答テーブルの件数・最大ID・最終更新日時を「データのバージョン」とし、
+これが変わったときだけ作り直す（services/cache_version.data_version。
+gunicorn の複数ワーカーでもDBを見て判定するので整合する）。
+"""
+import hashlib
+from datetime import datetime, timezone
+from flask import render_template
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import Participant, ProvisionalResponse, FinalResponse
+from services.cache_version import data_version
+
+TEACHER_ROLES = {"教師", "学年主任", "副担任"}
+
+# 最後に作ったスナップショット
+# {"version", "etag", "last_modified", "context", "html": {show_details: str}}
+_snapshot = None
+
+
+def _class_label(cls):
+    if cls and cls.isdigit():
+        return f"{cls}組"
+    return cls or "不明"
+
+
+def _build_context() -> dict:
+    """status.html に渡す集計・クラス別一覧を作る"""
+    prov = aliased(ProvisionalResponse)
+    final = aliased(FinalResponse)
+    rows = (
+        db.session.query(
+            Participant.name, Participant.role, Participant.class_name, Participant.student_number,
+            prov.id, prov.status, prov.share_consent, prov.submitted_at,
+            final.id, final.status, final.share_consent, final.submitted_at,
+        )
+        .outerjoin(prov, prov.id == Participant.latest_provisional_id)
+        .outerjoin(final, final.id == Participant.latest_final_id)
+        .order_by(Participant.id)
+        .all()
+    )
+
+    prov_stats  = {"attending": 0, "not_attending": 0, "undecided": 0, "no_response": 0}
+    final_stats = {"attending": 0, "not_attending": 0, "no_response": 0}
+    student_map = {}
+    teachers    = []
+
+    for (name, role, class_name, student_number,
+         prov_id, prov_status, prov_consent, prov_at,
+         final_id, final_status, final_consent, final_at) in rows:
+        ps = prov_status if prov_id is not None else "no_response"
+        if final_id is None:
+            fs = "no_response"
+        else:
+            fs = final_status if final_status != "cancelled" else "not_attending"
+
+        prov_stats[ps]  = prov_stats.get(ps, 0)  + 1
+        final_stats[fs] = final_stats.get(fs, 0) + 1
+
+        is_teacher = role in TEACHER_ROLES
+        info = {"name": name + (" 先生" if is_teacher else ""), "prov": ps, "final": fs,
+                "class_name": class_name or "", "number": student_number or "",
+                "prov_consent": bool(prov_consent) if prov_id is not None else False,
+                "final_consent": bool(final_consent) if final_id is not None else False,
+                "prov_at": prov_at.isoformat() if prov_id is not None else None,
+                "final_at": final_at.isoformat() if final_id is not None else None}
+        if is_teacher:
+            teachers.append(info)
+        else:
+            student_map.setdefault(class_name or "", []).append(info)
+
+    sorted_classes = [
+        {"key": cls, "label": _class_label(cls), "people": people}
+        for cls, people in sorted(student_map.items(), key=lambda x: (not x[0], x[0]))
+    ]
+    return {
+        "prov_stats": prov_stats,
+        "final_stats": final_stats,
+        "sorted_classes": sorted_classes,
+        "teachers": teachers,
+        "total": len(rows),
+    }
+
+
+def get_status_snapshot() -> dict:
+    """現在のデータに対応するスナップショットを返す（変更があれば作り直す）"""
+    global _snapshot
+    version = data_version(Participant, ProvisionalResponse, FinalResponse)
+    snapshot = _snapshot
+    if snapshot is None or snapshot["version"] != version:
+        snapshot = {
+            "version": version,
+            "etag": hashlib.sha1(repr(version).encode()).hexdigest()[:20],
+            "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+            "context": _build_context(),
+            "html": {},
+        }
+        _snapshot = snapshot
+    return snapshot
+
+
+def render_status_page(show_details: bool):
+    """
+    /status のHTMLを返す。
+    Returns: (html, etag, last_modified)
+    """
+    snapshot = get_status_snapshot()
+    html = snapshot["html"].get(show_details)
+    if html is None:
+        html = render_template("status.html", show_details=show_details, **snapshot["context"])
+        snapshot["html"][show_details] = html
+    etag = f"{snapshot['etag']}-{'d' if show_details else 'p'}"
+    return html, etag, snapshot["last_modified"]
@@ -7,7 +7,8 @@ services/token_service.py - トークン生成・管理サービス
 """
 import secrets
 import string
-from models import Participant
+from sqlalchemy.orm import joinedload
+from models import Participant, FinalResponse
 from extensions import db
 
 
@@ -39,14 +40,22 @@ def ensure_token(participant: Participant) -> str:
     return participant.token
 
 
-def get_participant_by_token(token: str):
+def get_participant_for_final_form(token: str) -> tuple:
     """
-    トークンから参加者を取得する。
-    見つからない場合は None を返す。
+    本出欠フォーム用に、トークンの参加者と最新の本出欠回答・入金情報を1クエリで取得する。
+    （participant.latest_final / participant.payment は追加のクエリなしで参照できる）
+    Returns: (Participant, 最新の FinalResponse or None)。見つからない場合は (None, None)
     """
     if not token:
-        return None
-    return Participant.query.filter_by(token=token).first()
+        return None, None
+    row = (
+        db.session.query(Participant, FinalResponse)
+        .outerjoin(FinalResponse, FinalResponse.id == Participant.latest_final_id)
+        .options(joinedload(Participant.payment))
+        .filter(Participant.token == token)
+        .first()
+    )
+    return tuple(row) if row else (None, None)
 
 
 def generate_final_url(participant: Participant, base_url: str) -> str:
@@ -0,0 +1,86 @@
+"""
+tests/brevo_server.py - テスト用のローカル Brevo API サーバー（POST /v3/smtp/email の最小実装）
+
+HTTP/1.1 の keep-alive で応答し、受け取ったリクエスト（JSON）と接続回数を記録する。
+messageVersions があれば version ごとに、なければ1件の messageId を返す。
+切断・エラーの再現用に次の設定を持つ。
+  - idle_timeout: 応答後、この秒数次のリクエストが来なければ Connection: close なしで接続を切る
+                  （keep-alive のタイムアウト）
+  - drop_requests: この番号（1始まり・全接続通し）のリクエストは受け取った後、応答せずに接続を切る
+  - fail_when:     リクエスト（dict）を受け取って True を返したら HTTP 400 を返す
+
+使い方:
+    with LocalBrevoServer() as server:
+        monkeypatch.setattr(mail_service, "BREVO_API_URL", server.url)
+        ...
+        server.requests, server.connections
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        self.timeout = self.server.owner.idle_timeout or None
+        super().setup()
+        with self.server.owner.lock:
+            self.server.owner.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        owner = self.server.owner
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with owner.lock:
+            owner.requests.append({"path": self.path, "api_key": self.headers.get("api-key"), "json": data})
+            number = len(owner.requests)
+        if number in owner.drop_requests:
+            self.close_connection = True
+            return
+
+        if owner.fail_when is not None and owner.fail_when(data):
+            status, body = 400, {"code": "invalid_parameter", "message": "rejected by test server"}
+        else:
+            versions = data.get("messageVersions")
+            if versions:
+                body = {"messageIds": [f"<{number}.{i}@test>" for i in range(len(versions))]}
+            else:
+                body = {"messageId": f"<{number}@test>"}
+            status = 201
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class LocalBrevoServer:
+    def __init__(self, idle_timeout: float = 0, drop_requests=(), fail_when=None):
+        self.idle_timeout = idle_timeout
+        self.drop_requests = set(drop_requests)
+        self.fail_when = fail_when
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.owner = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v3/smtp/email"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
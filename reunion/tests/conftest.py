@@ -0,0 +1,68 @@
+"""
+tests/conftest.py - pytest 共通設定
+
+reunion/ 直下のモジュール（app, models, services など）を import できるようにし、
+一時ディレクトリの SQLite でアプリを作る（MAIL_MODE=console。実際のメールは送らない）。
+実行: reunion/ で python -m pytest
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+_DB_DIR = tempfile.mkdtemp(prefix="reunion-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_DB_DIR) / 'test.db'}"
+os.environ["MAIL_MODE"] = "console"
+os.environ.setdefault("ADMIN_PASSWORD", "test")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+@pytest.fixture
+def app_ctx(app):
+    """アプリコンテキストの中でテストし、終わったら全テーブルとプロセス内キャッシュを空にする"""
+    from extensions import db
+    from services.settings_service import invalidate_settings
+
+    with app.app_context():
+        yield app
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        invalidate_settings()
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    with count_queries() as statements: の中で実行された SQL を statements に集める。
+    """
+    from sqlalchemy import event
+    from extensions import db
+
+    @contextmanager
+    def counting():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counting
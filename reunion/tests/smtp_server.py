@@ -0,0 +1,171 @@
+"""
+tests/smtp_server.py - テスト用のローカルSMTPサーバー（aiosmtpd 相当の最小実装）
+
+EHLO / STARTTLS / AUTH PLAIN・LOGIN / MAIL / RCPT / DATA / RSET / NOOP / QUIT に応答し、
+受け取ったメールと接続回数を記録する。切断・421 の再現用に次の設定を持つ。
+  - drop_after:   1接続で N 通受け取ったら、QUIT を待たずに接続を切る
+  - reply_421_after: 1接続で N 通受け取ったら、次の MAIL FROM に 421 を返して接続を切る
+  - greeting_delay: 接続時の応答（220）までの秒数（TLSハンドシェイク・ログインの遅延の代わり）
+
+使い方:
+    with LocalSMTPServer() as server:
+        cfg = server.smtp_config()   # mail_service の SMTP 設定（host, port, user, ...）
+        ...
+        server.messages, server.connections
+"""
+import base64
+import socket
+import socketserver
+import ssl
+import threading
+import time
+from pathlib import Path
+
+CERT_FILE = Path(__file__).resolve().parent / "data" / "localhost.pem"
+USER = "user"
+PASSWORD = "secret"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.tls = False
+        self.authed = False
+        self.sent_on_connection = 0
+
+    def reply(self, *lines: str) -> None:
+        self.wfile.write("".join(line + "\r\n" for line in lines).encode())
+        self.wfile.flush()
+
+    def readline(self) -> str:
+        return self.rfile.readline().decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self):
+        server = self.server.owner
+        with server.lock:
+            server.connections += 1
+        if server.greeting_delay:
+            time.sleep(server.greeting_delay)
+        self.reply("220 localhost ESMTP test")
+        mail_from, rcpts = None, []
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            verb, _, arg = line.partition(" ")
+            verb = verb.upper()
+
+            if verb in ("EHLO", "HELO"):
+                features = ["250-localhost", "250-AUTH PLAIN LOGIN"]
+                if not self.tls:
+                    features.append("250-STARTTLS")
+                features.append("250 8BITMIME")
+                self.reply(*features)
+            elif verb == "STARTTLS":
+                self.reply("220 ready to start TLS")
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+                context.load_cert_chain(CERT_FILE)
+                self.connection = context.wrap_socket(self.connection, server_side=True)
+                self.rfile = self.connection.makefile("rb")
+                self.wfile = self.connection.makefile("wb")
+                self.tls = True
+            elif verb == "AUTH":
+                self.authed = self._auth(arg)
+                self.reply("235 ok" if self.authed else "535 bad credentials")
+            elif verb == "MAIL":
+                if server.reply_421_after and self.sent_on_connection >= server.reply_421_after:
+                    self.reply("421 closing connection")
+                    return
+                if not self.authed:
+                    self.reply("530 authentication required")
+                    continue
+                mail_from, rcpts = arg, []
+                self.reply("250 ok")
+            elif verb == "RCPT":
+                rcpts.append(arg.split(":", 1)[1].strip("<> "))
+                self.reply("250 ok")
+            elif verb == "DATA":
+                self.reply("354 end with .")
+                lines = []
+                while True:
+                    data_line = self.readline()
+                    if data_line == ".":
+                        break
+                    lines.append(data_line[1:] if data_line.startswith("..") else data_line)
+                with server.lock:
+                    server.messages.append({"from": mail_from, "to": rcpts, "data": "\n".join(lines)})
+                self.sent_on_connection += 1
+                self.reply("250 queued")
+                if server.drop_after and self.sent_on_connection >= server.drop_after:
+                    return
+            elif verb == "RSET":
+                mail_from, rcpts = None, []
+                self.reply("250 ok")
+            elif verb == "NOOP":
+                self.reply("250 ok")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+    def _auth(self, arg: str) -> bool:
+        mechanism, _, initial = arg.partition(" ")
+        if mechanism.upper() == "PLAIN":
+            if not initial:
+                self.reply("334 ")
+                initial = self.readline()
+            _, user, password = base64.b64decode(initial).decode().split("\0")
+        elif mechanism.upper() == "LOGIN":
+            if initial:
+                user = base64.b64decode(initial).decode()
+            else:
+                self.reply("334 " + base64.b64encode(b"Username:").decode())
+                user = base64.b64decode(self.readline()).decode()
+            self.reply("334 " + base64.b64encode(b"Password:").decode())
+            password = base64.b64decode(self.readline()).decode()
+        else:
+            return False
+        return (user, password) == (USER, PASSWORD)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class LocalSMTPServer:
+    def __init__(self, drop_after: int = 0, reply_421_after: int = 0, greeting_delay: float = 0.0):
+        self.drop_after = drop_after
+        self.reply_421_after = reply_421_after
+        self.greeting_delay = greeting_delay
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.owner = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def smtp_config(self) -> dict:
+        """mail_service._get_mail_config() と同じ形の SMTP 設定"""
+        return {
+            "smtp_host": "127.0.0.1",
+            "smtp_port": self.port,
+            "smtp_user": USER,
+            "smtp_password": PASSWORD,
+            "from_addr": "no-reply@example.com",
+            "from_name": "同窓会幹事",
+        }
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,26 @@
+"""
+tests/test_admin_participants.py - 参加者一覧（/admin/participants）
+"""
+import re
+from html import unescape
+
+from extensions import db
+from models import Participant
+
+
+def test_filter_links_keep_per_page(app_ctx):
+    """検索クリア・絞り込み・リセットのリンクでも表示件数（per_page）を引き継ぐ"""
+    for i in range(3):
+        db.session.add(Participant(name=f"参加者{i}", email=f"u{i}@example.com",
+                                   class_name="31", student_number=str(i + 1), role="生徒"))
+    db.session.commit()
+    client = app_ctx.test_client()
+    with client.session_transaction() as session:
+        session["admin_authed"] = True
+
+    res = client.get("/admin/participants?per_page=50&q=参加者&class_name=31")
+    assert res.status_code == 200
+    # 一覧の状態を持つリンク（ナビゲーションの素のリンクは除く）
+    links = [unescape(href) for href in re.findall(r'href="(/admin/participants\?[^"]*)"', res.get_data(as_text=True))]
+    assert links
+    assert [href for href in links if "per_page=50" not in href] == []
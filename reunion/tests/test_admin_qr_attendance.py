@@ -0,0 +1,88 @@
+"""
+tests/test_admin_qr_attendance.py - 受付ボードの差分取得（/admin/api/qr-attendance/updates）
+"""
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import AttendanceRecord, Participant
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["admin_authed"] = True
+    return client
+
+
+def _checkin(i: int, minutes_ago: int = 10) -> AttendanceRecord:
+    participant = Participant(name=f"参加者{i}", email=f"u{i}@example.com", class_name="31",
+                              student_number=str(i), role="生徒")
+    record = AttendanceRecord(participant=participant, status="checked_in", source="qr",
+                              checked_in_at=datetime.utcnow() - timedelta(minutes=minutes_ago))
+    db.session.add(record)
+    db.session.commit()
+    return record
+
+
+def _poll(client, since=0, mail_since=""):
+    res = client.get("/admin/api/qr-attendance/updates", query_string={"since": since, "mail_since": mail_since})
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def test_new_records_then_idle_poll(app_ctx):
+    client = _client(app_ctx)
+    first, second = _checkin(1), _checkin(2)
+
+    data = _poll(client)
+    assert [r["id"] for r in data["records"]] == [first.id, second.id]
+    assert data["records"][0]["name"] == "参加者1" and data["records"][0]["email_sent"] is False
+    assert data["last_id"] == second.id
+    assert data["checked_count"] == 2
+    assert data["mailed"] == [] and data["mail_cursor"] == ""
+
+    # 変化がなければ何も返さない
+    idle = _poll(client, data["last_id"], data["mail_cursor"])
+    assert idle["records"] == [] and idle["mailed"] == []
+    assert idle["checked_count"] is None
+    assert idle["last_id"] == second.id
+
+    third = _checkin(3)
+    data = _poll(client, idle["last_id"])
+    assert [r["id"] for r in data["records"]] == [third.id]
+    assert data["checked_count"] == 3
+
+
+def test_recent_record_below_cursor_is_returned(app_ctx):
+    """小さいIDの記録が後から commit されても、登録直後なら次の差分で返す"""
+    client = _client(app_ctx)
+    late = _checkin(1, minutes_ago=0)
+    _checkin(2)
+
+    data = _poll(client, since=late.id + 1)
+    assert late.id in [r["id"] for r in data["records"]]
+
+
+def test_mailed_records_include_cursor_second(app_ctx):
+    """確認メールの送信日時が前回の境界と同じ秒の記録も取りこぼさない（MySQL は秒未満を持たない）"""
+    client = _client(app_ctx)
+    first, second = _checkin(1), _checkin(2)
+    sent_at = datetime.utcnow().replace(microsecond=0)
+    first.email_sent, first.email_sent_at = True, sent_at
+    db.session.commit()
+
+    data = _poll(client)
+    assert data["mailed"] == [first.id]
+    assert data["mail_cursor"] == sent_at.isoformat()
+
+    # 前回の取得の後、同じ秒に送信済みになった
+    second.email_sent, second.email_sent_at = True, sent_at
+    db.session.commit()
+    data = _poll(client, data["last_id"], data["mail_cursor"])
+    assert sorted(data["mailed"]) == [first.id, second.id]
+    assert data["records"] == []
+
+
+def test_invalid_mail_since(app_ctx):
+    res = _client(app_ctx).get("/admin/api/qr-attendance/updates?mail_since=yesterday")
+    assert res.status_code == 400
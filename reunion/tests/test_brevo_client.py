@@ -0,0 +1,136 @@
+"""
+tests/test_brevo_client.py - Brevo API への送信（BrevoClient・messageVersions でのまとめ送信）
+"""
+import time
+
+import pytest
+
+from brevo_server import LocalBrevoServer
+from extensions import db
+from models import AppSetting, MailJob, MailLog, Participant
+from services import mail_service
+from services.mail_queue_service import drain_queue, enqueue_mail_jobs
+from services.mail_service import BrevoClient
+from services.settings_service import invalidate_settings
+
+
+def _message(i: int) -> dict:
+    return {"sender": {"email": "kanji@example.com"}, "to": [{"email": f"u{i}@example.com"}],
+            "subject": f"件名{i}", "textContent": f"本文{i}"}
+
+
+def _brevo_settings():
+    db.session.add_all([AppSetting(key="mail_mode", value="brevo"),
+                        AppSetting(key="brevo_api_key", value="test-key"),
+                        AppSetting(key="mail_from", value="kanji@example.com"),
+                        AppSetting(key="mail_daily_limit", value="1000"),
+                        AppSetting(key="mail_send_rate", value="0")])
+    db.session.commit()
+    invalidate_settings()
+
+
+def _participants(n: int) -> list:
+    participants = [Participant(name=f"参加者{i}", email=f"u{i}@example.com", class_name="31",
+                                student_number=str(i + 1), role="生徒") for i in range(n)]
+    db.session.add_all(participants)
+    db.session.commit()
+    return participants
+
+
+def test_keep_alive_reuses_connection():
+    with LocalBrevoServer() as server:
+        client = BrevoClient(server.url)
+        ids = [client.post("test-key", _message(i))["messageId"] for i in range(20)]
+        client.close()
+
+    assert len(set(ids)) == 20
+    assert client.connections == 1
+    assert server.connections == 1
+    assert [r["json"]["to"][0]["email"] for r in server.requests] == [f"u{i}@example.com" for i in range(20)]
+    assert {r["api_key"] for r in server.requests} == {"test-key"}
+
+
+def test_reconnects_after_server_closes_idle_connection():
+    """送信の合間にサーバーが keep-alive 接続を閉じても、繋ぎ直して全件1回ずつ送る"""
+    with LocalBrevoServer(idle_timeout=0.1) as server:
+        client = BrevoClient(server.url)
+        for i in range(20):
+            if i and i % 5 == 0:
+                # 5件ごとに keep-alive のタイムアウトより長く待つ
+                time.sleep(0.3)
+            client.post("test-key", _message(i))
+        client.close()
+
+    assert [r["json"]["to"][0]["email"] for r in server.requests] == [f"u{i}@example.com" for i in range(20)]
+    assert client.connections == 4
+    assert server.connections == 4
+
+
+def test_lost_response_is_not_resent():
+    """リクエストを送った後に応答なしで切断されたら、送り直さずに例外にする（二重送信しない）"""
+    with LocalBrevoServer(drop_requests={3}) as server:
+        client = BrevoClient(server.url)
+        client.post("test-key", _message(1))
+        client.post("test-key", _message(2))
+        with pytest.raises(Exception):
+            client.post("test-key", _message(3))
+        assert len(server.requests) == 3
+
+        # 次の送信は新しい接続で送れる
+        client.post("test-key", _message(4))
+        client.close()
+
+    assert [r["json"]["to"][0]["email"] for r in server.requests] == [
+        "u1@example.com", "u2@example.com", "u3@example.com", "u4@example.com"]
+    assert client.connections == 2
+
+
+def test_drain_queue_maps_versions_to_mail_logs(app_ctx, monkeypatch):
+    """150通は 100 + 50 の2リクエストになり、各 version の宛先・本文がその参加者の MailLog と対応する"""
+    _brevo_settings()
+    participants = _participants(150)
+    enqueue_mail_jobs([p.id for p in participants], "final_url")
+
+    with LocalBrevoServer() as server:
+        monkeypatch.setattr(mail_service, "BREVO_API_URL", server.url)
+        counts = drain_queue("test-worker")
+
+    assert counts["sent"] == 150
+    assert [len(r["json"]["messageVersions"]) for r in server.requests] == [100, 50]
+    versions = [v for r in server.requests for v in r["json"]["messageVersions"]]
+    by_email = {v["to"][0]["email"]: v for v in versions}
+    assert len(by_email) == 150
+
+    logs = {log.participant_id: log for log in MailLog.query}
+    for p in Participant.query:
+        version = by_email[p.email]
+        assert f"/form/final/{p.token}" in version["textContent"]
+        assert p.display_name in version["textContent"]
+        assert logs[p.id].mail_type == "final_url"
+        assert logs[p.id].status == "sent"
+    assert {job.status for job in MailJob.query} == {"sent"}
+
+
+def test_rejected_request_fails_only_its_chunk(app_ctx, monkeypatch):
+    """1リクエストが拒否されたら、そのリクエストの宛先だけ失敗にして再試行に回す"""
+    _brevo_settings()
+    participants = _participants(150)
+    enqueue_mail_jobs([p.id for p in participants], "final_url")
+
+    def rejects_u120(data):
+        return any(v["to"][0]["email"] == "u120@example.com" for v in data.get("messageVersions", []))
+
+    with LocalBrevoServer(fail_when=rejects_u120) as server:
+        monkeypatch.setattr(mail_service, "BREVO_API_URL", server.url)
+        counts = drain_queue("test-worker")
+
+    [rejected] = [r["json"] for r in server.requests if rejects_u120(r["json"])]
+    rejected_emails = {v["to"][0]["email"] for v in rejected["messageVersions"]}
+    assert counts["sent"] == 150 - len(rejected_emails)
+    assert counts["retry"] == len(rejected_emails)
+
+    emails = {p.id: p.email for p in participants}
+    for log in MailLog.query:
+        assert log.status == ("failed" if emails[log.participant_id] in rejected_emails else "sent")
+    for job in MailJob.query:
+        assert job.status == ("pending" if emails[job.participant_id] in rejected_emails else "sent")
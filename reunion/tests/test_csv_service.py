@@ -0,0 +1,59 @@
+"""
+tests/test_csv_service.py - 銀行CSVのストリーミング解析（iter_bank_csv）
+"""
+import io
+
+import pytest
+
+from services import csv_service
+from services.csv_service import iter_bank_csv, parse_bank_csv
+
+
+def _stream(rows: list, encoding: str) -> io.BytesIO:
+    return io.BytesIO("\r\n".join(rows).encode(encoding))
+
+
+def test_ascii_prefix_then_shift_jis_rows():
+    """先頭 ENCODING_SNIFF_BYTES バイトが ASCII だけでも、後半の Shift_JIS 行を読める"""
+    rows = ["date,name,amount"]
+    rows += [f"2025/04/01,YAMADA TARO {i},8000" for i in range(4000)]
+    rows += ["2025/04/02,ヤマダ タロウ,8000"]
+    data = _stream(rows, "shift_jis").getvalue()
+    assert data[:csv_service.ENCODING_SNIFF_BYTES].isascii()
+
+    streamed = list(iter_bank_csv(io.BytesIO(data), filename="a.csv"))
+    assert streamed == parse_bank_csv(data, filename="a.csv")
+    assert len(streamed) == 4001
+    assert streamed[-1]["raw_name"] == "ヤマダ タロウ"
+
+
+@pytest.mark.parametrize("encoding", ["utf-8-sig", "shift_jis", "cp932", "utf-8"])
+def test_matches_parse_bank_csv(encoding, monkeypatch):
+    """読み込み単位の境界で多バイト文字が切れても parse_bank_csv と同じ結果になる"""
+    monkeypatch.setattr(csv_service, "ENCODING_SNIFF_BYTES", 64)
+    monkeypatch.setattr(csv_service, "STREAM_CHUNK_BYTES", 7)
+    name = "ヤマダ　①タロウ" if encoding == "cp932" else "ヤマダ　タロウ"
+    rows = ["口座番号 1234567", "日付,振込名義,入金額"]
+    rows += [f"2025/04/{i % 28 + 1:02d},{name}{i},{1000 + i}" for i in range(50)]
+    data = _stream(rows, encoding).getvalue()
+
+    assert list(iter_bank_csv(io.BytesIO(data))) == parse_bank_csv(data)
+
+
+def test_shift_jis_falls_back_to_cp932(monkeypatch):
+    """判別時は Shift_JIS でも、後半に CP932 拡張文字があれば CP932 で読み続ける"""
+    monkeypatch.setattr(csv_service, "ENCODING_SNIFF_BYTES", 64)
+    monkeypatch.setattr(csv_service, "STREAM_CHUNK_BYTES", 64)
+    rows = ["日付,振込名義,入金額"] + [f"2025/04/01,ヤマダ{i},8000" for i in range(20)]
+    rows += ["2025/04/02,①ヤマダ,8000"]
+    data = _stream(rows, "cp932").getvalue()
+
+    records = list(iter_bank_csv(io.BytesIO(data)))
+    assert records == parse_bank_csv(data)
+    assert records[-1]["raw_name"] == "1ヤマダ"
+
+
+def test_undecodable_raises_value_error():
+    data = "日付,振込名義,入金額\n".encode("utf-8") + b"2025/04/01,\xff\xfe\xfd,8000\n"
+    with pytest.raises(ValueError):
+        list(iter_bank_csv(io.BytesIO(data)))
@@ -0,0 +1,134 @@
+"""
+tests/test_mail_queue_service.py - 一括メール送信キュー（mail_jobs）
+"""
+import time
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import AppSetting, AttendanceRecord, MailJob, MailLog, Participant
+from services import mail_queue_service, mail_service
+from services.mail_queue_service import TokenBucket, claim_jobs, drain_queue, enqueue_mail_jobs
+from services.settings_service import invalidate_settings
+
+
+def _participants(n: int) -> list:
+    participants = [Participant(name=f"参加者{i}", email=f"u{i}@example.com", class_name="31",
+                                student_number=str(i + 1), role="生徒") for i in range(n)]
+    db.session.add_all(participants)
+    db.session.commit()
+    return [p.id for p in participants]
+
+
+def test_slow_batch_keeps_its_lease(app_ctx, monkeypatch):
+    """送信がリース期限より長くかかっても、他のワーカーに確保し直されない（二重送信しない）"""
+    monkeypatch.setattr(mail_queue_service, "LEASE_SECONDS", 1)
+    monkeypatch.setattr(mail_queue_service, "LEASE_RENEW_SECONDS", 0.2)
+    stolen = []
+
+    def slow_dispatch_batch(messages, mail_cfg, attachment_path=None):
+        # 送信スレッド（別のアプリコンテキスト）で、リース期限を過ぎてから別のワーカーとして確保を試みる
+        time.sleep(2.5)
+        stolen.extend(job.id for job in claim_jobs("other-worker", 10))
+        return ["simulated"] * len(messages)
+
+    monkeypatch.setattr(mail_service, "dispatch_batch", slow_dispatch_batch)
+    enqueue_mail_jobs(_participants(2), "reminder")
+
+    counts = drain_queue("test-worker")
+
+    assert stolen == []
+    assert counts["sent"] == 2
+    assert MailLog.query.count() == 2
+    assert {job.status for job in MailJob.query} == {"sent"}
+
+
+def test_expired_lease_is_taken_over(app_ctx):
+    """リース期限が切れた送信中ジョブ（ワーカーの停止など）は他のワーカーが引き継ぐ"""
+    enqueue_mail_jobs(_participants(1), "reminder")
+    [job] = claim_jobs("stopped-worker", 10)
+    assert claim_jobs("other-worker", 10) == []
+
+    MailJob.query.filter_by(id=job.id).update({MailJob.locked_until: datetime.utcnow() - timedelta(seconds=1)},
+                                              synchronize_session=False)
+    db.session.commit()
+    assert [j.id for j in claim_jobs("other-worker", 10)] == [job.id]
+
+
+def test_second_checkin_gets_its_own_confirmation(app_ctx, monkeypatch):
+    """再入場などで2回出席登録したら、2回目の記録にも確認メールを送る"""
+    from services.attendance_service import CHECKIN_WINDOW_SECONDS, check_in
+
+    monkeypatch.setattr(mail_queue_service, "start_background_worker", lambda app: False)
+    [pid] = _participants(1)
+    participant = db.session.get(Participant, pid)
+
+    first, created = check_in(participant)
+    assert created
+    assert drain_queue("test-worker")["sent"] == 1
+    # 1回目の登録を再スキャンの時間枠より前にずらす
+    first.checked_in_at -= timedelta(seconds=CHECKIN_WINDOW_SECONDS + 1)
+    first.idempotency_key = f"qr:{pid}:earlier"
+    db.session.commit()
+
+    second, created = check_in(participant)
+    assert created
+    counts = drain_queue("test-worker")
+
+    assert counts["sent"] == 1 and counts["skipped"] == 0
+    records = AttendanceRecord.query.order_by(AttendanceRecord.id).all()
+    assert [(r.id, r.email_sent) for r in records] == [(first.id, True), (second.id, True)]
+    assert all(r.email_sent_at is not None for r in records)
+    assert MailLog.query.filter_by(mail_type="attendance_checkin", status="simulated").count() == 2
+
+
+def test_batch_results_are_committed_once(app_ctx):
+    """1通ずつ送るモードでも、確保したバッチの結果は1回の commit でまとめて書き込む"""
+    from sqlalchemy import event
+
+    pids = _participants(10)
+    # 本出欠URLのトークンは送信前に発行済み（ensure_token の commit を数えない）
+    for p in Participant.query:
+        p.token = f"token{p.id}"
+    db.session.add(AppSetting(key="mail_send_rate", value="0"))
+    db.session.commit()
+    invalidate_settings()
+    enqueue_mail_jobs(pids, "reminder")
+    commits = []
+
+    def record(session):
+        commits.append(session)
+
+    session = db.session()
+    event.listen(session, "after_commit", record)
+    try:
+        counts = drain_queue("test-worker")
+    finally:
+        event.remove(session, "after_commit", record)
+    assert counts["sent"] == 10
+    # 確保・送信前・結果の反映 と、次の確保（ジョブなし）
+    assert len(commits) == 4
+
+
+def test_token_bucket_counts_messages():
+    """まとめ送信は宛先の数だけトークンを取り、送信レートを通数で守る"""
+    bucket = TokenBucket(rate=20)
+    started = time.monotonic()
+    bucket.acquire(40)          # たまっている 20 通分で送り、不足の 20 通分は次の acquire が待つ
+    assert time.monotonic() - started < 0.1
+    bucket.acquire()
+    assert time.monotonic() - started >= 1.0
+
+
+def test_brevo_batch_takes_one_token_per_recipient(app_ctx, monkeypatch):
+    taken = []
+    monkeypatch.setattr(TokenBucket, "acquire", lambda self, count=1: taken.append(count))
+    monkeypatch.setattr(mail_service, "dispatch_batch",
+                        lambda messages, mail_cfg, attachment_path=None: ["sent"] * len(messages))
+    db.session.add_all([AppSetting(key="mail_mode", value="brevo"),
+                        AppSetting(key="mail_daily_limit", value="1000")])
+    db.session.commit()
+    invalidate_settings()
+    enqueue_mail_jobs(_participants(30), "reminder")
+
+    assert drain_queue("test-worker")["sent"] == 30
+    assert taken == [30]
@@ -0,0 +1,63 @@
+"""
+tests/test_models.py - Participant.latest_provisional / latest_final
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from extensions import db
+from models import Participant, ProvisionalResponse
+
+
+def _participant_with_response(status: str) -> int:
+    participant = Participant(name="参加者", email="u@example.com", class_name="31", student_number="1", role="生徒")
+    participant.provisional_responses.append(
+        ProvisionalResponse(status=status, submitted_at=datetime.utcnow() - timedelta(days=1)))
+    db.session.add(participant)
+    db.session.commit()
+    pid = participant.id
+    db.session.expunge_all()
+    return pid
+
+
+def test_latest_uses_denormalized_id(app_ctx, count_queries):
+    pid = _participant_with_response("not_attending")
+    participant = db.session.get(Participant, pid)
+    with count_queries() as statements:
+        assert participant.latest_provisional.status == "not_attending"
+    # 回答履歴は読み込まず、latest_provisional_id の1件だけ
+    assert len(statements) == 1
+    assert "provisional_responses" not in db.inspect(participant).dict
+
+
+def test_latest_sees_unflushed_response(app_ctx):
+    pid = _participant_with_response("not_attending")
+    participant = db.session.get(Participant, pid)
+    db.session.add(ProvisionalResponse(participant=participant, status="attending"))
+
+    assert participant.latest_provisional.status == "attending"
+    db.session.commit()
+    assert participant.latest_provisional_id == participant.latest_provisional.id
+
+
+def test_latest_in_before_flush_does_not_flush(app_ctx):
+    """before_flush の中から参照しても入れ子の flush にならない"""
+    pid = _participant_with_response("not_attending")
+    participant = db.session.get(Participant, pid)
+    seen = []
+
+    def read_latest(session, flush_context, instances):
+        seen.append(participant.latest_provisional.status)
+
+    session = db.session()
+    event.listen(session, "before_flush", read_latest)
+    try:
+        db.session.add(ProvisionalResponse(participant_id=pid, status="attending"))
+        db.session.commit()
+    finally:
+        event.remove(session, "before_flush", read_latest)
+
+    # flush 中はまだ書き込まれていない回答は見えない
+    assert seen == ["not_attending"]
+    db.session.expire_all()
+    assert db.session.get(Participant, pid).latest_provisional.status == "attending"
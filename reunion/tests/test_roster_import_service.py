@@ -0,0 +1,181 @@
+"""
+tests/test_roster_import_service.py - 名簿CSVの取込（差分の作成・一括反映）
+"""
+import io
+import re
+from html import unescape
+
+from extensions import db
+from models import (AttendanceRecord, BankImport, FinalResponse, MailLog, Participant, Payment,
+                    ProvisionalResponse, PLACEHOLDER_DOMAIN)
+from services.roster_import_service import apply_roster_import, parse_roster_csv, plan_roster_import
+
+HEADER = "氏名,メールアドレス,クラス,出席番号,役割"
+
+
+def _csv(*rows: str, header: str = HEADER) -> bytes:
+    return "\n".join((header,) + rows).encode("utf-8")
+
+
+def _plan(*rows: str, header: str = HEADER) -> dict:
+    return plan_roster_import(parse_roster_csv(_csv(*rows, header=header)))
+
+
+def _participant(name: str, email: str, class_name: str = "31", number: str = "1") -> Participant:
+    participant = Participant(name=name, email=email, class_name=class_name, student_number=number, role="生徒")
+    db.session.add(participant)
+    db.session.commit()
+    return participant
+
+
+def test_matches_by_email(app_ctx):
+    participant = _participant("山田 太郎", "yamada@example.com")
+    db.session.add(ProvisionalResponse(participant=participant, status="attending"))
+    db.session.commit()
+
+    # クラス・出席番号・氏名が変わっても、メールアドレスが同じなら同じ参加者として更新する
+    plan = _plan("山田 次郎,YAMADA@example.com,32,7,生徒")
+    assert plan["inserts"] == [] and plan["deletes"] == []
+    [update] = plan["updates"]
+    assert update["id"] == participant.id
+    assert update["changes"] == {"name": ("山田 太郎", "山田 次郎"), "class_name": ("31", "32"),
+                                 "student_number": ("1", "7")}
+
+    apply_roster_import(plan)
+    db.session.expire_all()
+    updated = db.session.get(Participant, participant.id)
+    assert (updated.name, updated.class_name, updated.student_number) == ("山田 次郎", "32", "7")
+    # 一括 UPDATE でも名寄せ用カラムを書き直す
+    assert updated.name_normalized == "山田次郎"
+    # 回答履歴は残る
+    assert updated.latest_provisional.status == "attending"
+
+
+def test_falls_back_to_class_number_name(app_ctx):
+    with_email = _participant("鈴木花子", "suzuki@example.com", number="2")
+    placeholder = _participant("佐藤一郎", f"__no_email_佐藤一郎_31_生徒{PLACEHOLDER_DOMAIN}", number="3")
+    assert placeholder.is_placeholder
+
+    plan = _plan(
+        "鈴木花子,,31,2,生徒",                      # メールなし: 登録済みのアドレスを残す
+        "佐藤一郎,sato@example.com,31,3,生徒",      # 名簿レコードに本人のアドレスが分かった
+    )
+    assert plan["inserts"] == [] and plan["deletes"] == []
+    assert plan["unchanged"] == 1
+    [update] = plan["updates"]
+    assert update["id"] == placeholder.id and set(update["changes"]) == {"email"}
+
+    apply_roster_import(plan)
+    db.session.expire_all()
+    assert db.session.get(Participant, with_email.id).email == "suzuki@example.com"
+    sato = db.session.get(Participant, placeholder.id)
+    assert sato.email == "sato@example.com"
+    assert sato.is_placeholder is False
+
+
+def test_duplicate_rows_are_counted_once(app_ctx):
+    plan = _plan("山田太郎,yamada@example.com,31,1,生徒",
+                 "山田太郎,yamada@example.com,31,1,生徒",
+                 "鈴木花子,suzuki@example.com,31,2,生徒")
+    assert [rec["email"] for rec in plan["inserts"]] == ["yamada@example.com", "suzuki@example.com"]
+    assert plan["duplicates"] == 1
+
+    assert apply_roster_import(plan)["inserted"] == 2
+    assert Participant.query.count() == 2
+
+
+def test_inserts_set_search_columns(app_ctx):
+    plan = _plan("山田 太郎,yamada@example.com,31,1,生徒",
+                 "佐藤　一郎,,31,2,生徒")
+    apply_roster_import(plan)
+
+    rows = {p.name: p for p in Participant.query}
+    assert rows["山田 太郎"].name_normalized == "山田太郎"
+    assert rows["山田 太郎"].is_placeholder is False
+    assert rows["佐藤　一郎"].name_normalized == "佐藤一郎"
+    assert rows["佐藤　一郎"].is_placeholder is True
+    assert rows["佐藤　一郎"].email.endswith(PLACEHOLDER_DOMAIN)
+
+
+def test_delete_clears_bank_matches(app_ctx):
+    kept = _participant("山田太郎", "yamada@example.com")
+    removed_id = _participant("鈴木花子", "suzuki@example.com", number="2").id
+    db.session.add_all([
+        FinalResponse(participant_id=removed_id, status="attending"),
+        Payment(participant_id=removed_id, payment_status="paid", paid_amount=8000),
+        MailLog(participant_id=removed_id, mail_type="final_url", status="sent"),
+        AttendanceRecord(participant_id=removed_id, status="checked_in"),
+        BankImport(raw_name="スズキハナコ", raw_amount=8000, match_status="matched",
+                   matched_participant_id=removed_id),
+    ])
+    db.session.commit()
+
+    plan = _plan("山田太郎,yamada@example.com,31,1,生徒")
+    assert [d["id"] for d in plan["deletes"]] == [removed_id]
+    assert apply_roster_import(plan)["deleted"] == 1
+
+    db.session.expire_all()
+    assert [p.id for p in Participant.query] == [kept.id]
+    bank = BankImport.query.one()
+    assert (bank.matched_participant_id, bank.match_status) == (None, "unmatched")
+    for model in (FinalResponse, Payment, MailLog, AttendanceRecord):
+        assert model.query.count() == 0
+
+
+def test_responses_and_payment_rows(app_ctx):
+    existing = _participant("山田太郎", "yamada@example.com")
+    header = HEADER + ",仮出欠,本出欠,入金ステータス,入金金額"
+    plan = _plan("山田太郎,yamada@example.com,31,1,生徒,参加,参加,支払済み,8000",
+                 "鈴木花子,suzuki@example.com,31,2,生徒,未定,,,",
+                 header=header)
+    assert len(plan["provisional"]) == 2 and len(plan["final"]) == 1
+    assert len(plan["payment_inserts"]) == 1
+    assert apply_roster_import(plan)["responses"] == 3
+
+    db.session.expire_all()
+    yamada = db.session.get(Participant, existing.id)
+    assert yamada.latest_provisional.status == "attending"
+    assert yamada.latest_final.status == "attending"
+    assert (yamada.payment.payment_status, yamada.payment.paid_amount) == ("paid", 8000)
+    suzuki = Participant.query.filter_by(email="suzuki@example.com").one()
+    assert suzuki.latest_provisional.status == "undecided"
+    assert suzuki.latest_final is None and suzuki.payment is None
+
+    # 同じCSVをもう一度取込んでも回答は増えない
+    again = _plan("山田太郎,yamada@example.com,31,1,生徒,参加,参加,支払済み,8000",
+                  "鈴木花子,suzuki@example.com,31,2,生徒,未定,,,",
+                  header=header)
+    assert again["unchanged"] == 2
+    assert not any(again[key] for key in ("inserts", "updates", "deletes", "provisional", "final",
+                                          "payment_inserts", "payment_updates"))
+
+
+def test_apply_rejects_changed_digest(app_ctx, tmp_path, monkeypatch):
+    """確認画面の表示後に名簿が変わったら反映せず、新しい差分の確認画面に戻す"""
+    monkeypatch.setattr(app_ctx, "instance_path", str(tmp_path))
+    _participant("山田太郎", "yamada@example.com")
+    client = app_ctx.test_client()
+    with client.session_transaction() as session:
+        session["admin_authed"] = True
+
+    content = _csv("山田太郎,yamada@example.com,31,1,生徒", "鈴木花子,suzuki@example.com,31,2,生徒")
+    res = client.post("/admin/roster/import", data={"csv_file": (io.BytesIO(content), "roster.csv")},
+                      content_type="multipart/form-data")
+    assert res.status_code == 200
+    html = res.get_data(as_text=True)
+    token = unescape(re.search(r'name="token" value="([^"]+)"', html).group(1))
+    digest = re.search(r'name="digest" value="([^"]+)"', html).group(1)
+
+    # 確認中に別の画面から参加者が追加された（反映すると削除される）
+    _participant("佐藤一郎", "sato@example.com", number="3")
+    res = client.post("/admin/roster/import/apply", data={"token": token, "digest": digest})
+    assert res.status_code == 200
+    assert "確認画面の表示後に名簿が変更されました" in res.get_data(as_text=True)
+    assert sorted(p.email for p in Participant.query) == ["sato@example.com", "yamada@example.com"]
+
+    # 新しい差分を確認してから反映すれば取込める
+    new_digest = re.search(r'name="digest" value="([^"]+)"', res.get_data(as_text=True)).group(1)
+    assert new_digest != digest
+    res = client.post("/admin/roster/import/apply", data={"token": token, "digest": new_digest})
+    assert res.status_code == 302
+    assert sorted(p.email for p in Participant.query) == ["suzuki@example.com", "yamada@example.com"]
@@ -0,0 +1,47 @@
+"""
+tests/test_settings_service.py - 設定（AppSetting）の読み込みキャッシュ
+"""
+from extensions import db
+from models import AppSetting, Participant
+from services.settings_service import get_setting, save_settings, settings_scope
+
+
+def _settings_queries(statements: list) -> list:
+    return [s for s in statements if "app_settings" in s and s.lstrip().upper().startswith("SELECT")]
+
+
+def _participants(n: int) -> list:
+    participants = [Participant(name=f"参加者{i}", email=f"u{i}@example.com", class_name="31",
+                                student_number=str(i + 1), role="生徒") for i in range(n)]
+    db.session.add_all(participants)
+    db.session.add_all([AppSetting(key="reunion_name", value="第30回同窓会"),
+                        AppSetting(key="mail_from", value="kanji@example.com")])
+    db.session.commit()
+    return participants
+
+
+def test_sending_100_mails_reads_settings_once(app_ctx, count_queries):
+    """一括送信1回分（settings_scope）の100通で、設定の読み込みは1クエリだけ"""
+    from services.mail_service import send_reminder
+
+    participants = _participants(100)
+    with count_queries() as statements, settings_scope():
+        logs = [send_reminder(p, f"http://localhost/form/final/{p.id}") for p in participants]
+
+    assert len(_settings_queries(statements)) == 1
+    # 設定1回 + 1通ごとの MailLog 書き込み・コミット後の参加者の読み直し
+    assert len(statements) <= 1 + 2 * len(participants)
+    assert {log.status for log in logs} == {"simulated"}
+
+
+def test_save_settings_invalidates_cache(app_ctx, count_queries):
+    _participants(1)
+    with count_queries() as statements:
+        assert get_setting("reunion_name") == "第30回同窓会"
+        assert get_setting("mail_from") == "kanji@example.com"
+        save_settings({"reunion_name": "第31回同窓会"})
+        db.session.commit()
+        assert get_setting("reunion_name") == "第31回同窓会"
+
+    # 最初の読み込み・save_settings の既存行の読み込み・保存後の読み直し
+    assert len(_settings_queries(statements)) == 3
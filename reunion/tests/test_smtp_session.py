@@ -0,0 +1,109 @@
+"""
+tests/test_smtp_session.py - SMTP接続の使い回し（SMTPSession）
+
+ローカルのSMTPサーバー（tests/smtp_server.py）に対して、接続の使い回し・
+max_messages 通ごとの入れ替え・切断（SMTPServerDisconnected / 421）からの再接続を確認する。
+"""
+import time
+
+import pytest
+
+from services import mail_service
+from services.mail_service import SMTPSession
+from smtp_server import LocalSMTPServer
+
+
+def _send(cfg: dict, count: int, start: int = 0) -> None:
+    for i in range(start, start + count):
+        mail_service._send_smtp_text(f"u{i}@example.com", f"件名{i}", f"本文{i}", cfg)
+
+
+@pytest.fixture
+def bind_session(monkeypatch):
+    """このスレッドの SMTP 送信を session 経由にする（一括送信ワーカーのスレッドと同じ状態）"""
+    sessions = []
+
+    def bind(max_messages: int = mail_service.SMTP_MAX_MESSAGES_PER_CONNECTION) -> SMTPSession:
+        session = SMTPSession(max_messages)
+        monkeypatch.setattr(mail_service._smtp_local, "session", session, raising=False)
+        sessions.append(session)
+        return session
+
+    yield bind
+    for session in sessions:
+        session.close()
+
+
+def _recipients(server: LocalSMTPServer) -> list:
+    return [to for message in server.messages for to in message["to"]]
+
+
+def test_reuses_one_connection_per_batch(bind_session):
+    with LocalSMTPServer() as server:
+        session = bind_session(max_messages=50)
+        _send(server.smtp_config(), 100)
+
+    assert _recipients(server) == [f"u{i}@example.com" for i in range(100)]
+    assert server.connections == 2
+    assert session.connections == 2
+
+
+def test_rotates_after_max_messages(bind_session):
+    with LocalSMTPServer() as server:
+        session = bind_session(max_messages=10)
+        _send(server.smtp_config(), 35)
+
+    assert len(server.messages) == 35
+    assert server.connections == 4
+    assert session.connections == 4
+
+
+def test_reconnects_when_server_drops_connection(bind_session):
+    """サーバーが7通ごとに黙って切断しても、再接続して全通を1回ずつ届ける"""
+    with LocalSMTPServer(drop_after=7) as server:
+        bind_session()
+        _send(server.smtp_config(), 30)
+
+    assert _recipients(server) == [f"u{i}@example.com" for i in range(30)]
+    assert server.connections == 5
+
+
+def test_reconnects_on_421(bind_session):
+    """421（サーバー側からの切断予告）でも再接続して送り直す"""
+    with LocalSMTPServer(reply_421_after=5) as server:
+        bind_session()
+        _send(server.smtp_config(), 12)
+
+    assert _recipients(server) == [f"u{i}@example.com" for i in range(12)]
+    assert server.connections == 3
+
+
+def test_reconnects_when_config_changes(bind_session):
+    with LocalSMTPServer() as first, LocalSMTPServer() as second:
+        session = bind_session()
+        _send(first.smtp_config(), 3)
+        _send(second.smtp_config(), 3, start=3)
+
+    assert len(first.messages) == 3
+    assert len(second.messages) == 3
+    assert session.connections == 2
+
+
+def test_session_throughput_beats_per_message_connections(bind_session):
+    """接続のたびにかかる時間（ハンドシェイク・ログインの代わりに 20ms）を1回分に減らす"""
+    count = 30
+    with LocalSMTPServer(greeting_delay=0.02) as server:
+        started = time.perf_counter()
+        _send(server.smtp_config(), count)
+        per_message = time.perf_counter() - started
+        per_message_connections = server.connections
+
+        bind_session()
+        started = time.perf_counter()
+        _send(server.smtp_config(), count, start=count)
+        pooled = time.perf_counter() - started
+
+    assert per_message_connections == count
+    assert server.connections == count + 1
+    assert len(server.messages) == 2 * count
+    assert pooled < per_message / 3
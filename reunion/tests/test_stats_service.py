@@ -0,0 +1,111 @@
+"""
+tests/test_stats_service.py - ダッシュボード集計（get_dashboard_counts）
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import Participant, ProvisionalResponse, FinalResponse, Payment, MailLog
+from services.stats_service import get_dashboard_counts
+
+
+def _seed(n: int, seed: int = 1, start: int = 0) -> None:
+    rnd = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    for i in range(start, start + n):
+        email = f"u{i}@example.com" if i % 7 else f"__no_email_{i}@placeholder.local"
+        p = Participant(name=f"参加者{i}", name_kana="サンカシャ", email=email,
+                        class_name=str(31 + i % 9), student_number=str(i // 9 + 1), role="生徒")
+        db.session.add(p)
+        db.session.flush()
+        for _ in range(rnd.randint(0, 3)):
+            db.session.add(ProvisionalResponse(
+                participant_id=p.id, status=rnd.choice(["attending", "not_attending", "undecided"]),
+                submitted_at=base + timedelta(minutes=rnd.randint(0, 10000))))
+        for _ in range(rnd.randint(0, 2)):
+            db.session.add(FinalResponse(
+                participant_id=p.id, status=rnd.choice(["attending", "not_attending", "cancelled"]),
+                submitted_at=base + timedelta(days=30, minutes=rnd.randint(0, 10000))))
+        if rnd.random() < 0.5:
+            db.session.add(Payment(participant_id=p.id, expected_amount=8000,
+                                   payment_status=rnd.choice(["paid", "unpaid", "partial"])))
+        for _ in range(rnd.randint(0, 3)):
+            db.session.add(MailLog(participant_id=p.id,
+                                   mail_type=rnd.choice(["final_url", "reminder", "provisional_confirm"]),
+                                   status=rnd.choice(["sent", "simulated", "failed"])))
+    db.session.commit()
+    db.session.expire_all()
+
+
+def _stats_by_loop() -> dict:
+    """集計クエリ導入前のダッシュボードと同じ、参加者ごとのループでの集計"""
+    stats = dict.fromkeys([
+        "provisional_attending", "provisional_not_attending", "provisional_undecided",
+        "final_attending", "final_not_attending", "final_cancelled", "final_no_response",
+        "no_provisional_response", "paid", "unpaid", "final_url_sent", "final_url_unsent",
+    ], 0)
+    participants = Participant.query.all()
+    for p in participants:
+        prov = p.latest_provisional
+        final = p.latest_final
+        if prov:
+            if prov.status in ("attending", "not_attending", "undecided"):
+                stats[f"provisional_{prov.status}"] += 1
+        else:
+            stats["no_provisional_response"] += 1
+
+        if final:
+            if final.status == "attending":
+                stats["final_attending"] += 1
+            elif final.status == "cancelled":
+                stats["final_cancelled"] += 1
+            else:
+                stats["final_not_attending"] += 1
+        else:
+            stats["final_no_response"] += 1
+
+        if any(ml.mail_type == "final_url" and ml.status in ("sent", "simulated") for ml in p.mail_logs):
+            stats["final_url_sent"] += 1
+        else:
+            stats["final_url_unsent"] += 1
+
+        if p.payment:
+            final_status = final.status if final else None
+            if p.payment.payment_status == "paid":
+                stats["paid"] += 1
+            elif final_status not in ("not_attending", "cancelled"):
+                stats["unpaid"] += 1
+
+    stats["total"] = len(participants)
+    stats["no_email"] = Participant.query.filter(Participant.email.like("%@placeholder.local")).count()
+    return stats
+
+
+@pytest.mark.parametrize("n", [10, 1000])
+def test_dashboard_counts_match_loop_in_one_query(app_ctx, count_queries, n):
+    _seed(n)
+
+    with count_queries() as statements:
+        stats = get_dashboard_counts()
+
+    assert len(statements) == 1
+    assert stats == _stats_by_loop()
+
+
+def test_dashboard_query_count_does_not_grow(app_ctx, count_queries):
+    """ダッシュボード全体のクエリ数は参加者数によらず一定"""
+    client = app_ctx.test_client()
+    with client.session_transaction() as session:
+        session["admin_authed"] = True
+
+    counts = []
+    for start, n in ((0, 10), (10, 990)):
+        _seed(n, start=start)
+        client.get("/admin/")  # 初回だけ読み込むもの（設定など）を除くため一度開いておく
+        with count_queries() as statements:
+            assert client.get("/admin/").status_code == 200
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
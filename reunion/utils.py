@@ -1,6 +1,9 @@
 """
 utils.py - 汎用ユーティリティ
 """
+import re
+
+_NAME_SPACES = re.compile(r"[\s\u3000]+")
 
 _SMALL_TO_LARGE_KANA = str.maketrans(
     "ァィゥェォッャュョヮヵヶ",
@@ -23,6 +26,11 @@ _VOICED_TO_BASE = {
 }
 
 
+def normalize_name(name: str) -> str:
+    """氏名を比較用に正規化する（半角・全角スペースを除去）"""
+    return _NAME_SPACES.sub("", name or "")
+
+
 def normalize_transfer_name(name: str) -> str:
     """振込名義を銀行標準形式に正規化する（小文字カタカナ→大文字、半角数字→全角、スペース除去）"""
     if not name:
@@ -9,6 +9,5 @@ project_home = os.path.dirname(os.path.abspath(__file__))
 if project_home not in sys.path:
     sys.path.insert(0, project_home)
 
-from app import create_app
-
-application = create_app()
+# app.py の import 時に作られたアプリを使う（ここで create_app() を呼ぶと2回作られる）
+from app import app as application